@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
+
+Con ASYNC_CATALOG_VIEWS = True los grids del catálogo usan las vistas async
+(consultas a Mongo en paralelo con AsyncMongoClient); servir este módulo con
+un servidor ASGI, p. ej.: uvicorn simpsonsRank.asgi:application --workers 4
 """
 
 import os
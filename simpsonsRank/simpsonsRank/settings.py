@@ -49,6 +49,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'simpsonsRankApp.core.admission.AdmissionControlMiddleware',
 ]
 
 ROOT_URLCONF = 'simpsonsRank.urls'
@@ -75,6 +76,9 @@ WSGI_APPLICATION = 'simpsonsRank.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+MONGO_URI = "mongodb://localhost:27017/"
+MONGO_DB_NAME = "simpsonsRank"
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
@@ -82,13 +86,104 @@ DATABASES = {
     },
     "mongodb": {
         "ENGINE": "django_mongodb_backend",
-        "HOST": "mongodb://localhost:27017/",
-        "NAME": "simpsonsRank",
+        "HOST": MONGO_URI,
+        "NAME": MONGO_DB_NAME,
     }
 }
 
+# Cliente pymongo compartido (simpsonsRankApp.core.mobgo.get_db).
+# Un pool por proceso; se recrea solo tras un fork (gunicorn --preload, etc.)
+MONGO_CLIENT_OPTIONS = {
+    "maxPoolSize": 50,
+    "minPoolSize": 0,
+    "maxIdleTimeMS": 60_000,
+    "connectTimeoutMS": 2_000,
+    "serverSelectionTimeoutMS": 3_000,
+    "socketTimeoutMS": 10_000,
+    "waitQueueTimeoutMS": 2_000,
+    "retryWrites": True,
+}
+
 DATABASE_ROUTERS = ['simpsonsRank.db_routers.MongoRouter']
 
+# Cache
+# LocMem es por proceso: con varios workers conviene Redis/Memcached para que
+# la invalidación de un worker la vean todos.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "simpsonsrank",
+    }
+}
+
+# Sidebars TOP 5 / últimos comentarios: fresco SIDEBAR_CACHE_TTL segundos y,
+# pasado ese tiempo, se sirve el valor viejo otros SIDEBAR_CACHE_STALE_TTL
+# mientras una sola petición lo recalcula.
+SIDEBAR_CACHE_TTL = 60
+SIDEBAR_CACHE_STALE_TTL = 300
+
+# Caché de resultados del buscador (search_attachables): entradas y segundos
+SEARCH_CACHE_SIZE = 512
+SEARCH_CACHE_TTL = 300
+# type=all: máximo de resultados que aporta cada colección antes de mezclar
+SEARCH_ALL_QUOTAS = {"characters": 20, "episodes": 15, "locations": 15}
+
+# Estadísticas globales (admin, scope=global): se sirven del snapshot que
+# escribe `manage.py refresh_statistics` si tiene menos de MAX_AGE segundos
+# (0 = siempre en vivo). Regenerarlo con cron o con un único
+# `refresh_statistics --every N` (N menor que MAX_AGE).
+STATISTICS_SNAPSHOT_MAX_AGE = 300
+
+# upload_json: documentos por lote (lectura en streaming + insert por lotes)
+UPLOAD_BATCH_SIZE = 1000
+
+# Reviews en write-behind: la vista encola y responde; un hilo por proceso
+# las escribe en lotes cada REVIEW_FLUSH_SECONDS. El spool en disco guarda lo
+# encolado hasta que está en Mongo (se reaplica al arrancar o con
+# `manage.py flush_review_spool`). Con la cola llena se escribe en directo.
+REVIEW_WRITE_BEHIND = False
+REVIEW_QUEUE_SIZE = 10000
+REVIEW_FLUSH_SECONDS = 0.5
+REVIEW_FLUSH_BATCH = 500
+REVIEW_SPOOL_DIR = BASE_DIR / "review_spool"
+REVIEW_SPOOL_FSYNC = False       # True -> fsync por review (sobrevive a un corte de luz)
+
+# Control de admisión (core/admission.py): por url_name (y opcionalmente un
+# parámetro GET), peticiones simultáneas por proceso, cola de espera y
+# segundos máximos en cola. Lo que no cabe recibe 503 + Retry-After.
+# "auth": los anónimos no cuentan; "staff": solo para staff (si no, la siguiente clave).
+ADMISSION_LIMITS = {
+    "statistics_data:scope=global": {"concurrency": 2, "queue": 4, "timeout": 3, "staff": True},
+    "statistics_data": {"concurrency": 6, "queue": 12, "timeout": 3, "auth": True},
+    "category_avg_ranking": {"concurrency": 4, "queue": 8, "timeout": 3, "auth": True},
+    "ranking,show_ranking": {"concurrency": 6, "queue": 12, "timeout": 3},  # misma vista, dos urls
+}
+ADMISSION_RETRY_AFTER = 2
+
+# Feed público de rankings: tamaño de página (paginación por cursor)
+RANKING_FEED_PAGE_SIZE = 24
+
+# Grids de personajes/episodios/localizaciones:
+#   "offset" -> Paginator de Django (COUNT + skip/limit)
+#   "keyset" -> cursor por id: todas las páginas cuestan lo mismo
+CATALOG_PAGINATION = "offset"
+CATALOG_KEYSET_COUNT = True      # total de páginas (cacheado) en modo keyset
+CATALOG_COUNT_CACHE_TTL = 300
+# True -> home/episodios/localizaciones usan las vistas async (servir con asgi.py:
+# uvicorn/daphne). Con WSGI se sirven las vistas sync (ver catalog_pages.asgi_only).
+ASYNC_CATALOG_VIEWS = False
+
+# Snapshot del catálogo en memoria: cada cuántos segundos se mira la colección
+# "versions" para saber si hay que recargarlo
+CATALOG_VERSION_CHECK_SECONDS = 5
+# Catálogo compilado por build_catalog_file (mmap compartido entre workers).
+# Solo se usa si sus versiones coinciden con "versions"; si no existe, Mongo.
+CATALOG_FILE = BASE_DIR / "catalog.bin"
+# Caché de fragmentos de los grids de cards (las claves ya llevan las
+# versiones del catálogo y de las stats: el TTL solo limpia lo viejo)
+CARD_GRID_CACHE_TTL = 600
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
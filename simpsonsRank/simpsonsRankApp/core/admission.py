@@ -0,0 +1,286 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+# =========================
+# Control de admisión por endpoint
+# =========================
+# settings.ADMISSION_LIMITS = {"<url_name>[:<param>=<valor>]": {"concurrency": N,
+# "queue": M, "timeout": s}}. Como mucho N peticiones a la vez por proceso; las
+# siguientes esperan en una cola de M (hasta `timeout` segundos) y, si la cola
+# está llena o se agota la espera, 503 con Retry-After. Así unas pocas
+# estadísticas globales no ocupan todos los hilos del worker.
+# La clave con parámetro ("statistics_data:scope=global") gana a la genérica;
+# varios url_name separados por comas comparten el mismo límite.
+# "auth": True -> las peticiones anónimas no ocupan hueco (login_required las
+# redirige sin trabajo). "staff": True -> solo aplica a staff; el resto sigue
+# con la siguiente clave (un usuario normal con ?scope=global recibe "me" y no
+# debe quitar huecos a las consultas globales de los admins).
+# Los contadores (admin_metrics -> "admission") sirven para ajustar N y M.
+
+
+class _Waiter:
+    """Petición en cola: un hilo (Event) o una corrutina (future de su event loop)."""
+
+    def __init__(self, loop=None):
+        self.granted = False
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class Gate:
+    """
+    Semáforo con cola acotada, compartido por hilos (WSGI) y corrutinas (ASGI).
+    release() pasa el hueco directamente al primero de la cola (FIFO), así una
+    corrutina espera sin bloquear el event loop ni ocupar un hilo.
+    """
+
+    def __init__(self, name, concurrency, queue=0, timeout=0.0, auth=False, staff=False):
+        self.name = name
+        self.auth = auth or staff
+        self.staff = staff
+        self.concurrency = max(1, int(concurrency))
+        self.queue = max(0, int(queue))
+        self.timeout = float(timeout)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.waiters = deque()
+        self.counters = {
+            "admitted": 0, "queued": 0, "rejected_full": 0, "rejected_timeout": 0,
+            "max_active": 0, "max_waiting": 0,
+        }
+        self.wait_ms = {"total": 0.0, "max": 0.0}
+
+    def _enter(self, loop=None):
+        """Con self.lock: True (entra), False (cola llena) o el _Waiter encolado."""
+        if self.active < self.concurrency and not self.waiters:
+            self.active += 1
+            self._admitted()
+            return True
+        if len(self.waiters) >= self.queue:
+            self.counters["rejected_full"] += 1
+            return False
+        waiter = _Waiter(loop)
+        self.waiters.append(waiter)
+        self.counters["queued"] += 1
+        self.counters["max_waiting"] = max(self.counters["max_waiting"], len(self.waiters))
+        return waiter
+
+    def _leave_queue(self, waiter, start):
+        """Con self.lock, tras esperar: True si release() le dio el hueco a tiempo."""
+        if waiter.granted:
+            waited = (time.monotonic() - start) * 1000
+            self.wait_ms["total"] += waited
+            self.wait_ms["max"] = max(self.wait_ms["max"], waited)
+            return True
+        self.waiters.remove(waiter)
+        self.counters["rejected_timeout"] += 1
+        return False
+
+    def _admitted(self):
+        self.counters["admitted"] += 1
+        self.counters["max_active"] = max(self.counters["max_active"], self.active)
+
+    def acquire(self):
+        """True si entra (hay que llamar a release()); False si hay que responder 503."""
+        with self.lock:
+            waiter = self._enter()
+        if not isinstance(waiter, _Waiter):
+            return waiter
+
+        start = time.monotonic()
+        waiter.event.wait(self.timeout)
+        with self.lock:
+            return self._leave_queue(waiter, start)
+
+    async def aacquire(self):
+        """acquire() para vistas async: la espera es un await, no un hilo bloqueado."""
+        with self.lock:
+            waiter = self._enter(asyncio.get_running_loop())
+        if not isinstance(waiter, _Waiter):
+            return waiter
+
+        start = time.monotonic()
+        try:
+            await asyncio.wait([waiter.future], timeout=self.timeout)
+        except asyncio.CancelledError:
+            # el cliente se ha ido: si ya tenía hueco se devuelve, si no sale de la cola
+            with self.lock:
+                granted = self._leave_queue(waiter, start)
+            if granted:
+                self.release()
+            raise
+        with self.lock:
+            return self._leave_queue(waiter, start)
+
+    def release(self):
+        with self.lock:
+            if self.waiters:
+                # el hueco pasa al siguiente sin bajar active
+                waiter = self.waiters.popleft()
+                waiter.granted = True
+                self._admitted()
+            else:
+                self.active -= 1
+                return
+        waiter.wake()
+
+    def stats(self):
+        with self.lock:
+            queued = self.counters["queued"]
+            return {
+                "concurrency": self.concurrency,
+                "queue": self.queue,
+                "active": self.active,
+                "waiting": len(self.waiters),
+                **self.counters,
+                "wait_ms": {
+                    "avg": round(self.wait_ms["total"] / queued, 2) if queued else 0.0,
+                    "max": round(self.wait_ms["max"], 2),
+                },
+            }
+
+
+_gates = None
+_gates_lock = threading.Lock()
+
+
+def _parse_key(key):
+    """"ranking,show_ranking" / "statistics_data:scope=global" -> ([url_names], (param, valor) | None)."""
+    names, _, cond = key.partition(":")
+    param, _, value = cond.partition("=")
+    return [n.strip() for n in names.split(",") if n.strip()], ((param, value) if cond else None)
+
+
+def get_gates():
+    """Gates del proceso, creados a partir de ADMISSION_LIMITS: {url_name: [(condición, Gate)]}."""
+    global _gates
+    if _gates is not None:
+        return _gates
+    with _gates_lock:
+        if _gates is None:
+            gates = {}
+            for key, cfg in (getattr(settings, "ADMISSION_LIMITS", {}) or {}).items():
+                names, cond = _parse_key(key)
+                gate = Gate(
+                    key, cfg.get("concurrency", 1), cfg.get("queue", 0), cfg.get("timeout", 0.0),
+                    auth=bool(cfg.get("auth")), staff=bool(cfg.get("staff")),
+                )
+                for name in names:
+                    gates.setdefault(name, []).append((cond, gate))
+            for entries in gates.values():
+                entries.sort(key=lambda e: e[0] is None)  # con condición primero
+            _gates = gates
+    return _gates
+
+
+def needs_user(url_name):
+    return any(gate.auth for _, gate in get_gates().get(url_name, ()))
+
+
+def gate_for(url_name, query, user=None):
+    """Gate que aplica a la petición (o None). `user` solo hace falta si needs_user()."""
+    authenticated = bool(user is not None and user.is_authenticated)
+    for cond, gate in get_gates().get(url_name, ()):
+        if cond is not None and query.get(cond[0]) != cond[1]:
+            continue
+        if gate.staff and not (authenticated and user.is_staff):
+            continue
+        if gate.auth and not authenticated:
+            return None
+        return gate
+    return None
+
+
+def stats():
+    gates = {gate.name: gate for entries in get_gates().values() for _, gate in entries}
+    return {name: gate.stats() for name, gate in gates.items()}
+
+
+def _overloaded(request):
+    retry_after = str(getattr(settings, "ADMISSION_RETRY_AFTER", 2))
+    if "text/html" in request.headers.get("Accept", ""):
+        response = HttpResponse("Servidor ocupado, vuelve a intentarlo en unos segundos.", status=503)
+    else:
+        response = JsonResponse({"ok": False, "error": "Server busy, retry later"}, status=503)
+    response["Retry-After"] = retry_after
+    return response
+
+
+class AdmissionControlMiddleware:
+    """
+    Sirve en WSGI y en ASGI: con ASGI la cadena sigue siendo async (las vistas
+    async del catálogo no pasan por un hilo) y la espera en cola es un await.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Django adapta process_view al modo del handler: async aquí evita otro salto a un hilo
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        try:
+            return self.get_response(request)
+        finally:
+            self._release(request)
+
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        finally:
+            self._release(request)
+
+    @staticmethod
+    def _release(request):
+        gate = getattr(request, "_admission_gate", None)
+        if gate is not None:
+            gate.release()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if not match:
+            return None
+        user = request.user if needs_user(match.url_name) else None
+        gate = gate_for(match.url_name, request.GET, user)
+        if gate is None:
+            return None
+        if not gate.acquire():
+            return _overloaded(request)
+        request._admission_gate = gate  # se libera en __call__ al terminar la respuesta
+        return None
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if not match:
+            return None
+        user = await request.auser() if needs_user(match.url_name) else None
+        gate = gate_for(match.url_name, request.GET, user)
+        if gate is None:
+            return None
+        if not await gate.aacquire():
+            return _overloaded(request)
+        request._admission_gate = gate
+        return None
@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+from django.core.cache import cache
+
+# =========================
+# Caché con stale-while-revalidate sobre el cache de Django
+# =========================
+# Guardamos {"value", "fresh_until", "stale_until", "gen", "version"}. Mientras
+# está fresco se sirve tal cual. Cuando caduca, UNA petición (la que consigue
+# el lock con cache.add) lo recalcula y el resto sigue sirviendo el valor viejo
+# hasta que termina, así un pico de tráfico no dispara N agregaciones a la vez.
+# Si no hay nada que servir (clave fría) el resto espera a que termine esa
+# petición (hasta `wait` segundos) en lugar de calcular cada uno lo suyo.
+#
+# El cache de Django es LocMem (uno por proceso). Para que una escritura en
+# otro worker también caduque la entrada, `version` es un contador compartido
+# (service/versions.py): si no coincide con el que se guardó, la entrada está
+# caducada. invalidate() es además inmediato en el proceso que escribe.
+#
+# invalidate() no borra la entrada: la marca como caducada (fresh_until=0),
+# así tras una escritura también recalcula una sola petición. Además sube la
+# generación de la clave: un recálculo que empezó antes de invalidar guarda
+# su resultado como ya caducado, para que no pase por fresco lo de antes.
+
+_POLL = 0.05
+
+
+def _gen_key(key):
+    return f"{key}:gen"
+
+
+def _new_entry(value, gen, current_gen, version, ttl, stale_ttl):
+    now = time.time()
+    return {
+        "value": value,
+        # invalidada mientras se calculaba: se guarda ya caducada
+        "fresh_until": now + ttl if gen == current_gen else 0,
+        "stale_until": now + ttl + stale_ttl,
+        "gen": gen,
+        "version": version,
+    }
+
+
+def _is_fresh(entry, version, now):
+    return entry["fresh_until"] > now and (version is None or entry.get("version") == version)
+
+
+def swr_get(key, builder, ttl, stale_ttl, lock_timeout=30, version=None, wait=5.0):
+    now = time.time()
+    entry = cache.get(key)
+
+    if entry is not None and _is_fresh(entry, version, now):
+        return entry["value"]
+
+    lock_key = f"{key}:refresh"
+    locked = cache.add(lock_key, 1, lock_timeout)
+    if not locked:
+        if entry is not None:
+            # otro worker/hilo ya lo está recalculando
+            return entry["value"]
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            time.sleep(_POLL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry["value"]
+        # el que tenía el lock no ha terminado a tiempo: se calcula aquí
+
+    try:
+        gen = cache.get(_gen_key(key), 0)
+        value = builder()
+        entry = _new_entry(value, gen, cache.get(_gen_key(key), 0), version, ttl, stale_ttl)
+        cache.set(key, entry, ttl + stale_ttl)
+        return value
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+
+async def aswr_get(key, abuilder, ttl, stale_ttl, lock_timeout=30, version=None, wait=5.0):
+    """Igual que swr_get pero para vistas async: abuilder es una corrutina."""
+    now = time.time()
+    entry = await cache.aget(key)
+
+    if entry is not None and _is_fresh(entry, version, now):
+        return entry["value"]
+
+    lock_key = f"{key}:refresh"
+    locked = await cache.aadd(lock_key, 1, lock_timeout)
+    if not locked:
+        if entry is not None:
+            return entry["value"]
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(_POLL)
+            entry = await cache.aget(key)
+            if entry is not None:
+                return entry["value"]
+
+    try:
+        gen = await cache.aget(_gen_key(key), 0)
+        value = await abuilder()
+        current_gen = await cache.aget(_gen_key(key), 0)
+        await cache.aset(key, _new_entry(value, gen, current_gen, version, ttl, stale_ttl), ttl + stale_ttl)
+        return value
+    finally:
+        if locked:
+            await cache.adelete(lock_key)
+
+
+def _bump_gen(key):
+    try:
+        cache.incr(_gen_key(key))
+    except ValueError:  # aún no existe
+        if not cache.add(_gen_key(key), 1, None):
+            cache.incr(_gen_key(key))
+
+
+def invalidate(*keys):
+    """Marca las claves como caducadas en este proceso (se siguen sirviendo mientras una petición las recalcula)."""
+    now = time.time()
+    for key in keys:
+        _bump_gen(key)
+        entry = cache.get(key)
+        if entry is None:
+            continue
+        remaining = entry.get("stale_until", 0) - now
+        if remaining <= 1:
+            cache.delete(key)
+            continue
+        cache.set(key, {**entry, "fresh_until": 0}, remaining)
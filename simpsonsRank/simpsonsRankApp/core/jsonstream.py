@@ -0,0 +1,94 @@
+import codecs
+import json
+
+# =========================
+# Lectura incremental de un array JSON
+# =========================
+# iter_json_array(chunks) va soltando los elementos de "[{...}, {...}, ...]"
+# según llegan los trozos de bytes (UploadedFile.chunks(), un fichero abierto
+# en binario...). En memoria solo está el trozo actual + el elemento a medias,
+# da igual lo grande que sea el fichero.
+
+_WS = " \t\n\r"
+# lo que puede seguir a un número sin que haya terminado ("6." + "75e3")
+_NUM_TAIL = set("0123456789.eE+-")
+
+
+class JSONStreamError(ValueError):
+    pass
+
+
+def iter_file_chunks(f, chunk_size=64 * 1024):
+    while chunk := f.read(chunk_size):
+        yield chunk
+
+
+def _may_continue(obj, buf, end):
+    if isinstance(obj, bool) or not isinstance(obj, (int, float)):
+        return end >= len(buf)
+    return all(c in _NUM_TAIL for c in buf[end:])
+
+
+def iter_json_array(chunks):
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8-sig")()
+
+    buf, pos = "", 0
+    offset = 0          # caracteres ya descartados de buf (para los mensajes de error)
+    state = "start"     # start -> first -> item -> after_item -> ... -> end
+    index = 0
+
+    def fail(msg):
+        raise JSONStreamError(f"{msg} (carácter {offset + pos}, elemento {index})")
+
+    chunks = iter(chunks)
+    final = False
+    while not final:
+        try:
+            data = utf8.decode(next(chunks))
+        except StopIteration:
+            data, final = utf8.decode(b"", final=True), True
+        except UnicodeDecodeError as e:
+            raise JSONStreamError(f"El fichero no es UTF-8 válido: {e}") from e
+
+        offset += pos
+        buf, pos = buf[pos:] + data, 0
+
+        while True:
+            while pos < len(buf) and buf[pos] in _WS:
+                pos += 1
+            if pos >= len(buf):
+                break
+
+            ch = buf[pos]
+            if state == "start":
+                if ch != "[":
+                    fail("El JSON debe ser una lista de documentos")
+                pos += 1
+                state = "first"
+            elif state in ("first", "after_item") and ch == "]":
+                pos += 1
+                state = "end"
+            elif state == "after_item":
+                if ch != ",":
+                    fail("Se esperaba ',' o ']'")
+                pos += 1
+                state = "item"
+            elif state in ("first", "item"):
+                try:
+                    obj, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError as e:
+                    if final:
+                        fail(f"JSON inválido: {e.msg}")
+                    break  # elemento a medias: esperar al siguiente trozo
+                if not final and _may_continue(obj, buf, end):
+                    break  # un número al final del trozo podría seguir en el siguiente
+                yield obj
+                index += 1
+                pos = end
+                state = "after_item"
+            else:  # end
+                fail("Contenido después del cierre de la lista")
+
+    if state != "end":
+        fail("El JSON termina antes de cerrar la lista")
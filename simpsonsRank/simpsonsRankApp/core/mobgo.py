@@ -1,5 +1,96 @@
-from pymongo import mongo_client
+import asyncio
+import os
+import threading
+import weakref
 
+from django.conf import settings
+from pymongo import AsyncMongoClient, MongoClient
 
-def get_db():
-    return mongo_client["simpsonsRank"]
+# =========================
+# Cliente Mongo compartido por proceso
+# =========================
+# MongoClient ya es thread-safe y mantiene su propio pool de conexiones, así
+# que lo correcto es crear UNO por proceso y reutilizarlo en todas las vistas.
+# Tras un fork (gunicorn con --preload, multiprocessing...) el hijo no puede
+# reutilizar los sockets del padre: detectamos el cambio de pid y creamos otro.
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+
+
+def _client_options():
+    return dict(getattr(settings, "MONGO_CLIENT_OPTIONS", {}) or {})
+
+
+def get_client():
+    """Devuelve el MongoClient del proceso actual (lo crea la primera vez)."""
+    global _client, _client_pid
+
+    pid = os.getpid()
+    client = _client
+    if client is not None and _client_pid == pid:
+        return client
+
+    with _lock:
+        if _client is None or _client_pid != pid:
+            # connect=False: no abre sockets hasta la primera operación
+            _client = MongoClient(settings.MONGO_URI, connect=False, **_client_options())
+            _client_pid = pid
+        return _client
+
+
+def get_db(name=None):
+    return get_client()[name or settings.MONGO_DB_NAME]
+
+
+def close_client():
+    """Cierra el cliente del proceso (tests, shutdown, benchmarks)."""
+    global _client, _client_pid
+
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+# =========================
+# Cliente async (vistas async servidas por asgi.py)
+# =========================
+# AsyncMongoClient queda ligado al event loop donde se usa por primera vez,
+# así que guardamos uno por loop. Con ASGI (uvicorn/daphne) hay un loop por
+# worker y esto es, en la práctica, uno por proceso. Con WSGI cada petición
+# async tendría su loop (y su cliente): las vistas usan @asgi_only.
+_async_clients = weakref.WeakKeyDictionary()  # loop -> AsyncMongoClient
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncMongoClient(settings.MONGO_URI, connect=False, **_client_options())
+        _async_clients[loop] = client
+    return client
+
+
+def get_async_db(name=None):
+    return get_async_client()[name or settings.MONGO_DB_NAME]
+
+
+async def close_async_client():
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+def _forget_after_fork():
+    # En el hijo NO cerramos el cliente heredado (sus sockets son del padre)
+    global _client, _client_pid
+    _client = None
+    _client_pid = None
+    _async_clients.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_after_fork)
@@ -0,0 +1,180 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+
+# =========================
+# Cursores opacos para paginación por keyset
+# =========================
+# El cliente solo ve un token base64url; dentro va un dict JSON con la
+# posición (p.ej. fecha + _id del último elemento servido).
+
+
+def encode_cursor(data):
+    raw = json.dumps(data, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    """Devuelve el dict del cursor o None si el token no es válido."""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+# =========================
+# Paginación por keyset para los grids del catálogo
+# =========================
+# Paginator de Django hace COUNT + skip/limit: la página 47 cuesta más que la 1.
+# Aquí cada página es "id > último_id LIMIT n" (o "id < primer_id" hacia
+# atrás), que va por índice y cuesta lo mismo en cualquier página.
+# El token viaja en el mismo ?page= que ya usan los templates, así que los
+# controles de paginación no cambian. Un ?page=N numérico (enlaces y marcadores
+# de antes) se sirve con skip/limit una vez; desde ahí los enlaces son cursores.
+
+
+# ids fuera de int64 no se pueden mandar a Mongo: un cursor así se trata como inválido
+_INT64_MIN, _INT64_MAX = -(2 ** 63), 2 ** 63 - 1
+
+
+def _count_cache_key(key):
+    return f"catalog_count:{key}"
+
+
+def invalidate_count(key):
+    cache.delete(_count_cache_key(key))
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, per_page, count_key=None, count_ttl=300):
+        self.queryset = queryset.order_by("id")
+        self.per_page = per_page
+        self.count_key = count_key
+        self.count_ttl = count_ttl
+
+    @property
+    def count(self):
+        if not self.count_key:
+            return None
+        return cache.get_or_set(_count_cache_key(self.count_key), self.queryset.count, self.count_ttl)
+
+    @property
+    def num_pages(self):
+        count = self.count
+        if count is None:
+            return "?"
+        return max(1, -(-count // self.per_page))
+
+    @staticmethod
+    def _bounds(data):
+        """(after, before) del cursor como ints; (None, None) si no son válidos -> página 1."""
+        try:
+            bounds = tuple(None if data.get(k) is None else int(data[k]) for k in ("a", "b"))
+        except (TypeError, ValueError, OverflowError):
+            return None, None
+        if any(v is not None and not _INT64_MIN <= v <= _INT64_MAX for v in bounds):
+            return None, None
+        return bounds
+
+    def _offset_page(self, number):
+        """?page=N numérico: esa página con skip/limit (None si se sale del final)."""
+        start = (number - 1) * self.per_page
+        if start > _INT64_MAX:
+            return None
+        rows = list(self.queryset[start:start + self.per_page + 1])
+        if not rows:
+            return None
+        has_next = len(rows) > self.per_page
+        return KeysetPage(rows[:self.per_page], number, self, number > 1, has_next)
+
+    def get_page(self, token):
+        if token and str(token).isdigit():
+            try:
+                number = int(token)
+            except ValueError:  # "²", más de 4300 dígitos...
+                number = 1
+            page = self._offset_page(number) if number > 1 else None
+            if page is not None:
+                return page
+            token = None
+
+        data = decode_cursor(token) if token else None
+        data = data or {}
+
+        after, before = self._bounds(data)
+        try:
+            number = max(1, int(data.get("n", 1))) if after is not None or before is not None else 1
+        except (TypeError, ValueError, OverflowError):
+            number = 1
+
+        if before is not None:
+            rows = list(self.queryset.filter(id__lt=before).order_by("-id")[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            rows = list(reversed(rows[:self.per_page]))
+            has_next = True
+        else:
+            qs = self.queryset
+            if after is not None:
+                qs = qs.filter(id__gt=after)
+            rows = list(qs[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = after is not None
+
+        if not rows:
+            number, has_previous = 1, False
+
+        return KeysetPage(rows, number, self, has_previous, has_next)
+
+
+class KeysetPage:
+    """Misma interfaz que django.core.paginator.Page en lo que usan los templates."""
+
+    def __init__(self, object_list, number, paginator, has_previous, has_next):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    def previous_page_number(self):
+        # token opaco: se pinta en ?page= igual que un número
+        return encode_cursor({"n": self.number - 1, "b": self.object_list[0].id})
+
+    def next_page_number(self):
+        return encode_cursor({"n": self.number + 1, "a": self.object_list[-1].id})
+
+
+def paginate_catalog(queryset, page_param, per_page=25, count_key=None):
+    """Paginator clásico o keyset según settings.CATALOG_PAGINATION ("offset" | "keyset")."""
+    if getattr(settings, "CATALOG_PAGINATION", "offset") == "keyset":
+        count_key = count_key if getattr(settings, "CATALOG_KEYSET_COUNT", True) else None
+        paginator = KeysetPaginator(
+            queryset, per_page,
+            count_key=count_key,
+            count_ttl=getattr(settings, "CATALOG_COUNT_CACHE_TTL", 300),
+        )
+        return paginator.get_page(page_param)
+    return Paginator(queryset, per_page).get_page(page_param)
@@ -0,0 +1,493 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from pymongo import MongoClient
+
+from simpsonsRankApp.core.mobgo import get_db, close_client, close_async_client
+
+
+def _run(fn, total, concurrency):
+    """Ejecuta fn() `total` veces repartidas en `concurrency` hilos. Devuelve (segundos, req/s)."""
+    start = time.perf_counter()
+    if concurrency <= 1:
+        for _ in range(total):
+            fn()
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda _: fn(), range(total)))
+    elapsed = time.perf_counter() - start
+    return elapsed, (total / elapsed if elapsed else 0.0)
+
+
+# =========================
+# Escenarios
+# =========================
+def bench_mongo_client(cmd, opts):
+    """
+    Antes: MongoClient nuevo por petición (handshake + discovery + pool nuevo).
+    Después: cliente compartido del proceso (core.mobgo.get_db).
+    La "petición" es la consulta típica del modal: últimas reviews de un personaje.
+    """
+    def query(db):
+        list(db["reviews"].find({"characterCode": 1}).sort("reviewDate", -1).limit(30))
+
+    def per_request():
+        client = MongoClient(settings.MONGO_URI)
+        try:
+            query(client[settings.MONGO_DB_NAME])
+        finally:
+            client.close()
+
+    def pooled():
+        query(get_db())
+
+    pooled()  # calentar el pool para no medir la primera conexión
+
+    rows = [
+        ("MongoClient por petición", per_request),
+        ("cliente compartido", pooled),
+    ]
+    for label, fn in rows:
+        elapsed, rps = _run(fn, opts["requests"], opts["concurrency"])
+        cmd.stdout.write(f"{label:<28} {rps:10.1f} req/s  ({elapsed:.2f}s)")
+
+    close_client()
+
+
+def bench_catalog_pages(cmd, opts):
+    """
+    Página 1 vs página N del grid de personajes: Paginator (COUNT + skip/limit)
+    contra KeysetPaginator (id > último_id). En keyset ambas deberían costar igual.
+    """
+    from django.core.paginator import Paginator
+
+    from simpsonsRankApp.core.pagination import KeysetPaginator, encode_cursor
+    from simpsonsRankApp.models import Character
+
+    per_page = 25
+    target = opts["page"]
+    qs = Character.objects.all().order_by("id")
+
+    # id del último elemento de la página anterior a la objetivo (lo que llevaría el cursor)
+    start = (target - 1) * per_page
+    boundary = list(qs.values_list("id", flat=True)[max(start - 1, 0):start])
+    if target > 1 and not boundary:
+        raise CommandError(f"No hay página {target} con {per_page} elementos por página.")
+    token = encode_cursor({"n": target, "a": boundary[0]}) if target > 1 else None
+
+    # Paginator nuevo en cada "petición" (como en la vista): incluye su COUNT
+    keyset = KeysetPaginator(qs, per_page, count_key="bench_characters")
+
+    rows = [
+        ("offset  página 1", lambda: list(Paginator(qs, per_page).get_page(1))),
+        (f"offset  página {target}", lambda: list(Paginator(qs, per_page).get_page(target))),
+        ("keyset  página 1", lambda: list(keyset.get_page(None))),
+        (f"keyset  página {target}", lambda: list(keyset.get_page(token))),
+    ]
+    for label, fn in rows:
+        elapsed, rps = _run(fn, opts["requests"], opts["concurrency"])
+        cmd.stdout.write(f"{label:<28} {rps:10.1f} req/s  ({elapsed:.2f}s)")
+
+
+def bench_search(cmd, opts):
+    """
+    Búsqueda del grid (lo que dispara grid_search.js en cada tecla):
+    regex sin anclar en Mongo contra el índice de n-gramas en memoria.
+    """
+    import re
+
+    from simpsonsRankApp.service.search import get_index, search_catalog
+
+    queries = ["h", "ho", "hom", "homer", "simp", "moe", "burns", "tavern", "xyz"]
+    col = get_db()["characters"]
+
+    def regex():
+        for q in queries:
+            list(col.find({"name": re.compile(re.escape(q), re.IGNORECASE)}, {"id": 1, "name": 1}).limit(50))
+
+    def indexed():
+        for q in queries:
+            search_catalog("character", q, limit=50)
+
+    get_index()  # construir el índice fuera de la medición
+
+    rows = [
+        ("regex en Mongo", regex),
+        ("índice n-gramas", indexed),
+    ]
+    for label, fn in rows:
+        elapsed, rps = _run(fn, opts["requests"], opts["concurrency"])
+        per_query = elapsed / (opts["requests"] * len(queries)) * 1000
+        cmd.stdout.write(f"{label:<28} {rps * len(queries):10.1f} búsquedas/s  ({per_query:.3f} ms/búsqueda)")
+
+
+class _DelayProxy:
+    """
+    Proxy TCP local que retrasa `delay` segundos cada envío cliente -> Mongo.
+    Simula red lenta para todos los clientes (pymongo sync, async y el ORM).
+    """
+
+    def __init__(self, upstream_host, upstream_port, delay):
+        self.upstream = (upstream_host, upstream_port)
+        self.delay = delay
+        self.loop = asyncio.new_event_loop()
+        self.port = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    async def _pipe(self, reader, writer, delay):
+        try:
+            while data := await reader.read(65536):
+                if delay:
+                    await asyncio.sleep(delay)
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, c_reader, c_writer):
+        u_reader, u_writer = await asyncio.open_connection(*self.upstream)
+        await asyncio.gather(
+            self._pipe(c_reader, u_writer, self.delay),
+            self._pipe(u_reader, c_writer, 0),
+        )
+
+    def _serve(self):
+        asyncio.set_event_loop(self.loop)
+        server = self.loop.run_until_complete(asyncio.start_server(self._handle, "127.0.0.1", 0))
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self.loop.run_forever()
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+        return f"mongodb://127.0.0.1:{self.port}/?directConnection=true"
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def _latencies(label, samples, cmd):
+    ms = sorted(x * 1000 for x in samples)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    cmd.stdout.write(f"{label:<28} media {statistics.mean(ms):8.1f} ms  p50 {statistics.median(ms):8.1f} ms  p95 {p95:8.1f} ms")
+
+
+def bench_catalog_async(cmd, opts):
+    """
+    Latencia de los datos de un grid (página + stats + sidebars) en frío,
+    vista sync (todo en serie) contra async (consultas independientes en
+    paralelo), con --delay-ms de retardo artificial por envío a Mongo.
+    """
+    from django.db import connections
+    from pymongo.uri_parser import parse_uri
+
+    from simpsonsRankApp.models import Episodes
+    from simpsonsRankApp.service import entity_stats, sidebars
+    from simpsonsRankApp.service.catalog import get_catalog
+    from simpsonsRankApp.service.catalog_pages import _load_page, aload_catalog_page
+
+    host, port = parse_uri(settings.MONGO_URI)["nodelist"][0]
+    proxy = _DelayProxy(host, port, opts["delay_ms"] / 1000)
+    proxy_uri = proxy.start()
+
+    # todo (cliente compartido, async y ORM) pasa por el proxy
+    original_uri = settings.MONGO_URI
+    settings.MONGO_URI = proxy_uri
+    connections["mongodb"].close()
+    connections["mongodb"].settings_dict["HOST"] = proxy_uri
+    close_client()
+
+    total = opts["requests"]
+    page = str(opts["page"]) if settings.CATALOG_PAGINATION == "offset" else None
+    get_catalog()  # el snapshot no forma parte de la petición
+
+    def sync_once():
+        qs = Episodes.objects.all().order_by("id")
+        sidebars.invalidate_sidebars("episodes")
+        page_obj = _load_page(qs, page, 25, "episodes")
+        entity_stats.stats_for(get_db(), "episodes", [e.id for e in page_obj])
+        sidebars.get_sidebars("episodes")
+
+    async def async_loop():
+        await aload_catalog_page(Episodes.objects.all().order_by("id"), page, "episodes", "episodes")
+        samples = []
+        for _ in range(total):
+            sidebars.invalidate_sidebars("episodes")
+            start = time.perf_counter()
+            await aload_catalog_page(Episodes.objects.all().order_by("id"), page, "episodes", "episodes")
+            samples.append(time.perf_counter() - start)
+        await close_async_client()
+        return samples
+
+    try:
+        sync_once()  # calentar conexiones
+        samples = []
+        for _ in range(total):
+            start = time.perf_counter()
+            sync_once()
+            samples.append(time.perf_counter() - start)
+        _latencies("sync (en serie)", samples, cmd)
+        _latencies("async (en paralelo)", asyncio.run(async_loop()), cmd)
+    finally:
+        settings.MONGO_URI = original_uri
+        connections["mongodb"].close()
+        connections["mongodb"].settings_dict["HOST"] = original_uri
+        close_client()
+        proxy.stop()
+
+
+def _legacy_statistics(db, match, with_top_users):
+    """Las ~16 consultas que hacía statistics_data antes del $facet (sin hidratar)."""
+    reviews, rankings = db["reviews"], db["rankings"]
+    reviews.count_documents(match)
+    list(reviews.aggregate([{"$match": match}, {"$group": {"_id": None, "avg": {"$avg": "$rating"}}}]))
+    list(reviews.aggregate([{"$match": match}, {"$group": {"_id": "$rating", "n": {"$sum": 1}}}, {"$sort": {"_id": 1}}]))
+    for field in ("characterCode", "episodeCode", "locationCode"):
+        has_field = {"$match": {**match, field: {"$exists": True}}}
+        list(reviews.aggregate([
+            has_field,
+            {"$group": {"_id": f"${field}", "avg": {"$avg": "$rating"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gte": 1}}}, {"$sort": {"avg": -1, "count": -1}}, {"$limit": 20},
+        ]))
+        list(reviews.aggregate([
+            has_field, {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}, {"$sort": {"count": -1}}, {"$limit": 10},
+        ]))
+        list(reviews.aggregate([
+            has_field, {"$group": {"_id": None, "avg": {"$avg": "$rating"}, "count": {"$sum": 1}}},
+        ]))
+    rankings.count_documents(match)
+    list(rankings.aggregate([
+        {"$match": match}, {"$group": {"_id": "$categoryCode", "count": {"$sum": 1}}}, {"$sort": {"count": -1}}, {"$limit": 20},
+    ]))
+    if with_top_users:
+        list(rankings.aggregate([{"$group": {"_id": "$user", "count": {"$sum": 1}}}, {"$sort": {"count": -1}}, {"$limit": 10}]))
+
+
+def _seed_statistics(db, n_reviews, n_rankings, users=5000, batch=10000):
+    """Reviews/rankings sintéticos que respetan los índices únicos (user + entidad / user + categoría)."""
+    import datetime
+    import random
+
+    from simpsonsRankApp.service import indexes
+
+    fields = ("characterCode", "episodeCode", "locationCode")
+    now = datetime.datetime.now(datetime.timezone.utc)
+    rnd = random.Random(42)
+
+    for name in ("reviews", "rankings"):
+        db[name].drop()
+    indexes.ensure_all(db)
+
+    buf = []
+    for i in range(n_reviews):
+        k = i // users
+        buf.append({
+            "user": f"user{i % users}",
+            fields[k % 3]: k // 3 + 1,
+            "rating": rnd.randint(1, 5),
+            "comment": "",
+            "reviewDate": now - datetime.timedelta(seconds=i),
+        })
+        if len(buf) >= batch:
+            db["reviews"].insert_many(buf, ordered=False)
+            buf = []
+    if buf:
+        db["reviews"].insert_many(buf, ordered=False)
+
+    buf = [{
+        "user": f"user{j % users}",
+        "categoryCode": f"cat-{j // users}",
+        "rankinList": [],
+        "rankinDate": now - datetime.timedelta(seconds=j),
+    } for j in range(n_rankings)]
+    for start in range(0, len(buf), batch):
+        db["rankings"].insert_many(buf[start:start + batch], ordered=False)
+
+
+def bench_statistics(cmd, opts):
+    """
+    /api/statistics/ sobre una BD de prueba (<MONGO_DB_NAME>_bench) con
+    --reviews reviews: las ~16 consultas de antes contra los 2 $facet.
+    La BD se siembra una vez y se reutiliza mientras tenga el tamaño pedido.
+    """
+    from simpsonsRankApp.core.mobgo import get_client
+    from simpsonsRankApp.service import statistics
+
+    db = get_client()[f"{settings.MONGO_DB_NAME}_bench"]
+    n_reviews = opts["reviews"]
+    if db["reviews"].estimated_document_count() != n_reviews:
+        cmd.stdout.write(f"Sembrando {n_reviews} reviews en {db.name}...")
+        _seed_statistics(db, n_reviews, n_rankings=max(1, n_reviews // 20))
+
+    if opts["scope"] == "global":
+        match, with_top_users = {}, True
+    else:
+        match, with_top_users = {"user": "user7"}, False
+
+    def facet():
+        list(db["reviews"].aggregate(statistics.review_pipeline(match)))
+        list(db["rankings"].aggregate(statistics.ranking_pipeline(match, with_top_users)))
+
+    rows = [
+        ("16 consultas (antes)", lambda: _legacy_statistics(db, match, with_top_users)),
+        ("2 x $facet", facet),
+    ]
+    for label, fn in rows:
+        samples = []
+        for _ in range(opts["requests"]):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+        _latencies(label, samples, cmd)
+
+
+def bench_catalog_file(cmd, opts):
+    """
+    Arranque en frío del catálogo: leer las 3 colecciones de Mongo contra abrir
+    el fichero columnar (mmap) y construir los registros, más la búsqueda por id
+    directamente sobre el mmap.
+    """
+    import os
+    import random
+    import tempfile
+
+    from simpsonsRankApp.service import catalog_file
+    from simpsonsRankApp.service.catalog import CATALOG_TYPES, load_snapshot
+
+    db = get_db()
+    snapshot = load_snapshot(db, use_file=False)
+    fd, path = tempfile.mkstemp(suffix=".bin")
+    os.close(fd)
+    try:
+        catalog_file.write_snapshot(snapshot, path)
+        cmd.stdout.write(f"fichero: {os.path.getsize(path) / 1024:.0f} KiB")
+
+        def from_file():
+            cf = catalog_file.CatalogFile(path)
+            for t in CATALOG_TYPES:
+                cf.records(t)
+            cf.close()
+
+        rows = [
+            ("Mongo (3 find)", lambda: load_snapshot(db, use_file=False)),
+            ("mmap + registros", from_file),
+        ]
+        for label, fn in rows:
+            samples = []
+            for _ in range(min(opts["requests"], 50)):
+                start = time.perf_counter()
+                fn()
+                samples.append(time.perf_counter() - start)
+            _latencies(label, samples, cmd)
+
+        cf = catalog_file.CatalogFile(path)
+        ids = list(cf.ids("characters")) or [1]
+        lookups = [random.choice(ids) for _ in range(opts["requests"] * 100)]
+        start = time.perf_counter()
+        for _id in lookups:
+            cf.raw("characters", _id, "name")
+        per_lookup = (time.perf_counter() - start) / len(lookups) * 1e6
+        cmd.stdout.write(f"{'raw(characters, id, name)':<28} {per_lookup:10.2f} µs/búsqueda")
+        cf.close()
+    finally:
+        os.remove(path)
+
+
+def bench_card_grid(cmd, opts):
+    """
+    CPU de render de home/episodios/localizaciones (página --page): sin caché de
+    fragmentos, con el grid en caché y con la caché pero stats de la página
+    cambiadas (solo se repintan estrellas y contadores).
+    """
+    from django.contrib.auth.models import AnonymousUser
+    from django.core.cache import cache
+    from django.test import RequestFactory
+
+    from simpsonsRankApp.core.pagination import paginate_catalog
+    from simpsonsRankApp.models import Character, Episodes, Locations
+    from simpsonsRankApp.service import entity_stats
+    from simpsonsRankApp.views import episodes, home, locations
+
+    pages = [
+        ("characters", Character.objects.all(), home._render),
+        ("episodes", Episodes.objects.all().order_by("id"), episodes._render),
+        ("locations", Locations.objects.all().order_by("id"), locations._render),
+    ]
+    factory = RequestFactory()
+    n = min(opts["requests"], 200)
+
+    for entity_type, qs, render in pages:
+        page_obj = paginate_catalog(qs, str(opts["page"]), 25, count_key=entity_type)
+        list(page_obj)
+        page_obj.paginator.num_pages
+        stats_map = entity_stats.stats_for(get_db(), entity_type, [o.id for o in page_obj])
+
+        def run(stats=stats_map):
+            request = factory.get("/")
+            request.user = AnonymousUser()
+            render(request, page_obj, stats, [], [])
+
+        def changed_stats():
+            # una review nueva en la primera card de la página
+            first = page_obj[0].id if len(page_obj) else 0
+            st = stats_map.get(first, {"avg": 0, "count": 0})
+            stats_map[first] = {"avg": st["avg"], "count": st["count"] + 1}
+            run()
+
+        rows = [
+            ("sin caché", lambda: (cache.clear(), run())),
+            ("grid en caché", run),
+            ("stats cambiadas", changed_stats),
+        ]
+        run()  # calentar templates
+        for label, fn in rows:
+            start = time.process_time()
+            for _ in range(n):
+                fn()
+            ms = (time.process_time() - start) / n * 1000
+            cmd.stdout.write(f"{entity_type + ' · ' + label:<34} {ms:8.2f} ms CPU/petición")
+
+
+SCENARIOS = {
+    "mongo_client": bench_mongo_client,
+    "catalog_pages": bench_catalog_pages,
+    "search": bench_search,
+    "catalog_async": bench_catalog_async,
+    "statistics": bench_statistics,
+    "catalog_file": bench_catalog_file,
+    "card_grid": bench_card_grid,
+}
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmarks de las rutas calientes contra el MongoDB configurado."
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenario", choices=sorted(SCENARIOS))
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--page", type=int, default=47, help="Página profunda (catalog_pages, card_grid).")
+        parser.add_argument("--delay-ms", type=float, default=20,
+                            help="Retardo simulado por envío a Mongo (catalog_async).")
+        parser.add_argument("--reviews", type=int, default=1_000_000,
+                            help="Tamaño de la BD de prueba (statistics).")
+        parser.add_argument("--scope", choices=["global", "me"], default="global",
+                            help="Ámbito de /api/statistics/ (statistics).")
+
+    def handle(self, *args, **opts):
+        if opts["requests"] <= 0:
+            raise CommandError("--requests debe ser > 0")
+
+        self.stdout.write(
+            f"== {opts['scenario']} · {opts['requests']} peticiones · concurrencia {opts['concurrency']} =="
+        )
+        SCENARIOS[opts["scenario"]](self, opts)
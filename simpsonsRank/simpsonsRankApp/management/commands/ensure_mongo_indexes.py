@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from simpsonsRankApp.core.mobgo import get_db
+from simpsonsRankApp.service import indexes
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea (idempotente) los índices de Mongo que usan las vistas. "
+        "Con --verify no crea nada: lanza explain() de cada consulta y falla si alguna hace COLLSCAN."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verify", action="store_true")
+
+    def handle(self, *args, **opts):
+        db = get_db()
+
+        if opts["verify"]:
+            failed = []
+            for label, ok in indexes.verify(db):
+                if ok:
+                    self.stdout.write(f"[IXSCAN] {label}")
+                else:
+                    failed.append(label)
+                    self.stdout.write(self.style.ERROR(f"[COLLSCAN] {label}"))
+            if failed:
+                raise CommandError(f"{len(failed)} consultas sin índice. Ejecuta ensure_mongo_indexes.")
+            self.stdout.write(self.style.SUCCESS("Todas las consultas usan índice."))
+            return
+
+        errors = 0
+        for col_name, name, error in indexes.ensure_all(db):
+            if error:
+                errors += 1
+                self.stdout.write(self.style.ERROR(f"[ERROR] {col_name}.{name}: {error}"))
+            else:
+                self.stdout.write(f"[OK] {col_name}.{name}")
+
+        if errors:
+            raise CommandError(f"{errors} índices no se pudieron crear.")
+        self.stdout.write(self.style.SUCCESS("Índices al día."))
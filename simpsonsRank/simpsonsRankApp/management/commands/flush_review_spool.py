@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from simpsonsRankApp.core.mobgo import get_db
+from simpsonsRankApp.service import review_queue
+from simpsonsRankApp.service.reviews import MissingReviewIndexes
+
+
+class Command(BaseCommand):
+    help = "Reaplica en Mongo las reviews del spool de write-behind de procesos que ya no están vivos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--spool-dir", default=None, help="Por defecto settings.REVIEW_SPOOL_DIR.")
+        parser.add_argument("--force", action="store_true",
+                            help="Sin fcntl (Windows): reaplica todo el spool. Solo con los servidores parados.")
+
+    def handle(self, *args, **opts):
+        spool_dir = opts["spool_dir"] or getattr(settings, "REVIEW_SPOOL_DIR", settings.BASE_DIR / "review_spool")
+        try:
+            recovered = review_queue.recover_orphans(
+                get_db(), spool_dir, batch_size=getattr(settings, "REVIEW_FLUSH_BATCH", 500),
+                force=opts["force"],
+            )
+        except MissingReviewIndexes as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"[OK] {recovered} reviews reaplicadas desde {spool_dir}."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from simpsonsRankApp.core.mobgo import get_db
+from simpsonsRankApp.service import category_positions
+
+
+class Command(BaseCommand):
+    help = "Recalcula los acumuladores de posiciones por categoría (category_positions) desde rankings."
+
+    def handle(self, *args, **opts):
+        written, removed = category_positions.rebuild(get_db())
+        self.stdout.write(self.style.SUCCESS(
+            f"[OK] {written} categorías escritas, {removed} acumuladores huérfanos borrados."
+        ))
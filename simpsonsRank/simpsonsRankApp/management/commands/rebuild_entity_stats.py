@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from simpsonsRankApp.core.mobgo import get_db
+from simpsonsRankApp.service import entity_stats
+
+
+class Command(BaseCommand):
+    help = "Recalcula la colección entity_stats desde reviews (backfill) o comprueba que cuadra (--check)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--type", choices=sorted(entity_stats.REVIEW_FIELDS), action="append", dest="types")
+        parser.add_argument("--check", action="store_true", help="Solo compara, no escribe nada.")
+
+    def handle(self, *args, **opts):
+        db = get_db()
+        types = opts["types"] or list(entity_stats.REVIEW_FIELDS)
+
+        if not opts["check"]:
+            entity_stats.ensure_indexes(db)
+            for t in types:
+                written, removed = entity_stats.rebuild(db, t)
+                self.stdout.write(self.style.SUCCESS(f"[OK] {t}: {written} stats escritas, {removed} huérfanas borradas."))
+            return
+
+        total = 0
+        for t in types:
+            mismatches = entity_stats.check(db, t)
+            total += len(mismatches)
+            if not mismatches:
+                self.stdout.write(self.style.SUCCESS(f"[OK] {t}: consistente."))
+                continue
+            self.stdout.write(self.style.WARNING(f"[DIFF] {t}: {len(mismatches)} entidades no cuadran."))
+            for eid, expected, got in mismatches[:20]:
+                self.stdout.write(f"  id={eid} esperado(count, sum, hist)={expected} guardado={got}")
+
+        if total:
+            raise CommandError(f"{total} entidades inconsistentes. Ejecuta rebuild_entity_stats sin --check.")
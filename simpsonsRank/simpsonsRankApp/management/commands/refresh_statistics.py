@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from pymongo.errors import PyMongoError
+
+from simpsonsRankApp.core.mobgo import get_db
+from simpsonsRankApp.service import statistics
+
+
+class Command(BaseCommand):
+    help = "Regenera el snapshot de estadísticas globales que sirve /api/statistics/?scope=global."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--every", type=int, default=0,
+                            help="Repite cada N segundos en lugar de una sola vez (lanzar en UN solo proceso).")
+
+    def handle(self, *args, **opts):
+        db = get_db()
+        while True:
+            start = time.perf_counter()
+            try:
+                generated_at = statistics.refresh_global_snapshot(db)
+            except PyMongoError as e:
+                if not opts["every"]:
+                    raise CommandError(f"No se pudo generar el snapshot: {e}")
+                # en bucle no se corta: el siguiente intento puede ir bien
+                self.stderr.write(f"[ERROR] no se pudo generar el snapshot: {e}")
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"[OK] snapshot global generado {generated_at:%Y-%m-%d %H:%M:%S} UTC "
+                    f"({time.perf_counter() - start:.2f}s)"
+                ))
+            if not opts["every"]:
+                return
+            time.sleep(opts["every"])
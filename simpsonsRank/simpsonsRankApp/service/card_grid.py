@@ -0,0 +1,37 @@
+import hashlib
+
+from django.conf import settings
+
+from simpsonsRankApp.service.catalog import get_catalog
+
+# =========================
+# Claves de la caché de fragmentos de los grids
+# =========================
+# home / episodios / localizaciones envuelven el grid en {% cache %}:
+#   grid completo   -> (página, versión del catálogo, versión de las stats de la página)
+#   partes fijas    -> (id, versión del catálogo) dentro de cada card
+# Con el grid en caché la vista no construye las cards (se le pasan como
+# callable) ni el template las recorre. Si cambian las valoraciones de la
+# página solo se vuelven a pintar las estrellas/contadores: lo demás de cada
+# card sale de su fragmento.
+
+
+def _stats_version(ids, stats_map):
+    """Huella de (avg, count) de los ids de la página: cambia solo si cambia algo visible."""
+    h = hashlib.sha1()
+    for _id in ids:
+        st = stats_map.get(_id) or {}
+        h.update(f"{_id}:{st.get('avg', 0)}:{st.get('count', 0)};".encode())
+    return h.hexdigest()[:16]
+
+
+def grid_keys(page_obj, stats_map):
+    """Contexto "grid" para los {% cache %} del template."""
+    ids = [o.id for o in page_obj]
+    return {
+        "ttl": getattr(settings, "CARD_GRID_CACHE_TTL", 600),
+        # mismos ids = mismo contenido, da igual el paginador (offset o keyset)
+        "page": f"{ids[0]}-{ids[-1]}-{len(ids)}" if ids else "empty",
+        "catalog": get_catalog().version_tag,
+        "stats": _stats_version(ids, stats_map),
+    }
@@ -0,0 +1,251 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from simpsonsRankApp.core.mobgo import get_db
+from simpsonsRankApp.service import versions
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Snapshot del catálogo en memoria
+# =========================
+# Personajes, episodios y localizaciones son pocos (~1.2k / 0.8k / 0.5k) y casi
+# nunca cambian. Se cargan UNA vez por proceso en registros con __slots__ y
+# se sirven con get(type, id) en O(1), sin ir a Mongo en cada petición.
+# La versión de cada colección vive en "versions" (catalog:<colección>):
+# upload_json / import_to_mongo la incrementan y aquí se comprueba como mucho
+# cada CATALOG_VERSION_CHECK_SECONDS para recargar.
+# Si CATALOG_FILE (build_catalog_file) es de las versiones actuales, los
+# registros salen de ese fichero mapeado en vez de consultar Mongo.
+
+CDN = "https://cdn.thesimpsonsapi.com/1280"
+
+CATALOG_TYPES = ("characters", "episodes", "locations")
+
+
+def version_key(entity_type):
+    return f"catalog:{entity_type}"
+
+
+def _img(path):
+    return (CDN + path) if path else None
+
+
+def opt_int(value):
+    """Entero o None: así el registro es igual leído de Mongo o de CATALOG_FILE."""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class CharacterRec:
+    __slots__ = ("id", "name", "occupation", "portrait_path", "age", "status", "description", "quote")
+
+    type = "characters"
+    projection = {"_id": 0, "id": 1, "name": 1, "occupation": 1, "portrait_path": 1,
+                  "age": 1, "status": 1, "description": 1, "phrases": {"$slice": 1}}
+
+    def __init__(self, d):
+        phrases = d.get("phrases") if isinstance(d.get("phrases"), list) else []
+        self.id = int(d["id"])
+        self.name = d.get("name") or ""
+        self.occupation = d.get("occupation") or ""
+        self.portrait_path = d.get("portrait_path") or ""
+        self.age = opt_int(d.get("age"))
+        self.status = d.get("status") or ""
+        self.description = d.get("description") or ""
+        self.quote = phrases[0] if phrases else ""
+
+    @property
+    def img(self):
+        return _img(self.portrait_path)
+
+    @property
+    def subtitle(self):
+        return self.occupation
+
+
+class EpisodeRec:
+    __slots__ = ("id", "name", "season", "episode_number", "airdate", "image_path", "synopsis")
+
+    type = "episodes"
+    projection = {"_id": 0, "id": 1, "name": 1, "season": 1, "episode_number": 1,
+                  "airdate": 1, "image_path": 1, "synopsis": 1}
+
+    def __init__(self, d):
+        self.id = int(d["id"])
+        self.name = d.get("name") or ""
+        self.season = opt_int(d.get("season"))
+        self.episode_number = opt_int(d.get("episode_number"))
+        self.airdate = d.get("airdate")
+        self.image_path = d.get("image_path") or ""
+        self.synopsis = d.get("synopsis") or ""
+
+    @property
+    def img(self):
+        return _img(self.image_path)
+
+    @property
+    def subtitle(self):
+        return f"S{self.season} · E{self.episode_number}"
+
+
+class LocationRec:
+    __slots__ = ("id", "name", "town", "use", "image_path")
+
+    type = "locations"
+    projection = {"_id": 0, "id": 1, "name": 1, "town": 1, "use": 1, "image_path": 1}
+
+    def __init__(self, d):
+        self.id = int(d["id"])
+        self.name = d.get("name") or ""
+        self.town = d.get("town") or ""
+        self.use = d.get("use") or ""
+        self.image_path = d.get("image_path") or ""
+
+    @property
+    def img(self):
+        return _img(self.image_path)
+
+    @property
+    def subtitle(self):
+        return self.town
+
+
+RECORD_CLASSES = {
+    "characters": CharacterRec,
+    "episodes": EpisodeRec,
+    "locations": LocationRec,
+}
+
+
+class CatalogSnapshot:
+    """Vista inmutable del catálogo. Se reemplaza entera al recargar."""
+
+    def __init__(self, records=None, version=None):
+        self.records = records or {t: {} for t in CATALOG_TYPES}  # type -> {id: rec}
+        self.version = version or {t: 0 for t in CATALOG_TYPES}
+        # cards {type, id, label, img, subtitle} precalculadas (las que usan los modales/estadísticas)
+        self.cards = {
+            t: {
+                _id: {"type": t, "id": _id, "label": r.name, "img": r.img, "subtitle": r.subtitle or ""}
+                for _id, r in recs.items()
+            }
+            for t, recs in self.records.items()
+        }
+
+    def get(self, entity_type, entity_id):
+        try:
+            return self.records.get(entity_type, {}).get(int(entity_id))
+        except (TypeError, ValueError):
+            return None
+
+    def card(self, entity_type, entity_id):
+        """Card precalculada (¡no mutarla!: usar {**card, ...}) o None."""
+        try:
+            return self.cards.get(entity_type, {}).get(int(entity_id))
+        except (TypeError, ValueError):
+            return None
+
+    def all(self, entity_type):
+        return self.records.get(entity_type, {}).values()
+
+    @property
+    def version_tag(self):
+        """Versión compacta (para claves de caché): "c7.e2.l3"."""
+        return ".".join(f"{t[0]}{self.version.get(t, 0)}" for t in CATALOG_TYPES)
+
+
+def load_snapshot(db, use_file=True):
+    current = versions.get_versions(db, [version_key(t) for t in CATALOG_TYPES])
+    current = {t: current[version_key(t)] for t in CATALOG_TYPES}
+
+    mapped = _from_catalog_file(current) if use_file else None
+    if mapped is not None:
+        return mapped
+
+    records = {}
+    for t, cls in RECORD_CLASSES.items():
+        recs = {}
+        for d in db[t].find({"id": {"$exists": True}}, cls.projection):
+            try:
+                rec = cls(d)
+            except (TypeError, ValueError, KeyError):
+                continue
+            recs[rec.id] = rec
+        records[t] = recs
+    return CatalogSnapshot(records, current)
+
+
+def _from_catalog_file(current):
+    """Snapshot desde CATALOG_FILE (build_catalog_file) si existe y es de estas versiones; si no, None."""
+    path = getattr(settings, "CATALOG_FILE", None)
+    if not path:
+        return None
+    from simpsonsRankApp.service import catalog_file
+
+    try:
+        cf = catalog_file.open_catalog_file(path)
+    except (OSError, catalog_file.CatalogFileError):
+        logger.warning("No se pudo abrir %s; se carga el catálogo desde Mongo", path, exc_info=True)
+        return None
+    if cf is None or cf.version != current:
+        return None  # sin fichero o desactualizado: Mongo
+    return CatalogSnapshot({t: cf.records(t) for t in CATALOG_TYPES}, dict(cf.version))
+
+
+_lock = threading.Lock()
+_snapshot = None
+_checked_at = 0.0
+_listeners = []
+
+
+def on_reload(fn):
+    """Registra fn(snapshot) para reconstruir cosas derivadas del catálogo (índices, cachés...)."""
+    _listeners.append(fn)
+    return fn
+
+
+def get_catalog():
+    """Snapshot actual del proceso; recarga si alguna colección cambió de versión."""
+    global _snapshot, _checked_at
+
+    snap = _snapshot
+    interval = getattr(settings, "CATALOG_VERSION_CHECK_SECONDS", 5)
+    if snap is not None and (time.monotonic() - _checked_at) < interval:
+        return snap
+
+    with _lock:
+        if _snapshot is not None and (time.monotonic() - _checked_at) < interval:
+            return _snapshot
+        try:
+            db = get_db()
+            if _snapshot is not None:
+                current = versions.get_versions(db, [version_key(t) for t in CATALOG_TYPES])
+                if all(current[version_key(t)] == _snapshot.version.get(t) for t in CATALOG_TYPES):
+                    _checked_at = time.monotonic()
+                    return _snapshot
+
+            _snapshot = load_snapshot(db)
+            for fn in _listeners:
+                fn(_snapshot)
+        except Exception:
+            # sin Mongo: seguimos con lo último que tengamos (o vacío, con
+            # versión -1 para que el siguiente chequeo vuelva a intentarlo)
+            if _snapshot is None:
+                _snapshot = CatalogSnapshot(version={t: -1 for t in CATALOG_TYPES})
+        _checked_at = time.monotonic()
+        return _snapshot
+
+
+def mark_changed(db, *entity_types):
+    """Llamar tras modificar una colección del catálogo: sube su versión y fuerza recarga local."""
+    global _checked_at
+    versions.bump(db, *[version_key(t) for t in entity_types if t in CATALOG_TYPES])
+    _checked_at = 0.0
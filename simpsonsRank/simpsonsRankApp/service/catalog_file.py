@@ -0,0 +1,274 @@
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+
+from simpsonsRankApp.service.catalog import CATALOG_TYPES, RECORD_CLASSES, opt_int
+
+# =========================
+# Catálogo en fichero binario columnar (mmap)
+# =========================
+# build_catalog_file compila el snapshot (personajes, episodios, localizaciones)
+# en un único fichero; los procesos lo abren con mmap de solo lectura, así que
+# todos los workers comparten las mismas páginas físicas (page cache) y
+# arrancar es abrir el fichero, sin consultas a Mongo ni JSON que parsear.
+#
+# Formato (little-endian, secciones alineadas a 8 bytes):
+#   MAGIC (8) | u32 largo de la cabecera | cabecera JSON | relleno | secciones...
+# (los offsets de la cabecera son relativos al inicio de las secciones)
+# La cabecera guarda las versiones del catálogo con que se generó y, por tipo:
+#   ids      int64[n] ordenados (búsqueda binaria)
+#   ints     int64[n] por columna entera (NULL_INT = sin valor)
+#   strs     uint32[n+1] offsets en el heap + uint8[n] nulos, por columna
+#   heap     bytes UTF-8 de todas las cadenas del tipo
+# get()/raw() leen directamente del mmap: raw() devuelve un memoryview sin copiar.
+
+MAGIC = b"SRCAT01\n"
+NULL_INT = -(2 ** 63)
+_ALIGN = 8
+
+# columnas enteras por tipo; el resto de __slots__ del registro son cadenas
+INT_COLUMNS = {
+    "characters": ("id", "age"),
+    "episodes": ("id", "season", "episode_number"),
+    "locations": ("id",),
+}
+
+
+class CatalogFileError(ValueError):
+    pass
+
+
+def columns(entity_type):
+    """(enteras, cadenas) en el orden en que se guardan."""
+    ints = INT_COLUMNS[entity_type]
+    strs = tuple(s for s in RECORD_CLASSES[entity_type].__slots__ if s not in ints)
+    return ints, strs
+
+
+def _as_int(value):
+    # los registros ya vienen normalizados con opt_int (ver catalog.py)
+    value = opt_int(value)
+    return NULL_INT if value is None else value
+
+
+# =========================
+# Escritura
+# =========================
+class _Builder:
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def add(self, data):
+        pad = -self.size % _ALIGN
+        if pad:
+            self.chunks.append(b"\0" * pad)
+            self.size += pad
+        offset = self.size
+        self.chunks.append(data)
+        self.size += len(data)
+        return offset
+
+
+def _pack(fmt, values):
+    return struct.pack(f"<{len(values)}{fmt}", *values)
+
+
+def write_snapshot(snapshot, path):
+    """Escribe el snapshot en `path` (fichero temporal + rename). Devuelve {type: filas}."""
+    body = _Builder()
+    tables = {}
+
+    for t in CATALOG_TYPES:
+        recs = sorted(snapshot.all(t), key=lambda r: r.id)
+        ints, strs = columns(t)
+
+        spec = {"rows": len(recs), "ints": {}, "strs": {}}
+        for col in ints:
+            spec["ints"][col] = body.add(_pack("q", [_as_int(getattr(r, col)) for r in recs]))
+
+        heap = bytearray()
+        for col in strs:
+            offsets, nulls = [], bytearray()
+            for r in recs:
+                value = getattr(r, col)
+                offsets.append(len(heap))
+                nulls.append(value is None)
+                if value is not None:
+                    heap += str(value).encode("utf-8")
+            offsets.append(len(heap))
+            if len(heap) >= 2 ** 32:
+                raise CatalogFileError(f"{t}: el heap de cadenas supera 4 GiB")
+            spec["strs"][col] = [body.add(_pack("I", offsets)), body.add(bytes(nulls))]
+        spec["heap"] = [body.add(bytes(heap)), len(heap)]
+        tables[t] = spec
+
+    header = json.dumps(
+        {"versions": dict(snapshot.version), "tables": tables},
+        separators=(",", ":"),
+    ).encode("utf-8")
+    prefix = len(MAGIC) + 4 + len(header)
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        f.write(b"\0" * (_data_start(prefix) - prefix))
+        for chunk in body.chunks:
+            f.write(chunk)
+    # rename atómico: quien tenga mapeado el fichero anterior lo sigue viendo entero
+    os.replace(tmp, path)
+    return {t: tables[t]["rows"] for t in CATALOG_TYPES}
+
+
+def _data_start(prefix):
+    """Las secciones empiezan tras la cabecera, alineadas; sus offsets son relativos a ese punto."""
+    return prefix + (-prefix % _ALIGN)
+
+
+# =========================
+# Lectura
+# =========================
+class _Table:
+    def __init__(self, view, entity_type, spec):
+        n = spec["rows"]
+        self.type = entity_type
+        self.rows = n
+        self.int_cols = {c: view[o:o + 8 * n].cast("q") for c, o in spec["ints"].items()}
+        self.str_cols = {
+            c: (view[o:o + 4 * (n + 1)].cast("I"), view[z:z + n])
+            for c, (o, z) in spec["strs"].items()
+        }
+        start, length = spec["heap"]
+        self.heap = view[start:start + length]
+        self.ids = self.int_cols["id"]
+
+    def index(self, entity_id):
+        i = bisect.bisect_left(self.ids, entity_id)
+        return i if i < self.rows and self.ids[i] == entity_id else None
+
+    def raw(self, col, i):
+        offsets, nulls = self.str_cols[col]
+        if nulls[i]:
+            return None
+        return self.heap[offsets[i]:offsets[i + 1]]
+
+    def value(self, col, i):
+        if col in self.int_cols:
+            v = self.int_cols[col][i]
+            return None if v == NULL_INT else v
+        raw = self.raw(col, i)
+        return None if raw is None else str(raw, "utf-8")
+
+    def release(self):
+        views = [self.heap, *self.int_cols.values()]
+        for offsets, nulls in self.str_cols.values():
+            views += [offsets, nulls]
+        for v in views:
+            v.release()
+
+
+class CatalogFile:
+    """Fichero de catálogo mapeado en memoria (solo lectura)."""
+
+    def __init__(self, path):
+        if sys.byteorder != "little":
+            raise CatalogFileError("el formato es little-endian")
+        with open(path, "rb") as f:
+            self.stat = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.path = path
+        self._view = memoryview(self._mm)
+        try:
+            if self._view[:len(MAGIC)] != MAGIC:
+                raise CatalogFileError(f"{path}: no es un fichero de catálogo")
+            (header_len,) = struct.unpack_from("<I", self._mm, len(MAGIC))
+            start = len(MAGIC) + 4
+            header = json.loads(bytes(self._view[start:start + header_len]))
+            self.version = {t: int(header["versions"].get(t, 0)) for t in CATALOG_TYPES}
+            data = self._view[_data_start(start + header_len):]
+            self._views = [data]
+            self._tables = {t: _Table(data, t, header["tables"][t]) for t in CATALOG_TYPES}
+        except (KeyError, TypeError, ValueError, struct.error) as e:
+            self.close()
+            if isinstance(e, CatalogFileError):
+                raise
+            raise CatalogFileError(f"{path}: fichero de catálogo corrupto ({e})") from e
+
+    def count(self, entity_type):
+        return self._tables[entity_type].rows
+
+    def ids(self, entity_type):
+        """memoryview int64 con los ids ordenados (sin copia)."""
+        return self._tables[entity_type].ids
+
+    def raw(self, entity_type, entity_id, col):
+        """Bytes UTF-8 de una columna de texto como memoryview del mmap, o None."""
+        table = self._tables.get(entity_type)
+        try:
+            i = table.index(int(entity_id)) if table else None
+        except (TypeError, ValueError):
+            return None
+        return None if i is None else table.raw(col, i)
+
+    def get(self, entity_type, entity_id):
+        """{columna: valor} de una fila, o None."""
+        table = self._tables.get(entity_type)
+        try:
+            i = table.index(int(entity_id)) if table else None
+        except (TypeError, ValueError):
+            return None
+        if i is None:
+            return None
+        ints, strs = columns(entity_type)
+        return {c: table.value(c, i) for c in ints + strs}
+
+    def records(self, entity_type):
+        """{id: registro} con las mismas clases que CatalogSnapshot."""
+        table = self._tables[entity_type]
+        cls = RECORD_CLASSES[entity_type]
+        ints, strs = columns(entity_type)
+        out = {}
+        for i in range(table.rows):
+            rec = cls.__new__(cls)
+            for c in ints + strs:
+                setattr(rec, c, table.value(c, i))
+            out[rec.id] = rec
+        return out
+
+    def close(self):
+        for table in getattr(self, "_tables", {}).values():
+            table.release()
+        for v in getattr(self, "_views", []):
+            v.release()
+        self._view.release()
+        try:
+            self._mm.close()
+        except BufferError:
+            pass  # quedan memoryviews vivos (p.ej. en un traceback): se libera al recolectarlos
+
+
+_lock = threading.Lock()
+_opened = None
+
+
+def open_catalog_file(path):
+    """CatalogFile de `path` (uno por proceso; se reabre si el fichero se reemplaza). None si no existe."""
+    global _opened
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    with _lock:
+        cur = _opened
+        if cur is not None and cur.path == str(path) and (cur.stat.st_ino, cur.stat.st_mtime_ns) == (st.st_ino, st.st_mtime_ns):
+            return cur
+        # el anterior no se cierra: puede haber memoryviews suyos en uso;
+        # el mmap se libera cuando deja de estar referenciado
+        _opened = CatalogFile(str(path))
+        return _opened
@@ -0,0 +1,226 @@
+import hashlib
+import json
+
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+
+from simpsonsRankApp.core.jsonstream import JSONStreamError
+
+# =========================
+# Importación de colecciones del catálogo por lotes
+# =========================
+# Los documentos llegan de un iterador (core.jsonstream) y se escriben en
+# lotes de batch_size: nunca hay más de un lote en memoria. Cada lote se
+# valida y deja su línea en el informe (recibidos, escritos, errores).
+#
+# Dos modos:
+#   import_stream  -> insert (opcionalmente vaciando antes la colección)
+#   upsert_stream  -> por "id" de la API con huella (_fp): solo se escriben
+#                     los documentos nuevos o cambiados y la colección nunca
+#                     queda vacía mientras dura la importación.
+# No depende de Django: también lo usa static/json/import_to_mongo.py.
+
+FINGERPRINT_FIELD = "_fp"
+
+MAX_ERRORS_PER_BATCH = 5
+
+
+def validate_doc(doc):
+    """Mensaje de error o None si el documento se puede importar."""
+    if not isinstance(doc, dict):
+        return f"no es un objeto JSON ({type(doc).__name__})"
+    if "id" not in doc:
+        return "falta el campo 'id'"
+    try:
+        int(doc["id"])
+    except (TypeError, ValueError):
+        return f"'id' no es numérico ({doc['id']!r})"
+    bad = [k for k in doc if not isinstance(k, str) or k.startswith("$")]
+    if bad:
+        return f"claves no válidas para Mongo: {bad[:3]}"
+    return None
+
+
+def _batches(docs, size):
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def new_report():
+    return {
+        "batches": [], "received": 0, "written": 0, "invalid": 0, "failed": 0, "error": None,
+        # solo upsert
+        "inserted": 0, "updated": 0, "unchanged": 0, "removed": 0,
+    }
+
+
+def fingerprint(doc):
+    """Huella estable del contenido (sin _id ni la propia huella)."""
+    body = {k: v for k, v in doc.items() if k not in ("_id", FINGERPRINT_FIELD)}
+    raw = json.dumps(body, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _validate_batch(batch, position):
+    """Devuelve (válidos, errores, nueva posición)."""
+    valid, errors = [], []
+    for doc in batch:
+        position += 1
+        problem = validate_doc(doc)
+        if problem:
+            errors.append(f"documento {position}: {problem}")
+        else:
+            valid.append(doc)
+    return valid, errors, position
+
+
+def _write_batch(col, docs):
+    """insert_many del lote. Devuelve (escritos, [errores])."""
+    try:
+        col.insert_many(docs, ordered=False)
+        return len(docs), []
+    except BulkWriteError as e:
+        details = e.details or {}
+        errors = [f"escritura: {w.get('errmsg', '')}" for w in details.get("writeErrors", [])]
+        return int(details.get("nInserted", 0)), errors
+
+
+def import_stream(db, collection, docs, batch_size=1000, reset=False):
+    """Importa `docs` (iterable) en `collection`. Devuelve el informe (ver new_report)."""
+    col = db[collection]
+    report = new_report()
+    position = 0
+
+    # el reset espera al primer lote: un fichero que ni siquiera empieza bien no vacía nada
+    pending_reset = reset
+
+    try:
+        for n, batch in enumerate(_batches(docs, batch_size), start=1):
+            if pending_reset:
+                col.delete_many({})
+                pending_reset = False
+
+            valid, errors, position = _validate_batch(batch, position)
+            written, write_errors = _write_batch(col, valid) if valid else (0, [])
+
+            report["received"] += len(batch)
+            report["written"] += written
+            report["invalid"] += len(batch) - len(valid)
+            report["failed"] += len(valid) - written
+            report["batches"].append({
+                "batch": n,
+                "received": len(batch),
+                "written": written,
+                "errors": (errors + write_errors)[:MAX_ERRORS_PER_BATCH],
+                "error_count": len(errors) + len(write_errors),
+            })
+    except JSONStreamError as e:
+        # los lotes anteriores ya están escritos; se informa de dónde se cortó
+        report["error"] = str(e)
+
+    if pending_reset and report["error"] is None:
+        col.delete_many({})  # lista vacía + reset: la colección queda vacía, como antes
+
+    return report
+
+
+def _upsert_batch(col, docs):
+    """Escribe solo lo nuevo/cambiado del lote. Devuelve (insertados, actualizados, sin cambios, [errores])."""
+    by_id = {}
+    for doc in docs:
+        by_id[int(doc["id"])] = doc  # ids repetidos en el fichero: gana el último
+
+    stored = {
+        int(d["id"]): d.get(FINGERPRINT_FIELD)
+        for d in col.find({"id": {"$in": list(by_id)}}, {"_id": 0, "id": 1, FINGERPRINT_FIELD: 1})
+    }
+
+    ops, unchanged = [], 0
+    for _id, doc in by_id.items():
+        fp = fingerprint(doc)
+        if stored.get(_id) == fp:
+            unchanged += 1
+            continue
+        body = {k: v for k, v in doc.items() if k != "_id"}
+        ops.append(ReplaceOne({"id": _id}, {**body, "id": _id, FINGERPRINT_FIELD: fp}, upsert=True))
+
+    if not ops:
+        return 0, 0, unchanged, []
+
+    try:
+        result = col.bulk_write(ops, ordered=False)
+        return result.upserted_count, result.matched_count, unchanged, []
+    except BulkWriteError as e:
+        details = e.details or {}
+        errors = [f"escritura: {w.get('errmsg', '')}" for w in details.get("writeErrors", [])]
+        return int(details.get("nUpserted", 0)), int(details.get("nMatched", 0)), unchanged, errors
+
+
+def _delete_missing(col, seen, batch_size):
+    """Borra los documentos cuyo id no venía en el fichero. Devuelve cuántos."""
+    missing = [
+        d["id"] for d in col.find({}, {"_id": 0, "id": 1})
+        if _as_int(d.get("id")) not in seen
+    ]
+    removed = 0
+    for start in range(0, len(missing), batch_size):
+        removed += col.delete_many({"id": {"$in": missing[start:start + batch_size]}}).deleted_count
+    return removed
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def upsert_stream(db, collection, docs, batch_size=1000, delete_missing=False):
+    """
+    Importación idempotente por "id": inserta lo nuevo, reemplaza lo cambiado
+    (según la huella) y no toca lo igual. Con delete_missing borra al final lo
+    que no venía en el fichero (solo si se ha leído entero sin errores).
+    """
+    col = db[collection]
+    report = new_report()
+    position = 0
+    seen = set()
+
+    try:
+        for n, batch in enumerate(_batches(docs, batch_size), start=1):
+            valid, errors, position = _validate_batch(batch, position)
+            seen.update(int(d["id"]) for d in valid)
+
+            inserted, updated, unchanged, write_errors = _upsert_batch(col, valid) if valid else (0, 0, 0, [])
+
+            report["received"] += len(batch)
+            report["inserted"] += inserted
+            report["updated"] += updated
+            report["unchanged"] += unchanged
+            report["written"] += inserted + updated
+            report["invalid"] += len(batch) - len(valid)
+            report["failed"] += len(write_errors)
+            report["batches"].append({
+                "batch": n,
+                "received": len(batch),
+                "written": inserted + updated,
+                "inserted": inserted,
+                "updated": updated,
+                "unchanged": unchanged,
+                "errors": (errors + write_errors)[:MAX_ERRORS_PER_BATCH],
+                "error_count": len(errors) + len(write_errors),
+            })
+    except JSONStreamError as e:
+        report["error"] = str(e)
+
+    # con el fichero cortado o con fallos no sabemos qué falta de verdad: no se borra nada
+    if delete_missing and report["error"] is None and not report["invalid"] and not report["failed"]:
+        report["removed"] = _delete_missing(col, seen, batch_size)
+
+    return report
@@ -0,0 +1,60 @@
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+from simpsonsRankApp.core.mobgo import get_async_db
+from simpsonsRankApp.core.pagination import paginate_catalog
+from simpsonsRankApp.service import entity_stats, sidebars
+
+# =========================
+# Datos de los grids (home / episodios / localizaciones) para vistas async
+# =========================
+# Lo que la vista sync hace en serie aquí va en paralelo:
+#   [página (ORM, en hilo) -> stats de la página]  ||  [sidebars: TOP 5 || últimos comentarios]
+# Las stats dependen de los ids de la página; los sidebars no dependen de nada.
+#
+# Solo con ASGI: con WSGI Django ejecuta cada vista async en un event loop
+# nuevo y get_async_client() abriría un AsyncMongoClient (con su pool) por
+# petición. En ese caso @asgi_only sirve la vista sync equivalente.
+
+
+def asgi_only(sync_view):
+    def decorator(async_view):
+        @functools.wraps(async_view)
+        async def wrapper(request, *args, **kwargs):
+            if not isinstance(request, ASGIRequest):
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+            return await async_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _load_page(queryset, page_param, per_page, count_key):
+    page_obj = paginate_catalog(queryset, page_param, per_page, count_key=count_key)
+    list(page_obj)                 # fuerza la consulta aquí, no en el template
+    page_obj.paginator.num_pages   # idem con el COUNT (el template pinta el total)
+    return page_obj
+
+
+async def aload_catalog_page(queryset, page_param, entity_type, count_key, per_page=25):
+    """Devuelve (page_obj, stats_map, top5, latest) como las vistas sync."""
+    adb = get_async_db()
+
+    async def page_and_stats():
+        page_obj = await sync_to_async(_load_page)(queryset, page_param, per_page, count_key)
+        try:
+            stats_map = await entity_stats.astats_for(adb, entity_type, [o.id for o in page_obj])
+        except Exception:
+            stats_map = {}
+        return page_obj, stats_map
+
+    async def sidebar():
+        try:
+            return await sidebars.aget_sidebars(entity_type, adb)
+        except Exception:
+            return [], []
+
+    (page_obj, stats_map), (top5, latest) = await asyncio.gather(page_and_stats(), sidebar())
+    return page_obj, stats_map, top5, latest
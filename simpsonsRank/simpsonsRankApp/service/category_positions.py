@@ -0,0 +1,133 @@
+from pymongo import ReplaceOne
+from pymongo.errors import DuplicateKeyError
+
+# =========================
+# Posiciones acumuladas por categoría
+# =========================
+# Un documento por categoría en "category_positions":
+#   {"_id": "<slug>", "rankings": 12,
+#    "items": {"characters:1": {"sum": 17, "count": 9}, "episodes:40": {...}}}
+# sum = suma de posiciones (1..N) en todos los rankings, count = apariciones.
+# Se mantiene en create/delete de rankings, así que el "ranking promedio"
+# global de una categoría es leer un documento. Una categoría sin acumulador
+# (nunca reconstruida) lo recibe entero desde "rankings" en su primer cambio:
+# un $inc sobre un documento vacío solo contaría ese ranking.
+
+COLLECTION = "category_positions"
+
+ITEM_TYPES = ("characters", "episodes", "locations")
+
+
+def _item_key(it):
+    t = (it.get("type") or "").strip()
+    if t not in ITEM_TYPES or it.get("id") is None:
+        return None
+    try:
+        return f"{t}:{int(it['id'])}"
+    except (TypeError, ValueError):
+        return None
+
+
+def _accumulate(acc, rankin_list, sign):
+    for pos, it in enumerate(rankin_list or [], start=1):  # pos 1..N
+        key = _item_key(it)
+        if key is None:
+            continue
+        acc[f"items.{key}.sum"] = acc.get(f"items.{key}.sum", 0) + sign * pos
+        acc[f"items.{key}.count"] = acc.get(f"items.{key}.count", 0) + sign
+
+
+def apply_list_change(db, category, old_list, new_list):
+    """
+    Aplica el cambio de un ranking a los acumuladores de su categoría:
+      old_list=None -> ranking nuevo
+      new_list=None -> ranking borrado
+    Un único $inc (los repetidos dentro de una lista se suman antes). Se llama
+    después de escribir en "rankings": si la categoría aún no tiene acumulador,
+    se calcula desde ahí y ya incluye este cambio.
+    """
+    inc = {}
+    _accumulate(inc, old_list, -1)
+    _accumulate(inc, new_list, +1)
+    inc = {k: v for k, v in inc.items() if v}
+    d_rankings = (new_list is not None) - (old_list is not None)
+    if d_rankings:
+        inc["rankings"] = d_rankings
+    if not inc:
+        return
+
+    if db[COLLECTION].update_one({"_id": category}, {"$inc": inc}).matched_count:
+        return
+
+    doc = compute_from_rankings(db, {"categoryCode": category}).get(category) or _empty(category)
+    try:
+        db[COLLECTION].insert_one(doc)
+    except DuplicateKeyError:
+        # otro proceso lo ha creado a la vez: se recalcula con los dos cambios ya en "rankings"
+        doc = compute_from_rankings(db, {"categoryCode": category}).get(category) or _empty(category)
+        db[COLLECTION].replace_one({"_id": category}, doc)
+
+
+def averages_for(db, category):
+    """(n_rankings, [{type, id, avg_pos, appearances}]) o None si la categoría no tiene acumulador."""
+    doc = db[COLLECTION].find_one({"_id": category})
+    if doc is None:
+        return None
+
+    items = []
+    for key, acc in (doc.get("items") or {}).items():
+        count = int(acc.get("count") or 0)
+        if count <= 0:
+            continue
+        t, _id = key.split(":", 1)
+        items.append({
+            "type": t,
+            "id": int(_id),
+            "avg_pos": round(acc.get("sum", 0) / count, 2),
+            "appearances": count,
+        })
+    return max(int(doc.get("rankings") or 0), 0), items
+
+
+# =========================
+# Recalcular desde "rankings" (backfill)
+# =========================
+def _empty(slug):
+    return {"_id": slug, "rankings": 0, "items": {}}
+
+
+def compute_from_rankings(db, query=None):
+    """{slug: doc} calculado directamente desde "rankings" (todas o las que casen con query)."""
+    out = {}
+    for d in db["rankings"].find(query or {}, {"_id": 0, "categoryCode": 1, "rankinList": 1}):
+        slug = d.get("categoryCode") or ""
+        doc = out.setdefault(slug, _empty(slug))
+        doc["rankings"] += 1
+        for pos, it in enumerate(d.get("rankinList") or [], start=1):
+            key = _item_key(it)
+            if key is None:
+                continue
+            acc = doc["items"].setdefault(key, {"sum": 0, "count": 0})
+            acc["sum"] += pos
+            acc["count"] += 1
+    return out
+
+
+def rebuild(db, batch_size=500):
+    """Reescribe todos los acumuladores. Devuelve (escritos, borrados)."""
+    docs = compute_from_rankings(db)
+
+    written = 0
+    ops = []
+    for slug, doc in docs.items():
+        ops.append(ReplaceOne({"_id": slug}, doc, upsert=True))
+        if len(ops) >= batch_size:
+            db[COLLECTION].bulk_write(ops, ordered=False)
+            written += len(ops)
+            ops = []
+    if ops:
+        db[COLLECTION].bulk_write(ops, ordered=False)
+        written += len(ops)
+
+    removed = db[COLLECTION].delete_many({"_id": {"$nin": list(docs)}}).deleted_count
+    return written, removed
@@ -0,0 +1,40 @@
+from simpsonsRankApp.service.catalog import get_catalog
+
+# =========================
+# Portadas (imagen) de rankings y categorías
+# =========================
+# Se resuelven contra el snapshot del catálogo en memoria: cero consultas,
+# da igual cuántos rankings o categorías haya en la página.
+
+COVER_TYPES = ("characters", "locations", "episodes")
+
+
+def normalize_ref(t, _id):
+    if t not in COVER_TYPES:
+        return None
+    try:
+        return t, int(_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def resolve_covers(refs):
+    """refs: iterable de (type, id). Devuelve {(type, id): url | None}."""
+    catalog = get_catalog()
+    out = {}
+    for ref in refs:
+        key = normalize_ref(*ref) if ref else None
+        if key is None or key in out:
+            continue
+        rec = catalog.get(*key)
+        out[key] = rec.img if rec else None
+    return out
+
+
+def category_cover_ref(category):
+    """Primer adjunto de la categoría (personajes > localizaciones > episodios)."""
+    attach = category.get("attach", {}) or {}
+    for t in COVER_TYPES:
+        if attach.get(t):
+            return t, attach[t][0]
+    return None
@@ -0,0 +1,225 @@
+from pymongo import ASCENDING, DESCENDING, ReplaceOne, UpdateOne
+
+# =========================
+# Estadísticas materializadas por entidad
+# =========================
+# Un documento por (type, id) en la colección "entity_stats":
+#   {"type": "characters", "id": 1, "count": 3, "sum": 12, "avg": 4.0,
+#    "hist": {"1": 0, "2": 0, "3": 0, "4": 3, "5": 0}}
+# Se mantiene en cada escritura de review, así que las vistas ya no tienen
+# que hacer $group sobre "reviews" para pintar estrellas o el TOP 5.
+
+COLLECTION = "entity_stats"
+
+REVIEW_FIELDS = {
+    "characters": "characterCode",
+    "episodes": "episodeCode",
+    "locations": "locationCode",
+}
+
+RATINGS = (1, 2, 3, 4, 5)
+
+
+INDEXES = [
+    ([("type", ASCENDING), ("id", ASCENDING)], {"name": "type_id", "unique": True}),
+    ([("type", ASCENDING), ("avg", DESCENDING), ("count", DESCENDING)], {"name": "type_avg_count"}),
+]
+
+
+def ensure_indexes(db):
+    for keys, opts in INDEXES:
+        db[COLLECTION].create_index(keys, **opts)
+
+
+def _delta(acc, old_rating, new_rating):
+    """Suma a acc = [d_count, d_sum, {rating: d_hist}] el cambio de una review."""
+    if old_rating is None:
+        acc[0] += 1
+    acc[1] += int(new_rating) - int(old_rating or 0)
+    acc[2][int(new_rating)] = acc[2].get(int(new_rating), 0) + 1
+    if old_rating is not None and int(old_rating) in RATINGS:
+        acc[2][int(old_rating)] = acc[2].get(int(old_rating), 0) - 1
+
+
+def _delta_pipeline(d_count, d_sum, d_hist):
+    """Update con pipeline: count/sum/hist/avg cambian juntos."""
+    hist = {}
+    for r in RATINGS:
+        current = {"$ifNull": [f"$hist.{r}", 0]}
+        hist[f"hist.{r}"] = {"$add": [current, d_hist[r]]} if d_hist.get(r) else current
+    return [
+        {"$set": {
+            "count": {"$add": [{"$ifNull": ["$count", 0]}, d_count]},
+            "sum": {"$add": [{"$ifNull": ["$sum", 0]}, d_sum]},
+            **hist,
+        }},
+        {"$set": {
+            "avg": {"$cond": [{"$gt": ["$count", 0]}, {"$divide": ["$sum", "$count"]}, 0]},
+        }},
+    ]
+
+
+def apply_rating_change(db, entity_type, entity_id, old_rating, new_rating):
+    """
+    Aplica a las stats el cambio de una review:
+      old_rating=None -> review nueva
+      old_rating=n    -> la review existía y se sobreescribe
+    Es un único update con pipeline, así count/sum/hist/avg cambian juntos.
+    """
+    if old_rating == new_rating:
+        return
+
+    acc = [0, 0, {}]
+    _delta(acc, old_rating, new_rating)
+    db[COLLECTION].update_one(
+        {"type": entity_type, "id": int(entity_id)},
+        _delta_pipeline(*acc),
+        upsert=True,
+    )
+
+
+def apply_rating_changes(db, entity_type, changes):
+    """
+    Lo mismo para un lote [(entity_id, old_rating, new_rating), ...]: los cambios
+    de una misma entidad se suman y se envía un único bulk_write.
+    """
+    per_entity = {}
+    for entity_id, old_rating, new_rating in changes:
+        if old_rating == new_rating:
+            continue
+        _delta(per_entity.setdefault(int(entity_id), [0, 0, {}]), old_rating, new_rating)
+
+    ops = [
+        UpdateOne({"type": entity_type, "id": eid}, _delta_pipeline(*acc), upsert=True)
+        for eid, acc in per_entity.items()
+    ]
+    if ops:
+        db[COLLECTION].bulk_write(ops, ordered=False)
+
+
+STATS_PROJECTION = {"_id": 0, "id": 1, "avg": 1, "count": 1}
+TOP_SORT = [("avg", DESCENDING), ("count", DESCENDING)]
+
+
+def _stats_filter(entity_type, ids):
+    return {"type": entity_type, "id": {"$in": [int(x) for x in ids]}}
+
+
+def _top_filter(entity_type):
+    return {"type": entity_type, "count": {"$gt": 0}}
+
+
+def _row(d):
+    return {"avg": float(d.get("avg") or 0), "count": int(d.get("count") or 0)}
+
+
+def stats_for(db, entity_type, ids):
+    """{id: {"avg": float, "count": int}} para los ids pedidos (1 consulta por índice)."""
+    if not ids:
+        return {}
+    cursor = db[COLLECTION].find(_stats_filter(entity_type, ids), STATS_PROJECTION)
+    return {int(d["id"]): _row(d) for d in cursor}
+
+
+def top_rated(db, entity_type, limit=5):
+    """Mejor media primero y, a igualdad, más valoraciones (mismo orden que el $group antiguo)."""
+    cursor = db[COLLECTION].find(_top_filter(entity_type), STATS_PROJECTION).sort(TOP_SORT).limit(limit)
+    return [{"id": int(d["id"]), **_row(d)} for d in cursor]
+
+
+# Versiones async (AsyncMongoClient, vistas ASGI): mismas consultas y mismo formato
+async def astats_for(adb, entity_type, ids):
+    if not ids:
+        return {}
+    cursor = adb[COLLECTION].find(_stats_filter(entity_type, ids), STATS_PROJECTION)
+    return {int(d["id"]): _row(d) async for d in cursor}
+
+
+async def atop_rated(adb, entity_type, limit=5):
+    cursor = adb[COLLECTION].find(_top_filter(entity_type), STATS_PROJECTION).sort(TOP_SORT).limit(limit)
+    return [{"id": int(d["id"]), **_row(d)} async for d in cursor]
+
+
+# =========================
+# Recalcular desde "reviews" (backfill / comprobación)
+# =========================
+def compute_from_reviews(db, entity_type):
+    """Calcula las stats de un tipo directamente desde "reviews". Devuelve {id: doc}."""
+    field = REVIEW_FIELDS[entity_type]
+    pipeline = [
+        {"$match": {field: {"$exists": True}}},
+        {"$group": {
+            "_id": f"${field}",
+            "count": {"$sum": 1},
+            "sum": {"$sum": "$rating"},
+            **{f"h{r}": {"$sum": {"$cond": [{"$eq": ["$rating", r]}, 1, 0]}} for r in RATINGS},
+        }},
+    ]
+
+    out = {}
+    for row in db["reviews"].aggregate(pipeline, allowDiskUse=True):
+        try:
+            eid = int(row["_id"])
+        except (TypeError, ValueError):
+            continue
+        count = int(row.get("count") or 0)
+        total = int(row.get("sum") or 0)
+        out[eid] = {
+            "type": entity_type,
+            "id": eid,
+            "count": count,
+            "sum": total,
+            "avg": (total / count) if count else 0,
+            "hist": {str(r): int(row.get(f"h{r}") or 0) for r in RATINGS},
+        }
+    return out
+
+
+def rebuild(db, entity_type, batch_size=1000):
+    """Reescribe las stats de un tipo a partir de "reviews". Devuelve (escritos, borrados)."""
+    col = db[COLLECTION]
+    fresh = compute_from_reviews(db, entity_type)
+
+    written = 0
+    ops = []
+    for eid, doc in fresh.items():
+        ops.append(ReplaceOne({"type": entity_type, "id": eid}, doc, upsert=True))
+        if len(ops) >= batch_size:
+            col.bulk_write(ops, ordered=False)
+            written += len(ops)
+            ops = []
+    if ops:
+        col.bulk_write(ops, ordered=False)
+        written += len(ops)
+
+    removed = col.delete_many({"type": entity_type, "id": {"$nin": list(fresh.keys())}}).deleted_count
+    return written, removed
+
+
+def check(db, entity_type):
+    """Compara lo materializado con "reviews". Devuelve lista de (id, esperado, guardado)."""
+    fresh = compute_from_reviews(db, entity_type)
+    stored = {
+        int(d["id"]): d
+        for d in db[COLLECTION].find({"type": entity_type}, {"_id": 0})
+    }
+
+    def key(d):
+        if not d:
+            return None
+        hist = d.get("hist") or {}
+        return (
+            int(d.get("count") or 0),
+            int(d.get("sum") or 0),
+            tuple(int(hist.get(str(r)) or 0) for r in RATINGS),
+        )
+
+    mismatches = []
+    for eid in sorted(set(fresh) | set(stored)):
+        expected, got = fresh.get(eid), stored.get(eid)
+        # un doc guardado con count=0 equivale a "no hay reviews"
+        if expected is None and got and not int(got.get("count") or 0):
+            continue
+        if key(expected) != key(got):
+            mismatches.append((eid, key(expected), key(got)))
+    return mismatches
@@ -0,0 +1,177 @@
+import re
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from simpsonsRankApp.service import entity_stats
+
+# =========================
+# Índices de Mongo que asumen las vistas
+# =========================
+# (colección, keys, opciones). create_index es idempotente: si ya existe con
+# la misma definición no hace nada, así que se puede lanzar en cada deploy.
+
+INDEXES = [
+    # --- reviews: modal de cada entidad (últimas primero) ---
+    ("reviews", [("characterCode", ASCENDING), ("reviewDate", DESCENDING)], {"name": "character_date"}),
+    ("reviews", [("episodeCode", ASCENDING), ("reviewDate", DESCENDING)], {"name": "episode_date"}),
+    ("reviews", [("locationCode", ASCENDING), ("reviewDate", DESCENDING)], {"name": "location_date"}),
+
+    # --- reviews: clave del upsert (1 review por usuario y entidad) ---
+    # parcial: las reviews de episodios no tienen characterCode y chocarían como null
+    ("reviews", [("user", ASCENDING), ("characterCode", ASCENDING)], {
+        "name": "user_character_uniq", "unique": True,
+        "partialFilterExpression": {"characterCode": {"$exists": True}},
+    }),
+    ("reviews", [("user", ASCENDING), ("episodeCode", ASCENDING)], {
+        "name": "user_episode_uniq", "unique": True,
+        "partialFilterExpression": {"episodeCode": {"$exists": True}},
+    }),
+    ("reviews", [("user", ASCENDING), ("locationCode", ASCENDING)], {
+        "name": "user_location_uniq", "unique": True,
+        "partialFilterExpression": {"locationCode": {"$exists": True}},
+    }),
+
+    # --- reviews: "ÚLTIMOS comentarios" de cada tipo (parciales: solo ese tipo) ---
+    ("reviews", [("reviewDate", DESCENDING), ("characterCode", ASCENDING)], {
+        "name": "character_latest",
+        "partialFilterExpression": {"characterCode": {"$exists": True}},
+    }),
+    ("reviews", [("reviewDate", DESCENDING), ("episodeCode", ASCENDING)], {
+        "name": "episode_latest",
+        "partialFilterExpression": {"episodeCode": {"$exists": True}},
+    }),
+    ("reviews", [("reviewDate", DESCENDING), ("locationCode", ASCENDING)], {
+        "name": "location_latest",
+        "partialFilterExpression": {"locationCode": {"$exists": True}},
+    }),
+
+    # --- reviews: estadísticas scope=me ---
+    ("reviews", [("user", ASCENDING), ("reviewDate", DESCENDING)], {"name": "user_date"}),
+
+    # --- rankings ---
+    # feed público: keyset sobre (rankinDate, _id), con y sin filtro de categoría
+    ("rankings", [("categoryCode", ASCENDING), ("rankinDate", DESCENDING), ("_id", DESCENDING)],
+     {"name": "category_date_id"}),
+    ("rankings", [("rankinDate", DESCENDING), ("_id", DESCENDING)], {"name": "date_id"}),
+    # "mis rankings": el usuario sin distinguir mayúsculas (misma collation que la consulta)
+    ("rankings", [("user", ASCENDING), ("rankinDate", DESCENDING), ("_id", DESCENDING)],
+     {"name": "user_ci_date_id", "collation": {"locale": "en", "strength": 2}}),
+    # create_ranking sobreescribe: 1 ranking por usuario y categoría
+    ("rankings", [("user", ASCENDING), ("categoryCode", ASCENDING)], {"name": "user_category_uniq", "unique": True}),
+
+    # --- categories ---
+    ("categories", [("slug", ASCENDING)], {"name": "slug_uniq", "unique": True}),
+    ("categories", [("name", ASCENDING)], {"name": "name"}),
+    ("categories", [("is_active", ASCENDING), ("name", ASCENDING)], {"name": "active_name"}),
+
+    # --- catálogo ---
+    ("characters", [("id", ASCENDING)], {"name": "id"}),
+    ("episodes", [("id", ASCENDING)], {"name": "id"}),
+    ("locations", [("id", ASCENDING)], {"name": "id"}),
+    ("characters", [("name", ASCENDING)], {"name": "name"}),
+    ("episodes", [("name", ASCENDING)], {"name": "name"}),
+    ("locations", [("name", ASCENDING)], {"name": "name"}),
+]
+
+
+def all_indexes():
+    return INDEXES + [(entity_stats.COLLECTION, keys, opts) for keys, opts in entity_stats.INDEXES]
+
+
+def ensure_all(db):
+    """Crea todos los índices. Devuelve [(colección, nombre, error|None)]."""
+    report = []
+    for col_name, keys, opts in all_indexes():
+        try:
+            db[col_name].create_index(keys, **opts)
+            report.append((col_name, opts["name"], None))
+        except OperationFailure as e:
+            # p.ej. duplicados que impiden un unique, o un índice con el mismo key y otras opciones
+            report.append((col_name, opts["name"], str(e)))
+    return report
+
+
+# =========================
+# Verificación de planes (explain)
+# =========================
+# Formas de consulta que lanzan las vistas. Los valores son de ejemplo: lo
+# que importa es la forma (campos, operadores y sort).
+# Un 5º elemento opcional son opciones del find (p.ej. la collation de
+# "mis rankings", que solo usa su índice si la consulta la lleva).
+# Se excluyen a propósito las agregaciones globales de estadísticas
+# (scope=global), que por definición recorren la colección entera.
+
+def query_shapes():
+    shapes = []
+
+    for t, field in entity_stats.REVIEW_FIELDS.items():
+        shapes += [
+            (f"reviews modal {t}", "reviews", {field: 1}, [("reviewDate", DESCENDING)]),
+            (f"reviews upsert {t}", "reviews", {"user": "homer", field: 1}, None),
+            (f"reviews últimos comentarios {t}", "reviews", {
+                field: {"$exists": True},
+                "comment": {"$exists": True, "$type": "string", "$ne": ""},
+            }, [("reviewDate", DESCENDING)]),
+            (f"entity_stats página {t}", entity_stats.COLLECTION, {"type": t, "id": {"$in": [1, 2, 3]}}, None),
+            (f"entity_stats top5 {t}", entity_stats.COLLECTION, {"type": t, "count": {"$gt": 0}},
+             [("avg", DESCENDING), ("count", DESCENDING)]),
+        ]
+
+    shapes += [
+        ("reviews estadísticas scope=me", "reviews", {"user": "homer"}, None),
+        ("rankings mis rankings", "rankings", {"user": "homer"}, [("rankinDate", DESCENDING), ("_id", DESCENDING)],
+         {"collation": {"locale": "en", "strength": 2}}),
+        ("rankings feed público", "rankings", {"user": {"$not": re.compile("^homer$", re.IGNORECASE)}},
+         [("rankinDate", DESCENDING), ("_id", DESCENDING)]),
+        ("rankings feed público por categoría", "rankings", {
+            "categoryCode": "familia", "user": {"$not": re.compile("^homer$", re.IGNORECASE)},
+        }, [("rankinDate", DESCENDING), ("_id", DESCENDING)]),
+        ("rankings nº por categoría (sin acumulador)", "rankings", {"categoryCode": {"$in": ["familia", "bares"]}}, None),
+        ("rankings upsert", "rankings", {"user": "homer", "categoryCode": "familia"}, None),
+        ("rankings estadísticas scope=me", "rankings", {"user": "homer"}, None),
+        ("categories por slug", "categories", {"slug": "familia"}, None),
+        ("categories activas", "categories", {"is_active": True}, [("name", ASCENDING)]),
+        ("categories admin", "categories", {}, [("name", ASCENDING)]),
+        ("categories duplicados", "categories", {"$or": [
+            {"slug": "familia"},
+            {"name": {"$regex": "^familia$", "$options": "i"}},
+        ]}, None),
+    ]
+    return shapes
+
+
+def _has_collscan(plan):
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collscan(v) for v in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(v) for v in plan)
+    return False
+
+
+def _winning_plans(explain):
+    """Todos los winningPlan del explain (find, $or, SBE...)."""
+    if isinstance(explain, dict):
+        for k, v in explain.items():
+            if k == "winningPlan":
+                yield v
+            else:
+                yield from _winning_plans(v)
+    elif isinstance(explain, list):
+        for v in explain:
+            yield from _winning_plans(v)
+
+
+def verify(db):
+    """Lanza explain() sobre cada forma. Devuelve [(label, ok)]."""
+    report = []
+    for label, col_name, flt, sort, *opts in query_shapes():
+        cursor = db[col_name].find(flt, **(opts[0] if opts else {}))
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = cursor.limit(30).explain()
+        ok = not any(_has_collscan(p) for p in _winning_plans(explain))
+        report.append((label, ok))
+    return report
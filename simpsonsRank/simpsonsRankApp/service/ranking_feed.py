@@ -0,0 +1,155 @@
+import re
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import DESCENDING
+
+from simpsonsRankApp.core.pagination import encode_cursor, decode_cursor
+from simpsonsRankApp.service import category_positions
+from simpsonsRankApp.service.covers import resolve_covers, normalize_ref
+
+# =========================
+# Feeds de rankings
+# =========================
+# - "mis rankings": consulta por usuario (acotada: 1 ranking por categoría).
+# - feed público: keyset sobre (rankinDate, _id) descendente, N por página.
+# Ninguna de las dos carga la colección entera en memoria.
+# El usuario se compara sin distinguir mayúsculas (como antes en Python):
+# "mis rankings" con la collation de su índice, el feed público con un regex
+# que solo filtra (no acota el índice).
+
+FEED_SORT = [("rankinDate", DESCENDING), ("_id", DESCENDING)]
+USER_COLLATION = {"locale": "en", "strength": 2}  # igual que el índice user_ci_date_id
+
+
+def _first_ref(doc):
+    items = doc.get("rankinList") or []
+    if not items:
+        return None
+    return items[0].get("type"), items[0].get("id")
+
+
+def ranking_cards(docs, cat_map):
+    """Convierte docs de rankings en las cards del template (portadas en bloque)."""
+    covers = resolve_covers(_first_ref(d) for d in docs)
+
+    cards = []
+    for d in docs:
+        items = d.get("rankinList") or []
+
+        ref = _first_ref(d)
+        key = normalize_ref(*ref) if ref else None
+        first_img = covers.get(key) if key else None
+
+        category_slug = d.get("categoryCode", "")
+        category_name = cat_map.get(category_slug, category_slug)
+
+        # toma el título desde mongo
+        title = (
+            (d.get("title") or "")
+            or (d.get("rankingTitle") or "")
+            or (d.get("rankinTitle") or "")
+        ).strip()
+
+        if not title:
+            title = f"Mi top de {category_name}" if category_name else "Mi ranking"
+
+        cards.append({
+            "id": str(d.get("_id")),
+            "user": d.get("user", ""),
+            "fecha": d.get("rankinDate"),
+            "categoria_slug": category_slug,
+            "categoria_nombre": category_name,
+            "title": title,
+            "num_items": len(items),
+            "top3": "Top 3 al abrir",
+            "first_img": first_img,
+        })
+    return cards
+
+
+def my_rankings(db, user, cat=""):
+    if not user:
+        return []
+    query = {"user": user}
+    if cat:
+        query["categoryCode"] = cat
+    return list(db["rankings"].find(query, collation=USER_COLLATION).sort(FEED_SORT))
+
+
+def not_user(user):
+    return {"$not": re.compile(f"^{re.escape(user)}$", re.IGNORECASE)}
+
+
+def _cursor_for(doc):
+    date = doc.get("rankinDate")
+    return encode_cursor({
+        "d": date.isoformat() if isinstance(date, datetime) else None,
+        "i": str(doc["_id"]),
+    })
+
+
+def _after(cursor):
+    """Filtro keyset: todo lo que va DESPUÉS del cursor en orden (fecha desc, _id desc)."""
+    data = decode_cursor(cursor)
+    if not data:
+        return {}
+    try:
+        oid = ObjectId(data.get("i"))
+        date = datetime.fromisoformat(data["d"]) if data.get("d") else None
+    except Exception:
+        return {}
+
+    if date is None:
+        # documentos sin fecha van al final (null ordena por debajo de cualquier fecha)
+        return {"rankinDate": None, "_id": {"$lt": oid}}
+    return {"$or": [
+        {"rankinDate": {"$lt": date}},
+        {"rankinDate": None},
+        {"rankinDate": date, "_id": {"$lt": oid}},
+    ]}
+
+
+def public_feed(db, me="", cat="", cursor=None, limit=24):
+    """Una página del feed público. Devuelve (docs, next_cursor | None)."""
+    query = {}
+    if me:
+        query["user"] = not_user(me)
+    if cat:
+        query["categoryCode"] = cat
+
+    after = _after(cursor)
+    if after:
+        query = {"$and": [query, after]} if query else after
+
+    docs = list(db["rankings"].find(query).sort(FEED_SORT).limit(limit + 1))
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = _cursor_for(docs[-1])
+    return docs, next_cursor
+
+
+def category_counts(db, slugs):
+    """
+    {slug: nº de rankings} de las categorías pedidas, leído de los acumuladores
+    de category_positions (1 documento por categoría). Solo las que aún no
+    tienen acumulador se cuentan sobre "rankings".
+    """
+    slugs = [s for s in slugs if s]
+    if not slugs:
+        return {}
+    counts = {
+        d["_id"]: max(int(d.get("rankings") or 0), 0)
+        for d in db[category_positions.COLLECTION].find({"_id": {"$in": slugs}}, {"rankings": 1})
+    }
+
+    missing = [s for s in slugs if s not in counts]
+    if missing:
+        rows = db["rankings"].aggregate([
+            {"$match": {"categoryCode": {"$in": missing}}},
+            {"$group": {"_id": "$categoryCode", "count": {"$sum": 1}}},
+        ])
+        counts.update({r["_id"]: int(r["count"]) for r in rows if r.get("_id")})
+    return counts
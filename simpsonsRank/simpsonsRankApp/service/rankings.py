@@ -0,0 +1,44 @@
+import datetime
+
+from django.utils import timezone
+from pymongo import ReturnDocument
+
+from simpsonsRankApp.service import category_positions, versions
+
+
+def save_ranking(db, user, category, title, rankin_list):
+    """
+    OVERWRITE del ranking (1 por usuario y categoría) + acumuladores de la categoría.
+    find_one_and_update devuelve la lista ANTERIOR de forma atómica: se descuenta
+    exactamente lo que había antes de sumar la nueva.
+    """
+    # mismo formato que guarda el ORM para un DateField (datetime a medianoche)
+    rankin_date = datetime.datetime.combine(timezone.now().date(), datetime.time.min)
+
+    before = db["rankings"].find_one_and_update(
+        {"user": user, "categoryCode": category},
+        {"$set": {
+            "title": title,
+            "rankinList": rankin_list,
+            "rankinDate": rankin_date,
+        }},
+        projection={"_id": 1, "rankinList": 1},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE,
+    )
+
+    old_list = (before.get("rankinList") or []) if before else None
+    category_positions.apply_list_change(db, category, old_list, rankin_list)
+    # un ranking nuevo no tiene ETags en circulación: basta con la clave de colección
+    keys = [versions.RANKINGS] + ([versions.ranking_key(before["_id"])] if before else [])
+    versions.bump(db, *keys)
+
+
+def delete_ranking(db, oid):
+    """Borra el ranking y lo descuenta de su categoría. Devuelve el doc borrado (o None)."""
+    doc = db["rankings"].find_one_and_delete({"_id": oid})
+    if doc:
+        category_positions.apply_list_change(db, doc.get("categoryCode") or "", doc.get("rankinList") or [], None)
+        # se incrementa (no se borra): volver a 0 podría coincidir con un ETag antiguo
+        versions.bump(db, versions.RANKINGS, versions.ranking_key(oid))
+    return doc
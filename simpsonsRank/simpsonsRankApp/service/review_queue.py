@@ -0,0 +1,371 @@
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from pymongo.errors import PyMongoError
+
+from simpsonsRankApp.core.mobgo import get_db
+from simpsonsRankApp.service.reviews import MissingReviewIndexes, require_unique_indexes, save_reviews_batch
+from simpsonsRankApp.service.sidebars import invalidate_sidebars
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin flock no se distingue un proceso vivo de uno muerto
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Write-behind de reviews (REVIEW_WRITE_BEHIND)
+# =========================
+# create_*_review valida, deja la review en una cola acotada y responde; un
+# hilo por proceso la vacía cada REVIEW_FLUSH_SECONDS con save_reviews_batch
+# (última review por usuario+entidad, bulk_write por tipo).
+#
+# Spool: antes de entrar en la cola cada review se añade a un segmento
+# <pid>-<arranque>-<n>.jsonl en REVIEW_SPOOL_DIR. Al vaciar se cierra el segmento y se
+# abre otro; el cerrado se borra cuando todo lo drenado está en Mongo. Si el
+# proceso muere, el siguiente que arranque (o flush_review_spool) reaplica
+# los segmentos huérfanos: el <pid>.lock de su dueño ya no está bloqueado.
+# Sin fcntl (Windows) no hay recuperación automática: se reaplicarían segmentos
+# que otro proceso aún está escribiendo. Ahí, con todos los procesos parados,
+# flush_review_spool --force.
+# Reaplicar es idempotente: save_reviews_batch solo escribe una review si es
+# más nueva (reviewDate) que la guardada.
+#
+# Con la cola llena la vista escribe en directo (save_review); la review
+# encolada antes, más antigua, ya no la pisa al vaciarse. Lo mismo entre
+# workers: gana siempre la más reciente y entity_stats solo suma las que se
+# han aplicado.
+
+
+def _to_spool(review):
+    return json.dumps({**review, "date": review["date"].isoformat()}, ensure_ascii=False)
+
+
+def _from_spool(line):
+    review = json.loads(line)
+    review["date"] = datetime.datetime.fromisoformat(review["date"])
+    return review
+
+
+def _lock(path):
+    """Abre y bloquea (sin esperar) path. Devuelve el fichero o None si otro proceso lo tiene."""
+    f = open(path, "a")
+    if fcntl is None:
+        return f
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def _read_segment(path):
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                out.append(_from_spool(line))
+            except (ValueError, KeyError):
+                break  # última línea a medias (corte durante la escritura)
+    return out
+
+
+def recover_orphans(db, spool_dir, own_pid=None, own_token=None, batch_size=500, force=False):
+    """
+    Reaplica los segmentos de procesos que ya no existen (y los que quedaran
+    de una ejecución anterior con nuestro mismo pid, p.ej. pid 1 en Docker).
+    Devuelve cuántas reviews. Sin fcntl no hace nada salvo con force=True
+    (el llamante garantiza que no queda ningún proceso escribiendo).
+    """
+    spool_dir = Path(spool_dir)
+    if not spool_dir.is_dir():
+        return 0
+    if fcntl is None and not force:
+        logger.warning("Spool de reviews: sin fcntl no se recuperan segmentos huérfanos automáticamente")
+        return 0
+
+    recovered = 0
+    for lock_path in sorted(spool_dir.glob("*.lock")):
+        pid = lock_path.stem
+        held = None
+        if pid != str(own_pid):
+            held = _lock(lock_path)
+            if held is None:
+                continue  # proceso vivo: sus segmentos son suyos
+
+        try:
+            for segment in sorted(spool_dir.glob(f"{pid}-*.jsonl")):
+                if held is None and segment.name.startswith(f"{pid}-{own_token}-"):
+                    continue  # segmentos de esta ejecución
+                reviews = _read_segment(segment)
+                for start in range(0, len(reviews), batch_size):
+                    touched = save_reviews_batch(db, reviews[start:start + batch_size])
+                    for entity_type in touched:
+                        invalidate_sidebars(entity_type)
+                recovered += len(reviews)
+                segment.unlink()
+            if held is not None and fcntl is not None:
+                lock_path.unlink()
+        finally:
+            if held is not None:
+                held.close()
+        if held is not None and fcntl is None:
+            lock_path.unlink(missing_ok=True)  # en Windows no se puede borrar abierto
+    return recovered
+
+
+class ReviewQueue:
+    def __init__(self, spool_dir, maxsize=10000, batch_size=500, interval=0.5, fsync=False):
+        self.spool_dir = Path(spool_dir)
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.interval = interval
+        self.fsync = fsync
+        self.pid = os.getpid()
+        self.token = f"{int(time.time() * 1000):x}"  # distingue ejecuciones con el mismo pid
+
+        self.q = queue.Queue(maxsize)
+        self.lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # un solo flush a la vez (hilo o close)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lockfile = None
+        self._segment = None
+        self._segment_path = None
+        self._segment_n = 0
+        self._seq = 0
+        self._sealed = []        # segmentos cerrados aún no confirmados en Mongo
+        self._retry = []         # reviews drenadas cuyo lote falló
+        self._recovered = False
+
+        self.counters = {
+            "enqueued": 0, "rejected": 0, "written": 0, "coalesced": 0,
+            "batches": 0, "failures": 0, "recovered": 0,
+        }
+        self.flush_ms = {"last": 0.0, "max": 0.0, "total": 0.0}
+        self.lag_ms = {"last": 0.0, "max": 0.0}
+        self.last_error = None
+
+    # ---------- spool ----------
+    def _open_segment(self):
+        self._seq += 1
+        self._segment_path = self.spool_dir / f"{self.pid}-{self.token}-{self._seq:06d}.jsonl"
+        self._segment = open(self._segment_path, "a", encoding="utf-8")
+        self._segment_n = 0
+
+    def _seal_segment(self):
+        """Cierra el segmento actual (si tiene algo) y abre otro. Llamar con self.lock."""
+        if not self._segment_n:
+            return
+        self._segment.close()
+        self._sealed.append(self._segment_path)
+        self._open_segment()
+
+    # ---------- ciclo de vida ----------
+    def start(self):
+        # sin los índices únicos de reviews no se arranca (ver save_reviews_batch)
+        require_unique_indexes(get_db())
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self._lockfile = _lock(self.spool_dir / f"{self.pid}.lock")
+        self._open_segment()
+        self._thread = threading.Thread(target=self._run, name="review-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return self
+
+    def close(self):
+        """Para el hilo y vacía lo pendiente (atexit)."""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=max(5.0, self.interval * 4))
+            if self._thread.is_alive():
+                # sigue en un flush (Mongo lento): lo pendiente queda en el spool
+                logger.warning("Write-behind de reviews: el hilo no ha terminado, se reaplicará el spool")
+                return
+        self.flush()
+        with self.lock:
+            if self._retry or self._sealed or self._segment_n:
+                return  # queda algo sin escribir: el spool se reaplicará al arrancar
+            self._segment.close()
+            self._segment_path.unlink(missing_ok=True)
+            (self.spool_dir / f"{self.pid}.lock").unlink(missing_ok=True)
+            if self._lockfile is not None:
+                self._lockfile.close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self._recovered:
+                try:
+                    self.counters["recovered"] += recover_orphans(
+                        get_db(), self.spool_dir, own_pid=self.pid, own_token=self.token,
+                        batch_size=self.batch_size,
+                    )
+                    self._recovered = True
+                except Exception:
+                    logger.exception("No se pudo reaplicar el spool de reviews")
+            self.flush()
+
+    # ---------- API ----------
+    def submit(self, entity_type, entity_id, user, rating, comment):
+        """Encola la review. False si la cola está llena (el llamante escribe en directo)."""
+        review = {
+            "type": entity_type,
+            "id": int(entity_id),
+            "user": user,
+            "rating": int(rating),
+            "comment": comment,
+            "date": datetime.datetime.now(datetime.timezone.utc),
+            "queued_at": time.time(),
+        }
+        with self.lock:
+            if self.q.full():
+                self.counters["rejected"] += 1
+                return False
+            self._segment.write(_to_spool(review) + "\n")
+            self._segment.flush()
+            if self.fsync:
+                os.fsync(self._segment.fileno())
+            self._segment_n += 1
+            self.q.put_nowait(review)
+            self.counters["enqueued"] += 1
+        return True
+
+    def flush(self):
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self.lock:
+            self._seal_segment()
+            sealed = list(self._sealed)
+            items, self._retry = self._retry, []
+
+        while True:
+            try:
+                items.append(self.q.get_nowait())
+            except queue.Empty:
+                break
+
+        for start in range(0, len(items), self.batch_size):
+            chunk = items[start:start + self.batch_size]
+            t0 = time.perf_counter()
+            try:
+                touched = save_reviews_batch(get_db(), chunk)
+            except Exception as e:
+                # Mongo caído: se reintenta en la siguiente vuelta; el spool sigue en disco
+                with self.lock:
+                    self._retry = items[start:] + self._retry
+                self.counters["failures"] += 1
+                self.last_error = str(e)
+                logger.warning("Write-behind de reviews: lote fallido (%s), se reintenta", e)
+                return
+            for entity_type in touched:
+                invalidate_sidebars(entity_type)
+            self._record(chunk, time.perf_counter() - t0)
+
+        with self.lock:
+            for path in sealed:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+                self._sealed.remove(path)
+
+    def _record(self, chunk, elapsed):
+        ms = elapsed * 1000
+        unique = len({(r["type"], r["id"], r["user"]) for r in chunk})
+        self.counters["batches"] += 1
+        self.counters["written"] += unique
+        self.counters["coalesced"] += len(chunk) - unique
+        self.flush_ms["last"] = ms
+        self.flush_ms["max"] = max(self.flush_ms["max"], ms)
+        self.flush_ms["total"] += ms
+
+        lag = (time.time() - min(r["queued_at"] for r in chunk)) * 1000
+        self.lag_ms["last"] = lag
+        self.lag_ms["max"] = max(self.lag_ms["max"], lag)
+
+    def stats(self):
+        batches = self.counters["batches"]
+        return {
+            "enabled": True,
+            "depth": self.q.qsize(),
+            "capacity": self.maxsize,
+            "retry_pending": len(self._retry),
+            "spool_segments": len(self._sealed) + (1 if self._segment_n else 0),
+            **self.counters,
+            "flush_ms": {
+                "last": round(self.flush_ms["last"], 2),
+                "avg": round(self.flush_ms["total"] / batches, 2) if batches else 0.0,
+                "max": round(self.flush_ms["max"], 2),
+            },
+            # desde que se encoló la review más antigua del lote hasta que está en Mongo
+            "lag_ms": {k: round(v, 2) for k, v in self.lag_ms.items()},
+            "last_error": self.last_error,
+        }
+
+
+_lock_global = threading.Lock()
+_queue = None
+_unavailable = None  # motivo por el que el write-behind no puede arrancar en este proceso
+
+
+def enabled():
+    return bool(getattr(settings, "REVIEW_WRITE_BEHIND", False))
+
+
+def get_queue():
+    """
+    Cola del proceso (se crea y arranca en el primer uso; una nueva tras un fork).
+    None si no puede arrancar: sin índices únicos queda desactivada hasta reiniciar,
+    con Mongo caído se vuelve a intentar en la siguiente review.
+    """
+    global _queue, _unavailable
+    q = _queue
+    if q is not None and q.pid == os.getpid():
+        return q
+    if _unavailable:
+        return None
+    with _lock_global:
+        if _queue is None or _queue.pid != os.getpid():
+            try:
+                _queue = ReviewQueue(
+                    getattr(settings, "REVIEW_SPOOL_DIR", settings.BASE_DIR / "review_spool"),
+                    maxsize=getattr(settings, "REVIEW_QUEUE_SIZE", 10000),
+                    batch_size=getattr(settings, "REVIEW_FLUSH_BATCH", 500),
+                    interval=getattr(settings, "REVIEW_FLUSH_SECONDS", 0.5),
+                    fsync=getattr(settings, "REVIEW_SPOOL_FSYNC", False),
+                ).start()
+            except MissingReviewIndexes as e:
+                _unavailable = str(e)
+                logger.error("Write-behind de reviews desactivado: %s", e)
+                return None
+            except PyMongoError:
+                logger.warning("Write-behind de reviews: no se pudo comprobar Mongo, se escribe en directo")
+                return None
+        return _queue
+
+
+def submit(entity_type, entity_id, user, rating, comment):
+    """True si la review queda en la cola; False si el write-behind está apagado, no disponible o lleno."""
+    if not enabled():
+        return False
+    q = get_queue()
+    return q is not None and q.submit(entity_type, entity_id, user, rating, comment)
+
+
+def stats():
+    q = _queue
+    if q is None or q.pid != os.getpid():
+        return {"enabled": enabled(), "depth": 0, "unavailable": _unavailable}
+    return q.stats()
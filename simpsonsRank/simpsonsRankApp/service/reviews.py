@@ -0,0 +1,168 @@
+import datetime
+
+from django.utils import timezone
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from simpsonsRankApp.service import entity_stats, versions
+
+DUPLICATE_KEY = 11000
+
+
+class MissingReviewIndexes(RuntimeError):
+    pass
+
+
+_unique_indexes_ok = False
+
+
+def missing_unique_indexes(db):
+    """Códigos de review sin índice único (user + código) en "reviews"."""
+    covered = {
+        tuple(field for field, _ in spec["key"])
+        for spec in db["reviews"].index_information().values()
+        if spec.get("unique")
+    }
+    return [f for f in entity_stats.REVIEW_FIELDS.values() if ("user", f) not in covered]
+
+
+def require_unique_indexes(db):
+    """
+    save_reviews_batch detecta los conflictos por el error de clave duplicada:
+    sin los índices únicos un compare-and-set fallido insertaría una segunda
+    review del mismo usuario y entidad. Se comprueba una vez por proceso.
+    """
+    global _unique_indexes_ok
+    if _unique_indexes_ok:
+        return
+    missing = missing_unique_indexes(db)
+    if missing:
+        raise MissingReviewIndexes(
+            f"reviews sin índice único (user, {'/'.join(missing)}): ejecuta ensure_mongo_indexes"
+        )
+    _unique_indexes_ok = True
+
+
+def save_review(db, entity_type, entity_id, user, rating, comment):
+    """
+    UPSERT de una review (1 por usuario y entidad) + actualización de entity_stats
+    y de las versiones que usan los ETag de la API.
+    find_one_and_update devuelve la review ANTERIOR de forma atómica, así que
+    cada cambio de nota se descuenta exactamente una vez aunque haya carreras.
+    """
+    field = entity_stats.REVIEW_FIELDS[entity_type]
+
+    before = db["reviews"].find_one_and_update(
+        {"user": user, field: entity_id},
+        {"$set": {
+            "rating": rating,
+            "comment": comment,
+            "reviewDate": timezone.now(),
+        }},
+        projection={"_id": 0, "rating": 1},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE,
+    )
+
+    old_rating = before.get("rating") if before else None
+    entity_stats.apply_rating_change(db, entity_type, entity_id, old_rating, rating)
+    versions.bump(db, versions.review_key(entity_type, entity_id), versions.REVIEWS)
+
+
+def _mongo_date(dt):
+    """Fecha tal y como la guarda Mongo (UTC, milisegundos) para poder compararla."""
+    if dt is None:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return dt.replace(microsecond=dt.microsecond // 1000 * 1000)
+
+
+def save_reviews_batch(db, reviews, max_rounds=5):
+    """
+    Escritura por lotes (write-behind, ver service/review_queue.py). `reviews` son
+    dicts {type, id, user, rating, comment, date}; si hay varias del mismo usuario
+    y entidad gana la última. Devuelve {type: [ids]} de las entidades tocadas.
+
+    Solo se escribe una review si es más nueva que la guardada (reviewDate), así
+    que una review encolada no pisa a otra posterior escrita en directo, por otro
+    worker o por una pasada anterior del spool. Por tipo: 1 find de lo guardado y
+    1 bulk_write "compare-and-set":
+      - si existía: UpdateOne filtrando por la nota y la fecha leídas (upsert)
+      - si no:      InsertOne
+    Si entre el find y el bulk_write alguien ha cambiado la review, el filtro no
+    casa y el índice único (user + código) rechaza el upsert/insert: esas filas
+    se releen y se reintentan. entity_stats solo recibe el cambio de las que se
+    han aplicado, con la nota que realmente había antes. Reaplicar un lote ya
+    escrito no hace nada (la fecha guardada ya no es anterior).
+    Sin esos índices no se escribe nada (MissingReviewIndexes).
+    """
+    require_unique_indexes(db)
+
+    latest = {}
+    for r in reviews:
+        latest[(r["type"], int(r["id"]), r["user"])] = r  # vienen en orden de llegada
+
+    by_type = {}
+    for (entity_type, entity_id, user), r in latest.items():
+        by_type.setdefault(entity_type, []).append(r)
+
+    touched = {}
+    unresolved = 0
+    for entity_type, rows in by_type.items():
+        field = entity_stats.REVIEW_FIELDS[entity_type]
+        changes = []
+
+        pending = rows
+        for _ in range(max_rounds):
+            if not pending:
+                break
+            stored = {
+                (d.get("user"), int(d[field])): d
+                for d in db["reviews"].find(
+                    {"$or": [{"user": r["user"], field: int(r["id"])} for r in pending]},
+                    {"_id": 0, "user": 1, field: 1, "rating": 1, "reviewDate": 1},
+                )
+            }
+
+            batch, ops = [], []
+            for r in pending:
+                date = _mongo_date(r["date"])
+                key = {"user": r["user"], field: int(r["id"])}
+                doc = {"rating": r["rating"], "comment": r["comment"], "reviewDate": date}
+                before = stored.get((r["user"], int(r["id"])))
+                if before is None:
+                    ops.append(InsertOne({**key, **doc}))
+                elif before.get("reviewDate") is None or _mongo_date(before["reviewDate"]) < date:
+                    cas = {**key, "rating": before.get("rating"), "reviewDate": before.get("reviewDate")}
+                    ops.append(UpdateOne(cas, {"$set": doc}, upsert=True))
+                else:
+                    continue  # la guardada es igual o más nueva: no se aplica
+                batch.append((r, before.get("rating") if before else None))
+
+            conflicts = set()
+            if ops:
+                try:
+                    db["reviews"].bulk_write(ops, ordered=False)
+                except BulkWriteError as e:
+                    errors = e.details.get("writeErrors", [])
+                    if any(err.get("code") != DUPLICATE_KEY for err in errors):
+                        raise
+                    conflicts = {err["index"] for err in errors}
+
+            changes += [(r["id"], old, r["rating"]) for n, (r, old) in enumerate(batch) if n not in conflicts]
+            pending = [batch[n][0] for n in sorted(conflicts)]
+        unresolved += len(pending)
+
+        entity_stats.apply_rating_changes(db, entity_type, changes)
+        if changes:
+            touched[entity_type] = sorted({int(entity_id) for entity_id, _, _ in changes})
+
+    keys = [versions.review_key(t, i) for t, ids in touched.items() for i in ids]
+    if keys:
+        versions.bump(db, *keys, versions.REVIEWS)
+    if unresolved:
+        # lo aplicado ya está en Mongo; al reintentar el lote no se repite
+        # (ya no es más nuevo que lo guardado) y solo entran las que faltan
+        raise RuntimeError(f"{unresolved} reviews siguen en conflicto tras {max_rounds} intentos")
+    return touched
@@ -0,0 +1,229 @@
+import threading
+import unicodedata
+
+from django.conf import settings
+
+from simpsonsRankApp.core.lru import LRUCache
+from simpsonsRankApp.service import catalog
+from simpsonsRankApp.service.catalog import CDN, get_catalog
+
+# =========================
+# Buscador del catálogo (grid_search.js / modal de categorías)
+# =========================
+# Índice invertido de n-gramas (1, 2 y 3 caracteres) sobre el nombre, plegado
+# a minúsculas y sin acentos. Se construye desde el snapshot del catálogo y se
+# reconstruye cuando éste se recarga: buscar no toca Mongo.
+#
+# Relevancia: 0 = el nombre empieza por q, 1 = alguna palabra empieza por q,
+# 2 = q aparece en medio. Empates: nombre más corto primero, luego alfabético.
+
+NGRAM = 3
+
+# type de la petición -> colección del catálogo
+TYPE_KEYS = {"character": "characters", "episode": "episodes", "location": "locations"}
+TYPE_NAMES = {v: k for k, v in TYPE_KEYS.items()}
+
+# type=all: cuántos resultados puede aportar cada colección como máximo
+DEFAULT_ALL_QUOTAS = {"characters": 20, "episodes": 15, "locations": 15}
+
+PREFIX, WORD_START, SUBSTRING = 0, 1, 2
+
+
+def fold(text):
+    """'Moe's Távern' -> "moe's tavern" (sin acentos, casefold, espacios normalizados)."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.casefold().split())
+
+
+def _grams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def _rank(name, q):
+    at = name.find(q)
+    if at < 0:
+        return None  # los trigramas coinciden pero no son contiguos
+    if at == 0:
+        return PREFIX
+    while at > 0:
+        if not name[at - 1].isalnum():
+            return WORD_START
+        at = name.find(q, at + 1)
+    return SUBSTRING
+
+
+class _TypeIndex:
+    """Índice de un tipo: nombres plegados + postings n-grama -> posiciones."""
+
+    def __init__(self, records):
+        self.records = sorted(records, key=lambda r: r.id)
+        self.names = [fold(r.name) for r in self.records]
+        self.postings = {}
+        for pos, name in enumerate(self.names):
+            for n in range(1, NGRAM + 1):
+                for g in _grams(name, n):
+                    self.postings.setdefault(g, []).append(pos)
+
+    def _candidates(self, q):
+        if len(q) <= NGRAM:
+            return self.postings.get(q, ())
+        # intersección empezando por la lista más corta
+        lists = sorted((self.postings.get(g, ()) for g in _grams(q, NGRAM)), key=len)
+        if not lists or not lists[0]:
+            return ()
+        found = set(lists[0])
+        for other in lists[1:]:
+            found.intersection_update(other)
+            if not found:
+                break
+        return found
+
+    def hits(self, q, limit):
+        """[(relevancia, rec)] ordenados; la relevancia es comparable entre tipos."""
+        hits = []
+        for pos in self._candidates(q):
+            name = self.names[pos]
+            rank = _rank(name, q)
+            if rank is not None:
+                hits.append((rank, len(name), name, pos))
+        hits.sort()
+        return [(h[:3], self.records[h[3]]) for h in hits[:limit]]
+
+    def search(self, q, limit):
+        return [rec for _, rec in self.hits(q, limit)]
+
+
+class SearchIndex:
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.types = {t: _TypeIndex(snapshot.all(t)) for t in catalog.CATALOG_TYPES}
+
+    def search(self, entity_type, q, limit=50):
+        q = fold(q)
+        if not q or entity_type not in self.types:
+            return []
+        return self.types[entity_type].search(q, limit)
+
+    def search_all(self, q, limit=50, quotas=None):
+        """
+        Todos los tipos en una lista: cada tipo aporta como mucho su cuota y
+        luego se mezclan por relevancia. Devuelve [(type, rec)].
+        """
+        q = fold(q)
+        if not q:
+            return []
+        quotas = quotas or {}
+        merged = []
+        for t, idx in self.types.items():
+            for key, rec in idx.hits(q, quotas.get(t, limit)):
+                merged.append((key, t, rec))
+        merged.sort(key=lambda m: m[0])
+        return [(t, rec) for _, t, rec in merged[:limit]]
+
+
+_lock = threading.Lock()
+_index = None
+
+
+@catalog.on_reload
+def _rebuild(snapshot):
+    global _index
+    _index = SearchIndex(snapshot)
+    result_cache().clear()
+
+
+def get_index():
+    """Índice del snapshot actual (lo reconstruye si el catálogo cambió)."""
+    global _index
+    snap = get_catalog()
+    idx = _index
+    if idx is not None and idx.snapshot is snap:
+        return idx
+    with _lock:
+        if _index is None or _index.snapshot is not snap:
+            _index = SearchIndex(snap)
+        return _index
+
+
+# =========================
+# Resultados (mismo formato que devolvía la búsqueda en Mongo)
+# =========================
+def _result(rec):
+    out = {
+        "id": rec.id,
+        "title": rec.name,
+        "subtitle": rec.subtitle,
+        "image": rec.img or CDN,
+    }
+    if rec.type == "characters":
+        out.update({
+            "age": rec.age,
+            "status": rec.status,
+            "description": rec.description,
+            "quote": rec.quote,
+        })
+    return out
+
+
+# =========================
+# Caché de resultados
+# =========================
+# Escribir y borrar en el buscador repite las mismas (type, q) una y otra vez.
+# Clave: (colección, q plegada, limit). Se vacía al recargar el catálogo y,
+# por tipo, desde upload_json.
+_results = None
+
+
+def result_cache():
+    global _results
+    if _results is None:
+        _results = LRUCache(
+            maxsize=getattr(settings, "SEARCH_CACHE_SIZE", 512),
+            ttl=getattr(settings, "SEARCH_CACHE_TTL", 300),
+        )
+    return _results
+
+
+def invalidate_results(entity_type):
+    result_cache().discard_where(lambda key: key[0] in (entity_type, "all"))
+
+
+def search_catalog(type_key, q, limit=50):
+    """type_key: "character" | "episode" | "location" | "all"."""
+    if type_key == "all":
+        return search_everything(q, limit)
+
+    entity_type = TYPE_KEYS.get(type_key)
+    q = fold(q)
+    if not entity_type or not q:
+        return []
+
+    index = get_index()  # puede recargar el catálogo (y vaciar la caché) antes de mirarla
+    cache = result_cache()
+    key = (entity_type, q, limit)
+    results = cache.get(key)
+    if results is None:
+        results = [_result(r) for r in index.search(entity_type, q, limit)]
+        cache.set(key, results)
+    return results
+
+
+def search_everything(q, limit=50):
+    """type=all: personajes, episodios y localizaciones mezclados; cada resultado lleva su "type"."""
+    q = fold(q)
+    if not q:
+        return []
+
+    index = get_index()
+    cache = result_cache()
+    key = ("all", q, limit)
+    results = cache.get(key)
+    if results is None:
+        quotas = getattr(settings, "SEARCH_ALL_QUOTAS", DEFAULT_ALL_QUOTAS)
+        results = [
+            {"type": TYPE_NAMES[t], **_result(rec)}
+            for t, rec in index.search_all(q, limit, quotas)
+        ]
+        cache.set(key, results)
+    return results
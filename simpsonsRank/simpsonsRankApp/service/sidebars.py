@@ -0,0 +1,146 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from simpsonsRankApp.core.cache import aswr_get, swr_get, invalidate
+from simpsonsRankApp.core.mobgo import get_db
+from simpsonsRankApp.service import entity_stats, versions
+from simpsonsRankApp.service.catalog import get_catalog
+
+# =========================
+# Sidebars de los catálogos: "TOP 5" y "ÚLTIMOS comentarios"
+# =========================
+# Solo cambian cuando alguien escribe una review, así que se cachean por tipo
+# de entidad y se invalidan desde los endpoints create_*_review. Como el cache
+# es por proceso, la entrada guarda también el contador versions.REVIEWS: una
+# review escrita desde otro worker la deja caducada en todos.
+
+CDN_BASE = "https://cdn.thesimpsonsapi.com/1280"
+
+# type -> prefijo de las claves de "últimos comentarios" que espera cada template
+SIDEBAR_PREFIXES = {
+    "characters": "character",
+    "episodes": "episode",
+    "locations": "location",
+}
+
+
+def _cache_key(entity_type):
+    return f"sidebars:{entity_type}"
+
+
+def _top5_cards(catalog, entity_type, top_docs):
+    out = []
+    for d in top_docs:
+        o = catalog.get(entity_type, d["id"])
+        if not o:
+            continue
+        out.append({
+            "id": d["id"],
+            "name": o.name,
+            "img": o.img or CDN_BASE,
+            "avg": d["avg"],
+            "count": d["count"],
+        })
+    return out
+
+
+def _latest_filter(entity_type):
+    field = entity_stats.REVIEW_FIELDS[entity_type]
+    return {
+        field: {"$exists": True},
+        "comment": {"$exists": True, "$type": "string", "$ne": ""}
+    }
+
+
+def _latest_cards(catalog, entity_type, latest_docs):
+    prefix = SIDEBAR_PREFIXES[entity_type]
+    field = entity_stats.REVIEW_FIELDS[entity_type]
+
+    out = []
+    for d in latest_docs:
+        try:
+            eid = int(d.get(field))
+        except Exception:
+            continue
+
+        o = catalog.get(entity_type, eid)
+        if not o:
+            continue
+
+        out.append({
+            f"{prefix}_id": eid,
+            f"{prefix}_name": o.name,
+            f"{prefix}_img": o.img or CDN_BASE,
+            "user": d.get("user", "anon"),
+            "rating": int(d.get("rating", 0) or 0),
+            "comment": d.get("comment", ""),
+            "reviewDate": d.get("reviewDate"),
+        })
+    return out
+
+
+def build_top5(db, entity_type):
+    return _top5_cards(get_catalog(), entity_type, entity_stats.top_rated(db, entity_type, limit=5))
+
+
+def build_latest_comments(db, entity_type, limit=5):
+    docs = db["reviews"].find(_latest_filter(entity_type)).sort("reviewDate", -1).limit(limit)
+    return _latest_cards(get_catalog(), entity_type, list(docs))
+
+
+def _ttls():
+    return {
+        "ttl": getattr(settings, "SIDEBAR_CACHE_TTL", 60),
+        "stale_ttl": getattr(settings, "SIDEBAR_CACHE_STALE_TTL", 300),
+    }
+
+
+def _reviews_version(db):
+    try:
+        return versions.get_versions(db, [versions.REVIEWS])[versions.REVIEWS]
+    except Exception:
+        return None  # sin contador se sirve con el TTL
+
+
+async def _areviews_version(adb):
+    try:
+        return (await versions.aget_versions(adb, [versions.REVIEWS]))[versions.REVIEWS]
+    except Exception:
+        return None
+
+
+def get_sidebars(entity_type):
+    """Devuelve (top5, latest_comments) del tipo, desde caché si es posible."""
+    def build():
+        db = get_db()
+        return {
+            "top5": build_top5(db, entity_type),
+            "latest": build_latest_comments(db, entity_type),
+        }
+
+    data = swr_get(_cache_key(entity_type), build, version=_reviews_version(get_db()), **_ttls())
+    return data["top5"], data["latest"]
+
+
+async def aget_sidebars(entity_type, adb):
+    """get_sidebars para vistas async: si hay que recalcular, TOP 5 y últimos comentarios van en paralelo."""
+    async def build():
+        latest_cursor = adb["reviews"].find(_latest_filter(entity_type)).sort("reviewDate", -1).limit(5)
+        top_docs, latest_docs, catalog = await asyncio.gather(
+            entity_stats.atop_rated(adb, entity_type, limit=5),
+            latest_cursor.to_list(),
+            sync_to_async(get_catalog)(),
+        )
+        return {
+            "top5": _top5_cards(catalog, entity_type, top_docs),
+            "latest": _latest_cards(catalog, entity_type, latest_docs),
+        }
+
+    data = await aswr_get(_cache_key(entity_type), build, version=await _areviews_version(adb), **_ttls())
+    return data["top5"], data["latest"]
+
+
+def invalidate_sidebars(entity_type):
+    invalidate(_cache_key(entity_type))
@@ -0,0 +1,212 @@
+import datetime
+
+from simpsonsRankApp.service.catalog import get_catalog
+
+# =========================
+# Datos de /api/statistics/
+# =========================
+# Antes eran ~16 consultas que releían "reviews" con el mismo $match. Ahora:
+#   1) reviews:  $match -> $project -> $facet (totales, distribución, tops, medias)
+#   2) rankings: $match -> $facet (total, por categoría, top users)
+# Cada colección se lee una sola vez y el JSON resultante es el mismo.
+
+# type -> (campo en reviews, etiqueta de respaldo si no está en el catálogo)
+REVIEW_TYPES = {
+    "characters": ("characterCode", "Character"),
+    "episodes": ("episodeCode", "Episode"),
+    "locations": ("locationCode", "Location"),
+}
+
+TOP_RATED_LIMIT = 20
+MOST_REVIEWED_LIMIT = 10
+CATEGORY_LIMIT = 20
+TOP_USERS_LIMIT = 10
+
+
+def _review_facets():
+    facets = {
+        "overall": [{"$group": {"_id": None, "avg": {"$avg": "$rating"}, "count": {"$sum": 1}}}],
+        "dist": [{"$group": {"_id": "$rating", "n": {"$sum": 1}}}],
+    }
+    for t, (field, _) in REVIEW_TYPES.items():
+        has_field = {"$match": {field: {"$exists": True}}}
+        facets[f"top_{t}"] = [
+            has_field,
+            {"$group": {"_id": f"${field}", "avg": {"$avg": "$rating"}, "count": {"$sum": 1}}},
+            {"$sort": {"avg": -1, "count": -1}},
+            {"$limit": TOP_RATED_LIMIT},
+        ]
+        facets[f"most_{t}"] = [
+            has_field,
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}},
+            {"$limit": MOST_REVIEWED_LIMIT},
+        ]
+        facets[f"avg_{t}"] = [
+            has_field,
+            {"$group": {"_id": None, "avg": {"$avg": "$rating"}, "count": {"$sum": 1}}},
+        ]
+    return facets
+
+
+def review_pipeline(match):
+    fields = {"_id": 0, "rating": 1, **{field: 1 for field, _ in REVIEW_TYPES.values()}}
+    return [
+        {"$match": match},
+        {"$project": fields},  # el $facet solo ve lo que necesita
+        {"$facet": _review_facets()},
+    ]
+
+
+def ranking_pipeline(match, with_top_users=False):
+    facets = {
+        "total": [{"$count": "n"}],
+        "by_category": [
+            {"$group": {"_id": "$categoryCode", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}},
+            {"$limit": CATEGORY_LIMIT},
+        ],
+    }
+    if with_top_users:
+        facets["top_users"] = [
+            {"$group": {"_id": "$user", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}},
+            {"$limit": TOP_USERS_LIMIT},
+        ]
+    return [
+        {"$match": match},
+        {"$project": {"_id": 0, "categoryCode": 1, "user": 1}},
+        {"$facet": facets},
+    ]
+
+
+def _hydrate(catalog, items, entity_type, fallback):
+    out = []
+    for it in items:
+        card = catalog.card(entity_type, it["id"])
+        out.append({
+            **it,
+            "label": card["label"] if card else f"{fallback} {it['id']}",
+            "img": card["img"] if card else None,
+            "subtitle": card["subtitle"] if card else "",
+        })
+    return out
+
+
+def reviews_section(db, match):
+    facet = next(db["reviews"].aggregate(review_pipeline(match)), {})
+    catalog = get_catalog()
+
+    overall = (facet.get("overall") or [{}])[0]
+
+    dist = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
+    for d in facet.get("dist") or []:
+        k = int(d["_id"] or 0)
+        if k in dist:
+            dist[k] = int(d["n"])
+
+    avg_by_type, top_rated, most_reviewed = {}, {}, {}
+    for t, (_, fallback) in REVIEW_TYPES.items():
+        docs = facet.get(f"avg_{t}") or []
+        avg_by_type[t] = (
+            {"avg": round(float(docs[0]["avg"] or 0), 2), "count": int(docs[0]["count"])}
+            if docs else {"avg": 0.0, "count": 0}
+        )
+        top_rated[t] = _hydrate(catalog, [
+            {"id": int(x["_id"]), "avg": round(float(x["avg"]), 2), "count": int(x["count"])}
+            for x in facet.get(f"top_{t}") or []
+        ], t, fallback)
+        most_reviewed[t] = _hydrate(catalog, [
+            {"id": int(x["_id"]), "count": int(x["count"])}
+            for x in facet.get(f"most_{t}") or []
+        ], t, fallback)
+
+    return {
+        "total": int(overall.get("count") or 0),
+        "avg": round(float(overall.get("avg") or 0.0), 2),
+        "dist": dist,
+        "avg_by_type": avg_by_type,
+        "top_rated": top_rated,
+        "most_reviewed": most_reviewed,
+    }
+
+
+def rankings_section(db, match, with_top_users=False):
+    facet = next(db["rankings"].aggregate(ranking_pipeline(match, with_top_users)), {})
+    total = facet.get("total") or []
+    return {
+        "total": int(total[0]["n"]) if total else 0,
+        "by_category": [
+            {"category": (x["_id"] or ""), "count": int(x["count"])}
+            for x in facet.get("by_category") or []
+        ],
+        "top_users": [
+            {"user": x["_id"], "count": int(x["count"])}
+            for x in facet.get("top_users") or []
+        ],
+    }
+
+
+def build_statistics(db, match, with_top_users=False):
+    """Payload de /api/statistics/ (sin "ok"): scope, reviews y rankings."""
+    return {
+        "scope": "global" if match == {} else "me",
+        "reviews": reviews_section(db, match),
+        "rankings": rankings_section(db, match, with_top_users),
+    }
+
+
+# =========================
+# Snapshot del ámbito global
+# =========================
+# scope=global agrega TODO reviews/rankings. refresh_statistics (cron, o un
+# único proceso con --every N) guarda el payload en "statistics_snapshots" con
+# su hora de generación; la vista lo sirve si tiene menos de
+# STATISTICS_SNAPSHOT_MAX_AGE. No se regenera desde los workers: con N
+# procesos serían N agregaciones globales por periodo.
+SNAPSHOT_COLLECTION = "statistics_snapshots"
+GLOBAL_SNAPSHOT_ID = "global"
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def refresh_global_snapshot(db):
+    """Calcula el payload global y lo guarda. Devuelve la hora de generación."""
+    payload = build_statistics(db, {}, with_top_users=True)
+    # BSON solo admite claves str (JsonResponse las serializa igual)
+    payload["reviews"]["dist"] = {str(k): v for k, v in payload["reviews"]["dist"].items()}
+    generated_at = _utcnow()
+    db[SNAPSHOT_COLLECTION].replace_one(
+        {"_id": GLOBAL_SNAPSHOT_ID},
+        {"_id": GLOBAL_SNAPSHOT_ID, "generatedAt": generated_at, "payload": payload},
+        upsert=True,
+    )
+    return generated_at
+
+
+def global_snapshot(db, max_age):
+    """Payload guardado si tiene menos de max_age segundos; si no, None."""
+    doc = db[SNAPSHOT_COLLECTION].find_one({"_id": GLOBAL_SNAPSHOT_ID})
+    if not doc or not doc.get("generatedAt"):
+        return None
+    generated_at = doc["generatedAt"]
+    if generated_at.tzinfo is None:  # pymongo devuelve datetimes naive en UTC
+        generated_at = generated_at.replace(tzinfo=datetime.timezone.utc)
+    if (_utcnow() - generated_at).total_seconds() > max_age:
+        return None
+    return doc["payload"]
+
+
+def global_snapshot_stamp(db, max_age):
+    """Hora de generación del snapshot si se serviría (para el ETag), sin leer el payload."""
+    doc = db[SNAPSHOT_COLLECTION].find_one({"_id": GLOBAL_SNAPSHOT_ID}, {"_id": 0, "generatedAt": 1})
+    generated_at = (doc or {}).get("generatedAt")
+    if not generated_at:
+        return None
+    if generated_at.tzinfo is None:
+        generated_at = generated_at.replace(tzinfo=datetime.timezone.utc)
+    if (_utcnow() - generated_at).total_seconds() > max_age:
+        return None
+    return int(generated_at.timestamp())
@@ -0,0 +1,52 @@
+from pymongo import UpdateOne
+
+# =========================
+# Contadores de versión en Mongo
+# =========================
+# Un doc por clave en la colección "versions": {"_id": "catalog:characters", "n": 7}.
+# Quien cambia datos hace bump(); quien cachea compara la versión (1 find barato).
+# También sirven de ETag en la API JSON: si las claves de una respuesta no han
+# cambiado, la respuesta tampoco (ver etag()).
+
+COLLECTION = "versions"
+
+# claves de colección (cualquier cambio en ella)
+REVIEWS = "reviews"
+RANKINGS = "rankings"
+CATEGORIES = "categories"
+
+
+def review_key(entity_type, entity_id):
+    """Reviews de una entidad: "reviews:characters:1"."""
+    return f"reviews:{entity_type}:{int(entity_id)}"
+
+
+def ranking_key(ranking_id):
+    return f"ranking:{ranking_id}"
+
+
+def bump(db, *keys):
+    if not keys:
+        return
+    db[COLLECTION].bulk_write(
+        [UpdateOne({"_id": key}, {"$inc": {"n": 1}}, upsert=True) for key in keys],
+        ordered=False,
+    )
+
+
+def get_versions(db, keys):
+    """{key: n} (0 si la clave nunca se ha incrementado)."""
+    found = {d["_id"]: int(d.get("n") or 0) for d in db[COLLECTION].find({"_id": {"$in": list(keys)}})}
+    return {k: found.get(k, 0) for k in keys}
+
+
+async def aget_versions(adb, keys):
+    """Igual que get_versions con el cliente async."""
+    found = {d["_id"]: int(d.get("n") or 0) async for d in adb[COLLECTION].find({"_id": {"$in": list(keys)}})}
+    return {k: found.get(k, 0) for k in keys}
+
+
+def etag(db, keys, *extra):
+    """ETag "3.12.c7.e2.l3": versiones de `keys` (en orden) + lo que varíe la respuesta (usuario, scope...)."""
+    current = get_versions(db, keys)
+    return ".".join([str(current[k]) for k in keys] + [str(x) for x in extra])
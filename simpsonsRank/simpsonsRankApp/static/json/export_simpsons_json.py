@@ -1,19 +1,61 @@
+import argparse
+import csv
+import hashlib
 import json
+import os
+import shutil
+import threading
 import time
-from typing import Optional, Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterable, Optional
 
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
-BASE = "https://thesimpsonsapi.com/api"
+BASE = os.environ.get("SIMPSONS_API_BASE", "https://thesimpsonsapi.com/api")
 LIMIT = 50
 
-SLEEP = 0.10          # entre páginas
-DETAIL_SLEEP = 0.12   # entre detalles (sube si el servidor corta)
+WORKERS = 8           # detalles en paralelo
+RATE = 8.0            # peticiones/segundo (todas, listas + detalles)
+BURST = 8             # ráfaga máxima del token bucket
 TIMEOUT = (8, 40)     # (connect_timeout, read_timeout)
+CHECKPOINT_DIR = ".export_checkpoint"
+CACHE_DIR = ".http_cache"
+CSV_DIR = Path(__file__).resolve().parent.parent / "csv"   # static/csv, donde están los CSV de la app
 
-# ---------- sesión con retries ----------
+
+# ---------- limitador de peticiones (token bucket) ----------
+class TokenBucket:
+    """`rate` tokens/segundo, como mucho `burst` acumulados. acquire() bloquea hasta tener uno."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+LIMITER = TokenBucket(RATE, BURST)
+
+
+# ---------- sesión con retries (una por hilo) ----------
 def make_session() -> requests.Session:
     s = requests.Session()
 
@@ -39,113 +81,423 @@ def make_session() -> requests.Session:
     })
     return s
 
-SESSION = make_session()
+
+_local = threading.local()
+
+
+def session() -> requests.Session:
+    if not hasattr(_local, "session"):
+        _local.session = make_session()
+    return _local.session
+
+
+# ---------- checkpoints en disco ----------
+class Checkpoint:
+    """
+    Progreso de un endpoint en CHECKPOINT_DIR:
+      <endpoint>.pages.jsonl    -> una línea por página de la lista ya descargada
+      <endpoint>.details.jsonl  -> una línea por detalle ya descargado
+    Si el proceso se corta, la siguiente ejecución continúa desde ahí.
+    """
+
+    def __init__(self, directory: Path, endpoint: str):
+        self.pages_path = directory / f"{endpoint}.pages.jsonl"
+        self.details_path = directory / f"{endpoint}.details.jsonl"
+        self.lock = threading.Lock()
+        directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _read(path: Path) -> list[dict]:
+        if not path.exists():
+            return []
+        out = []
+        with path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    out.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break  # última línea a medias (corte durante la escritura)
+        return out
+
+    def _append(self, path: Path, record: dict):
+        with self.lock, path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+
+    def iter_pages(self):
+        """Páginas guardadas, de una en una (no se cargan todas en memoria)."""
+        if not self.pages_path.exists():
+            return
+        with self.pages_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return  # última línea a medias (corte durante la escritura)
+
+    def save_page(self, page: int, items: list[dict], last: bool = False):
+        self._append(self.pages_path, {"page": page, "items": items, "last": last})
+
+    def details(self) -> dict:
+        return {d["id"]: d["detail"] for d in self._read(self.details_path)}
+
+    def save_detail(self, item_id, detail: dict):
+        self._append(self.details_path, {"id": item_id, "detail": detail})
+
+
+# ---------- caché HTTP en disco (peticiones condicionales) ----------
+class HTTPCache:
+    """
+    Una respuesta por URL (+params) en `directory`, con su ETag / Last-Modified.
+      - más joven que max_age           -> se devuelve sin ir a la red (fresh)
+      - si no, petición condicional     -> 304: se reutiliza (revalidated)
+                                           200: se guarda la nueva (miss)
+    """
+
+    def __init__(self, directory: Path, max_age: float = 0):
+        self.directory = directory
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.stats = {"fresh": 0, "revalidated": 0, "miss": 0, "uncacheable": 0}
+        directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, url: str, params: Optional[dict]) -> Path:
+        key = url + "?" + "&".join(f"{k}={v}" for k, v in sorted((params or {}).items()))
+        return self.directory / (hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _count(self, what: str):
+        with self.lock:
+            self.stats[what] += 1
+
+    def get_json(self, url: str, params: Optional[dict]) -> dict:
+        path = self._path(url, params)
+        entry = None
+        if path.exists():
+            try:
+                entry = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError):
+                entry = None
+
+        if entry and self.max_age and time.time() - entry["fetched_at"] < self.max_age:
+            self._count("fresh")
+            return entry["body"]
+
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        LIMITER.acquire()
+        r = session().get(url, params=params, headers=headers, timeout=TIMEOUT)
+
+        if r.status_code == 304 and entry:
+            self._count("revalidated")
+            entry["fetched_at"] = time.time()
+            self._store(path, entry)
+            return entry["body"]
+
+        r.raise_for_status()
+        body = r.json()
+        etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+        if etag or last_modified or self.max_age:
+            self._count("miss")
+            self._store(path, {
+                "url": r.url, "etag": etag, "last_modified": last_modified,
+                "fetched_at": time.time(), "body": body,
+            })
+        else:
+            self._count("uncacheable")
+        return body
+
+    def _store(self, path: Path, entry: dict):
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)  # atómico: nunca queda una entrada a medias
+
+    def summary(self) -> str:
+        total = sum(self.stats.values())
+        network = total - self.stats["fresh"]
+        return (
+            f"caché HTTP: {total} peticiones -> {self.stats['fresh']} sin red, "
+            f"{self.stats['revalidated']} revalidadas (304), {self.stats['miss']} descargadas, "
+            f"{self.stats['uncacheable']} sin validadores; {network} idas a la red"
+        )
+
+
+CACHE: Optional[HTTPCache] = None
+
 
 # ---------- helpers ----------
 def get_json(url: str, *, params: Optional[dict] = None) -> dict:
-    r = SESSION.get(url, params=params, timeout=TIMEOUT)
+    if CACHE is not None:
+        return CACHE.get_json(url, params)
+
+    LIMITER.acquire()
+    r = session().get(url, params=params, timeout=TIMEOUT)
     # si el servidor devuelve 4xx/5xx fuera de los reintentos, esto lo deja claro
     r.raise_for_status()
     return r.json()
 
-def fetch_all(endpoint: str) -> list[dict]:
-    page = 1
-    all_items: list[dict] = []
 
+def iter_pages(endpoint: str, checkpoint: Checkpoint):
+    """Páginas de la lista, una a una: primero las del checkpoint y luego las que falten."""
+    page, n_items = 0, 0
+    for p in checkpoint.iter_pages():
+        if p.get("last"):
+            print(f"{endpoint}: lista completa en checkpoint ({n_items})")
+            return
+        page = p["page"]
+        n_items += len(p["items"])
+        yield p["items"]
+
+    page += 1
     while True:
         url = f"{BASE}/{endpoint}"
         try:
             data = get_json(url, params={"page": page, "limit": LIMIT})
         except requests.RequestException as e:
-            # Si una página falla pese a retries, puedes: reintentar manualmente, o abortar.
-            # Aquí lo reintentamos manualmente con una pausa mayor y seguimos.
+            # Si una página falla pese a retries, la reintentamos con una pausa mayor y seguimos.
             print(f"[WARN] {endpoint} página {page} falló: {e}. Reintentando en 3s...")
             time.sleep(3)
             continue
 
         items = data.get("results", [])
+        checkpoint.save_page(page, items, last=not items)
         if not items:
-            break
+            return
 
-        all_items.extend(items)
-        print(f"{endpoint}: página {page} -> total {len(all_items)}")
+        n_items += len(items)
+        print(f"{endpoint}: página {page} -> total {n_items}")
+        yield items
         page += 1
-        time.sleep(SLEEP)
 
-    return all_items
 
 def fetch_detail(endpoint: str, item_id: int) -> dict:
     url = f"{BASE}/{endpoint}/{item_id}"
     return get_json(url)
 
+
 def enrich_with_details(
     endpoint: str,
     items: list[dict],
+    checkpoint: Checkpoint,
+    done: dict,
     fields: Optional[set[str]] = None,
     *,
+    workers: int = WORKERS,
     skip_failures: bool = True,
 ) -> list[dict]:
-    enriched: list[dict] = []
-
-    for i, item in enumerate(items, start=1):
-        item_id = item.get("id")
-        if item_id is None:
-            enriched.append(item)
+    """
+    Añade a los items de UNA página su detalle (en paralelo). `done` son los
+    detalles ya guardados en el checkpoint; se van sacando según se usan.
+    """
+    details = {}
+    pending = []
+    for it in items:
+        if it.get("id") is None:
             continue
+        item_id = int(it["id"])
+        if item_id in done:
+            details[item_id] = done.pop(item_id)
+        else:
+            pending.append(item_id)
 
-        try:
-            detail = fetch_detail(endpoint, int(item_id))
-        except requests.RequestException as e:
-            msg = f"[WARN] detalle {endpoint}/{item_id} falló: {e}"
-            if skip_failures:
+    def work(item_id: int):
+        detail = fetch_detail(endpoint, item_id)
+        if fields is not None:
+            detail = {k: detail[k] for k in fields if k in detail}
+        checkpoint.save_detail(item_id, detail)
+        return detail
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(work, item_id): item_id for item_id in pending}
+        for fut in as_completed(futures):
+            item_id = futures[fut]
+            try:
+                details[item_id] = fut.result()
+            except requests.RequestException as e:
+                msg = f"[WARN] detalle {endpoint}/{item_id} falló: {e}"
+                if not skip_failures:
+                    raise
                 print(msg + " -> se omite y se continúa")
-                enriched.append(item)
-                time.sleep(DETAIL_SLEEP)
-                continue
-            raise
 
-        if fields is not None:
-            for k in fields:
-                if k in detail:
-                    item[k] = detail[k]
-        else:
+    # mismo orden que la lista
+    for item in items:
+        item_id = item.get("id")
+        detail = details.get(int(item_id)) if item_id is not None else None
+        if detail:
             item.update(detail)
-
-        enriched.append(item)
-
-        if i % 50 == 0:
-            print(f"{endpoint}: detalles {i}/{len(items)}")
-
-        time.sleep(DETAIL_SLEEP)
-
-    return enriched
-
-def write_json(filename: str, data: list[dict]):
-    if not data:
+    return items
+
+
+# ---------- escritores incrementales ----------
+# Columnas de los simpsons_*.csv de static/csv (las de la lista de la API, en
+# su orden). Los campos del detalle (description) solo van al JSON.
+CSV_COLUMNS = {
+    "characters": ["id", "age", "birthdate", "gender", "name", "occupation", "portrait_path",
+                   "phrases", "status"],
+    "episodes": ["id", "airdate", "episode_number", "image_path", "name", "season", "synopsis"],
+    "locations": ["id", "name", "image_path", "town", "use"],
+}
+
+
+class JSONArrayWriter:
+    """Escribe la lista elemento a elemento con el mismo formato que json.dump(indent=2)."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.tmp = filename + ".tmp"
+        self.f = open(self.tmp, "w", encoding="utf-8")
+        self.count = 0
+
+    def write_many(self, items: list[dict]):
+        for item in items:
+            body = json.dumps(item, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+            self.f.write(("[\n  " if self.count == 0 else ",\n  ") + body)
+            self.count += 1
+
+    def close(self):
+        if self.count:
+            self.f.write("\n]")
+        self.f.close()
+        _finish(self.tmp, self.filename, self.count)
+
+
+class CSVWriter:
+    """Mismo formato que escribía export_simpsons_csv.py (csv.DictWriter, listas tal cual).
+
+    Los campos que no están en `columns` no se escriben; si la API trae alguno
+    nuevo (fuera de `known_extra`) se avisa una vez al cerrar el fichero.
+    """
+
+    def __init__(self, filename: str, columns: list[str], known_extra: Iterable[str] = ()):
+        self.filename = filename
+        self.tmp = filename + ".tmp"
+        self.f = open(self.tmp, "w", encoding="utf-8", newline="")
+        self.writer = csv.DictWriter(self.f, fieldnames=columns, extrasaction="ignore")
+        self.writer.writeheader()
+        self.count = 0
+        self.ignored = set(columns) | set(known_extra)
+        self.dropped: set[str] = set()
+
+    def write_many(self, items: list[dict]):
+        for item in items:
+            self.dropped.update(k for k in item if k not in self.ignored)
+        self.writer.writerows(items)
+        self.count += len(items)
+
+    def close(self):
+        self.f.close()
+        if self.dropped:
+            print(f"[WARN] {self.filename}: campos de la API que no van al CSV: {', '.join(sorted(self.dropped))}")
+        _finish(self.tmp, self.filename, self.count)
+
+
+def _finish(tmp: str, filename: str, count: int):
+    # el fichero final solo se reemplaza si la exportación ha ido bien y trae datos
+    if not count:
+        os.remove(tmp)
         print(f"{filename}: no hay datos")
         return
+    os.replace(tmp, filename)
+    print(f"OK -> {filename} ({count} registros)")
+
+
+# endpoint -> campos del detalle que se añaden a cada item (None = sin detalle)
+ENDPOINTS = {
+    "characters": {"description"},
+    "episodes": None,
+    "locations": None,
+}
+
+
+def export_endpoint(endpoint: str, ckpt_dir: Path, formats: set[str], json_dir: Path, csv_dir: Path, workers: int):
+    """Una sola pasada por la API: cada página va a la vez al JSON y al CSV."""
+    checkpoint = Checkpoint(ckpt_dir, endpoint)
+    # el CSV solo lleva los campos de la lista: sin JSON no hace falta pedir detalles
+    detail_fields = ENDPOINTS[endpoint] if "json" in formats else None
+
+    writers = []
+    if "json" in formats:
+        writers.append(JSONArrayWriter(str(json_dir / f"simpsons_{endpoint}.json")))
+    if "csv" in formats:
+        writers.append(CSVWriter(str(csv_dir / f"simpsons_{endpoint}.csv"), CSV_COLUMNS[endpoint],
+                                 known_extra=ENDPOINTS[endpoint] or ()))
+
+    done = checkpoint.details() if detail_fields else {}
+    if done:
+        print(f"{endpoint}: {len(done)} detalles en checkpoint")
+
+    try:
+        for items in iter_pages(endpoint, checkpoint):
+            if detail_fields:
+                items = enrich_with_details(endpoint, items, checkpoint, done, detail_fields, workers=workers)
+            for w in writers:
+                w.write_many(items)
+    except BaseException:
+        for w in writers:
+            w.f.close()
+            os.remove(w.tmp)
+        raise
+
+    for w in writers:
+        w.close()
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(
+        description="Exporta personajes, episodios y lugares de The Simpsons API a JSON y/o CSV en una sola pasada."
+    )
+    p.add_argument("--base-url", default=BASE, help="Raíz de la API (p.ej. un servidor stub local).")
+    p.add_argument("--formats", default="json,csv", help="Formatos de salida separados por comas (json, csv).")
+    p.add_argument("--json-dir", default=".", help="Carpeta de los JSON generados.")
+    p.add_argument("--csv-dir", default=str(CSV_DIR), help="Carpeta de los CSV generados (por defecto static/csv).")
+    p.add_argument("--workers", type=int, default=WORKERS, help="Detalles descargados en paralelo.")
+    p.add_argument("--rate", type=float, default=RATE, help="Peticiones por segundo (0 = sin límite).")
+    p.add_argument("--burst", type=int, default=BURST, help="Ráfaga máxima del limitador.")
+    p.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR, help="Dónde guardar el progreso.")
+    p.add_argument("--fresh", action="store_true", help="Ignora el checkpoint y empieza de cero.")
+    p.add_argument("--keep-checkpoint", action="store_true", help="No borra el checkpoint al terminar.")
+    p.add_argument("--cache-dir", default=CACHE_DIR, help="Caché HTTP en disco (ETag / Last-Modified).")
+    p.add_argument("--max-age", type=float, default=0,
+                   help="Segundos durante los que una respuesta cacheada se usa sin preguntar (0 = revalidar siempre).")
+    p.add_argument("--no-cache", action="store_true", help="Desactiva la caché HTTP.")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    global BASE, LIMITER, CACHE
+    args = parse_args(argv)
+    BASE = args.base_url.rstrip("/")
+    LIMITER = TokenBucket(args.rate, args.burst)
+    CACHE = None if args.no_cache else HTTPCache(Path(args.cache_dir), args.max_age)
+
+    formats = {f.strip() for f in args.formats.split(",") if f.strip()}
+    unknown = formats - {"json", "csv"}
+    if unknown or not formats:
+        raise SystemExit(f"Formatos no soportados: {sorted(unknown) or '(ninguno)'}")
+
+    json_dir, csv_dir = Path(args.json_dir), Path(args.csv_dir)
+    if "json" in formats:
+        json_dir.mkdir(parents=True, exist_ok=True)
+    if "csv" in formats:
+        csv_dir.mkdir(parents=True, exist_ok=True)
+
+    ckpt_dir = Path(args.checkpoint_dir)
+    if args.fresh and ckpt_dir.exists():
+        shutil.rmtree(ckpt_dir)
+
+    for endpoint in ENDPOINTS:
+        print(f"Exportando {endpoint}...")
+        export_endpoint(endpoint, ckpt_dir, formats, json_dir, csv_dir, args.workers)
+
+    if not args.keep_checkpoint:
+        shutil.rmtree(ckpt_dir, ignore_errors=True)
+
+    if CACHE is not None:
+        print(CACHE.summary())
 
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-    print(f"OK -> {filename} ({len(data)} registros)")
-
-def main():
-    print("Descargando personajes (lista)...")
-    characters = fetch_all("characters")
-
-    print("Enriqueciendo personajes con description (detalle por id)...")
-    characters = enrich_with_details("characters", characters, fields={"description"})
-
-    print("Descargando episodios...")
-    episodes = fetch_all("episodes")
-
-    print("Descargando lugares...")
-    locations = fetch_all("locations")
-
-    write_json("simpsons_characters.json", characters)
-    write_json("simpsons_episodes.json", episodes)
-    write_json("simpsons_locations.json", locations)
 
 if __name__ == "__main__":
     main()
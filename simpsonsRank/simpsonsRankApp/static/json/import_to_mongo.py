@@ -1,7 +1,14 @@
-import json
+import sys
 from pathlib import Path
 from pymongo import MongoClient
 
+# el script se ejecuta suelto desde static/json: añadimos la raíz del proyecto
+# para reutilizar el importador de la app (no necesita Django)
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+
+from simpsonsRankApp.core.jsonstream import iter_json_array, iter_file_chunks  # noqa: E402
+from simpsonsRankApp.service import catalog_import  # noqa: E402
+
 MONGO_URI = "mongodb://localhost:27017/"
 DB_NAME = "simpsonsRank"
 
@@ -11,12 +18,11 @@ FILES = {
     "locations": Path("simpsons_locations.json"),
 }
 
-RESET_COLLECTIONS = True  # True = borra y vuelve a insertar
-
-
-def load_json(path: Path):
-    with path.open("r", encoding="utf-8") as f:
-        return json.load(f)
+# "upsert" = por id, solo escribe lo nuevo/cambiado (la colección nunca queda vacía)
+# "reset"  = borra y vuelve a insertar
+MODE = "upsert"
+DELETE_MISSING = True  # (upsert) borra los documentos que ya no vienen en el JSON
+BATCH_SIZE = 1000
 
 
 def main():
@@ -28,22 +34,35 @@ def main():
             print(f"[ERROR] No existe: {path}")
             continue
 
-        data = load_json(path)
-        if not isinstance(data, list):
-            print(f"[ERROR] {path} no contiene una lista JSON.")
-            continue
-
-        col = db[collection_name]
+        with path.open("rb") as f:
+            docs = iter_json_array(iter_file_chunks(f))
+            if MODE == "upsert":
+                report = catalog_import.upsert_stream(
+                    db, collection_name, docs, batch_size=BATCH_SIZE, delete_missing=DELETE_MISSING
+                )
+            else:
+                report = catalog_import.import_stream(db, collection_name, docs, batch_size=BATCH_SIZE, reset=True)
 
-        if RESET_COLLECTIONS:
-            col.delete_many({})
+        if report["error"]:
+            print(f"[ERROR] {path}: {report['error']}")
+        for b in report["batches"]:
+            for err in b["errors"]:
+                print(f"[WARN] {collection_name} lote {b['batch']}: {err}")
 
-        if data:
-            col.insert_many(data)
-            print(f"[OK] {collection_name}: insertados {len(data)} documentos.")
+        if MODE == "upsert":
+            print(
+                f"[OK] {collection_name}: {report['inserted']} nuevos, {report['updated']} actualizados, "
+                f"{report['unchanged']} sin cambios, {report['removed']} borrados."
+            )
+        elif report["received"]:
+            print(f"[OK] {collection_name}: insertados {report['written']} documentos.")
         else:
             print(f"[WARN] {collection_name}: lista vacía.")
 
+        # avisa a los procesos de la web para que recarguen su snapshot del catálogo
+        if report["written"] or report["removed"] or MODE == "reset":
+            db["versions"].update_one({"_id": f"catalog:{collection_name}"}, {"$inc": {"n": 1}}, upsert=True)
+
     print("DONE.")
 
 
@@ -1,3 +1,996 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import csv
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from simpsonsRankApp.core import admission
+from simpsonsRankApp.core.admission import Gate
+from simpsonsRankApp.core.cache import aswr_get, invalidate, swr_get
+from simpsonsRankApp.core.jsonstream import JSONStreamError, iter_json_array
+from simpsonsRankApp.core.lru import LRUCache
+from simpsonsRankApp.core.pagination import KeysetPaginator, decode_cursor, encode_cursor
+from simpsonsRankApp.service import (
+    catalog_file, category_positions, entity_stats, indexes, ranking_feed, review_queue, reviews,
+)
+from simpsonsRankApp.service.catalog import RECORD_CLASSES, CatalogSnapshot
+from simpsonsRankApp.service.reviews import MissingReviewIndexes, save_review, save_reviews_batch
+from simpsonsRankApp.views.reviews import episode_reviews
+
+try:
+    import mongomock
+except ImportError:  # los tests que tocan Mongo se saltan
+    mongomock = None
+
+needs_mongomock = unittest.skipIf(mongomock is None, "requiere mongomock")
+
+# el exportador es un script suelto en static/json
+sys.path.insert(0, str(Path(__file__).resolve().parent / "static" / "json"))
+import export_simpsons_json as exporter  # noqa: E402
+
+
+def _split(data, n):
+    return [data[i:i + n] for i in range(0, len(data), n)]
+
+
+class _MockCollection:
+    """Colección de mongomock con un bulk_write que entiende las operaciones de pymongo 4."""
+
+    def __init__(self, col):
+        self._col = col
+
+    def __getattr__(self, name):
+        return getattr(self._col, name)
+
+    def bulk_write(self, ops, ordered=True):
+        errors = []
+        for n, op in enumerate(ops):
+            try:
+                if isinstance(op, InsertOne):
+                    self._col.insert_one(op._doc)
+                elif isinstance(op, UpdateOne):
+                    self._col.update_one(op._filter, op._doc, upsert=op._upsert)
+                elif isinstance(op, ReplaceOne):
+                    self._col.replace_one(op._filter, op._doc, upsert=op._upsert)
+                else:
+                    raise TypeError(op)
+            except DuplicateKeyError:
+                errors.append({"index": n, "code": 11000})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+class _MockDB:
+    def __init__(self):
+        self._db = mongomock.MongoClient().db
+
+    def __getitem__(self, name):
+        return _MockCollection(self._db[name])
+
+    __getattr__ = __getitem__
+
+
+# =========================
+# core/jsonstream.py
+# =========================
+class JSONStreamTests(SimpleTestCase):
+    DOC = b'[6.75e3, -12, 1E-5, 0.5, {"a": [1, 2.5e10], "b": "x\\u00e9"}, "y", true, null, 3]'
+
+    def test_any_chunk_size(self):
+        expected = json.loads(self.DOC)
+        for n in range(1, 8):
+            with self.subTest(chunk=n):
+                self.assertEqual(list(iter_json_array(_split(self.DOC, n))), expected)
+
+    def test_number_split_at_dot_or_exponent(self):
+        self.assertEqual(list(iter_json_array([b"[6.", b"75e3]"])), [6750.0])
+        self.assertEqual(list(iter_json_array([b"[1e", b"-3, 2]"])), [0.001, 2])
+        self.assertEqual(list(iter_json_array([b"[12", b"34]"])), [1234])
+
+    def test_utf8_split_inside_character(self):
+        data = '["ñandú"]'.encode()
+        self.assertEqual(list(iter_json_array(_split(data, 1))), ["ñandú"])
+
+    def test_not_a_list(self):
+        with self.assertRaises(JSONStreamError):
+            list(iter_json_array([b'{"a": 1}']))
+
+    def test_truncated(self):
+        with self.assertRaises(JSONStreamError):
+            list(iter_json_array(_split(b'[{"a": 1}, {"b"', 3)))
+
+    def test_trailing_content(self):
+        with self.assertRaises(JSONStreamError):
+            list(iter_json_array([b"[1] 2"]))
+
+
+# =========================
+# core/pagination.py
+# =========================
+class _Row:
+    def __init__(self, id):
+        self.id = id
+
+
+class _FakeQuerySet:
+    """Lo justo de un QuerySet para KeysetPaginator (order_by, filter por id, slicing)."""
+
+    def __init__(self, ids, reverse=False):
+        self.reverse = reverse
+        self.ids = sorted(ids, reverse=reverse)
+
+    def order_by(self, field):
+        return _FakeQuerySet(self.ids, reverse=field.startswith("-"))
+
+    def filter(self, id__gt=None, id__lt=None):
+        ids = [i for i in self.ids if (id__gt is None or i > id__gt) and (id__lt is None or i < id__lt)]
+        return _FakeQuerySet(ids, reverse=self.reverse)
+
+    def count(self):
+        return len(self.ids)
+
+    def __getitem__(self, s):
+        return [_Row(i) for i in self.ids[s]]
+
+
+class PaginationTests(SimpleTestCase):
+    def setUp(self):
+        self.paginator = KeysetPaginator(_FakeQuerySet(range(1, 61)), 25)
+
+    def ids(self, page):
+        return [r.id for r in page]
+
+    def test_cursor_round_trip(self):
+        data = {"n": 3, "a": 75}
+        self.assertEqual(decode_cursor(encode_cursor(data)), data)
+        self.assertIsNone(decode_cursor("no es base64!"))
+        self.assertIsNone(decode_cursor(encode_cursor([1, 2])))
+
+    def test_next_and_previous(self):
+        first = self.paginator.get_page(None)
+        self.assertEqual(self.ids(first), list(range(1, 26)))
+        second = self.paginator.get_page(first.next_page_number())
+        self.assertEqual((second.number, self.ids(second)[0]), (2, 26))
+        back = self.paginator.get_page(second.previous_page_number())
+        self.assertEqual(self.ids(back), list(range(1, 26)))
+
+    def test_numeric_page_uses_offset(self):
+        page = self.paginator.get_page("3")
+        self.assertEqual((page.number, self.ids(page)), (3, list(range(51, 61))))
+        self.assertTrue(page.has_previous())
+        self.assertFalse(page.has_next())
+
+    def test_numeric_page_past_the_end(self):
+        for token in ("99", "9" * 5000):
+            with self.subTest(token=token[:5]):
+                page = self.paginator.get_page(token)
+                self.assertEqual((page.number, self.ids(page)[0]), (1, 1))
+
+    def test_invalid_cursor_bounds(self):
+        for data in ({"a": "x"}, {"b": [1]}, {"a": 2 ** 70}):
+            with self.subTest(data=data):
+                page = self.paginator.get_page(encode_cursor(data))
+                self.assertEqual((page.number, self.ids(page)[0]), (1, 1))
+
+
+# =========================
+# service/entity_stats.py
+# =========================
+@needs_mongomock
+class EntityStatsTests(SimpleTestCase):
+    def setUp(self):
+        self.db = _MockDB()
+
+    def stats(self, entity_id):
+        return self.db[entity_stats.COLLECTION].find_one({"type": "characters", "id": entity_id}, {"_id": 0})
+
+    def test_new_then_overwritten_review(self):
+        entity_stats.apply_rating_change(self.db, "characters", 1, None, 4)
+        entity_stats.apply_rating_change(self.db, "characters", 1, None, 2)
+        entity_stats.apply_rating_change(self.db, "characters", 1, 4, 5)
+        doc = self.stats(1)
+        self.assertEqual((doc["count"], doc["sum"], doc["avg"]), (2, 7, 3.5))
+        self.assertEqual(doc["hist"], {"1": 0, "2": 1, "3": 0, "4": 0, "5": 1})
+
+    def test_same_rating_is_noop(self):
+        entity_stats.apply_rating_change(self.db, "characters", 1, 3, 3)
+        self.assertIsNone(self.stats(1))
+
+    def test_batch_matches_one_by_one(self):
+        changes = [(1, None, 5), (1, None, 3), (2, None, 1), (1, 5, 4), (2, 1, 1)]
+        entity_stats.apply_rating_changes(self.db, "characters", changes)
+        one_by_one = _MockDB()
+        for eid, old, new in changes:
+            entity_stats.apply_rating_change(one_by_one, "characters", eid, old, new)
+        for eid in (1, 2):
+            expected = one_by_one[entity_stats.COLLECTION].find_one({"id": eid}, {"_id": 0})
+            self.assertEqual(self.stats(eid), expected)
+
+    def test_matches_recomputed_from_reviews(self):
+        reviews = [(1, 4), (1, 2), (2, 5)]
+        for eid, rating in reviews:
+            self.db["reviews"].insert_one({"characterCode": eid, "rating": rating})
+            entity_stats.apply_rating_change(self.db, "characters", eid, None, rating)
+        self.assertEqual(entity_stats.check(self.db, "characters"), [])
+
+
+# =========================
+# service/ranking_feed.py
+# =========================
+@needs_mongomock
+class RankingFeedTests(SimpleTestCase):
+    def setUp(self):
+        self.db = _MockDB()
+        start = datetime(2024, 1, 1)
+        docs = [
+            # varias con la misma fecha (desempate por _id) y alguna sin fecha
+            {"user": "Homer" if i % 3 else "bart", "categoryCode": "top" if i % 2 else "otra",
+             "rankinDate": None if i % 7 == 0 else start + timedelta(days=i // 2)}
+            for i in range(30)
+        ]
+        self.db["rankings"].insert_many(docs)
+
+    def walk(self, **kwargs):
+        seen, cursor = [], None
+        while True:
+            docs, cursor = ranking_feed.public_feed(self.db, cursor=cursor, limit=4, **kwargs)
+            seen += docs
+            if cursor is None:
+                return seen
+
+    def expected(self, query):
+        docs = list(self.db["rankings"].find(query))
+        dated = sorted((d for d in docs if d["rankinDate"]), key=lambda d: (d["rankinDate"], d["_id"]), reverse=True)
+        undated = sorted((d for d in docs if not d["rankinDate"]), key=lambda d: d["_id"], reverse=True)
+        return [d["_id"] for d in dated + undated]
+
+    def test_pages_cover_everything_once_in_order(self):
+        self.assertEqual([d["_id"] for d in self.walk()], self.expected({}))
+
+    def test_filters_category_and_excludes_me_case_insensitive(self):
+        seen = self.walk(me="BART", cat="top")
+        self.assertEqual([d["_id"] for d in seen], self.expected({"categoryCode": "top", "user": "Homer"}))
+
+    def test_invalid_cursor_restarts(self):
+        docs, _ = ranking_feed.public_feed(self.db, cursor="basura", limit=4)
+        self.assertEqual([d["_id"] for d in docs], self.expected({})[:4])
+
+    def test_category_counts_prefers_accumulators(self):
+        self.db["category_positions"].insert_one({"_id": "top", "rankings": 99, "items": {}})
+        self.assertEqual(ranking_feed.category_counts(self.db, ["top", "otra", ""]), {"top": 99, "otra": 15})
+
+
+# =========================
+# core/lru.py
+# =========================
+class LRUCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(maxsize=2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")           # "b" pasa a ser el menos usado
+        lru.set("c", 3)
+        self.assertNotIn("b", lru)
+        self.assertEqual((lru.get("a"), lru.get("c")), (1, 3))
+        self.assertEqual(lru.stats()["evictions"], 1)
+
+    def test_ttl(self):
+        lru = LRUCache(ttl=10)
+        with mock.patch("simpsonsRankApp.core.lru.time.monotonic", return_value=100.0):
+            lru.set("a", 1)
+        with mock.patch("simpsonsRankApp.core.lru.time.monotonic", return_value=109.0):
+            self.assertEqual(lru.get("a"), 1)
+        with mock.patch("simpsonsRankApp.core.lru.time.monotonic", return_value=110.0):
+            self.assertNotIn("a", lru)
+            self.assertIsNone(lru.get("a"))
+        self.assertEqual((lru.hits, lru.misses), (1, 1))
+
+    def test_discard_where(self):
+        lru = LRUCache()
+        for key in ("characters:homer", "characters:bart", "episodes:1"):
+            lru.set(key, key)
+        self.assertEqual(lru.discard_where(lambda k: k.startswith("characters:")), 2)
+        self.assertEqual(len(lru), 1)
+
+
+# =========================
+# service/category_positions.py
+# =========================
+@needs_mongomock
+class CategoryPositionsTests(SimpleTestCase):
+    A = [{"type": "characters", "id": 1}, {"type": "episodes", "id": 7}, {"type": "otra", "id": 3}]
+    B = [{"type": "episodes", "id": 7}, {"type": "characters", "id": 1}]
+
+    def setUp(self):
+        self.db = _MockDB()
+
+    def add(self, rankin_list):
+        # como save_ranking: primero "rankings", luego el acumulador
+        oid = self.db["rankings"].insert_one({"categoryCode": "top", "rankinList": rankin_list}).inserted_id
+        category_positions.apply_list_change(self.db, "top", None, rankin_list)
+        return oid
+
+    def stored(self):
+        return self.db[category_positions.COLLECTION].find_one({"_id": "top"})
+
+    def recomputed(self):
+        return category_positions.compute_from_rankings(self.db, {"categoryCode": "top"})["top"]
+
+    def test_first_change_seeds_from_rankings(self):
+        # rankings de antes de existir el acumulador
+        self.db["rankings"].insert_one({"categoryCode": "top", "rankinList": self.A})
+        self.add(self.B)
+        self.assertEqual(self.stored(), self.recomputed())
+        self.assertEqual(self.stored()["rankings"], 2)
+
+    def test_incremental_changes_match_recompute(self):
+        self.add(self.A)
+        oid = self.add(self.B)
+        self.db["rankings"].delete_one({"_id": oid})
+        category_positions.apply_list_change(self.db, "top", self.B, None)
+        n, items = category_positions.averages_for(self.db, "top")
+        self.assertEqual(n, 1)
+        self.assertEqual(
+            sorted((it["type"], it["id"], it["avg_pos"]) for it in items),
+            [("characters", 1, 1.0), ("episodes", 7, 2.0)],
+        )
+
+    def test_averages(self):
+        self.add(self.A)
+        self.add(self.B)
+        n, items = category_positions.averages_for(self.db, "top")
+        self.assertEqual(n, 2)
+        self.assertEqual(
+            sorted((it["type"], it["id"], it["avg_pos"], it["appearances"]) for it in items),
+            [("characters", 1, 1.5, 2), ("episodes", 7, 1.5, 2)],
+        )
+        self.assertIsNone(category_positions.averages_for(self.db, "sin-acumulador"))
+
+
+# =========================
+# static/json/export_simpsons_json.py (contra una API local)
+# =========================
+class _StubAPIHandler(BaseHTTPRequestHandler):
+    """/api/<endpoint>?page=&limit= y /api/<endpoint>/<id>, como thesimpsonsapi.com (con ETag y 304)."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        api = self.server
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")[1:]
+        with api.lock:
+            api.requests.append(self.path)
+        if self.path in api.fail:
+            self.send_error(404)
+            return
+
+        endpoint = parts[0]
+        if len(parts) == 2:
+            body = {"id": int(parts[1]), "name": f"{endpoint} {parts[1]}", "description": f"desc {parts[1]}"}
+        else:
+            query = parse_qs(url.query)
+            page, limit = int(query["page"][0]), int(query["limit"][0])
+            ids = range((page - 1) * limit + 1, min(page * limit, api.sizes[endpoint]) + 1)
+            body = {"results": [{"id": i, "name": f"{endpoint} {i}"} for i in ids]}
+
+        if api.revision:
+            body = {**body, "revision": api.revision}
+        data = json.dumps(body).encode("utf-8")
+        etag = f'"{hashlib.sha1(data).hexdigest()}"' if api.etags else None
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _StubAPI(ThreadingHTTPServer):
+    def __init__(self, sizes):
+        super().__init__(("127.0.0.1", 0), _StubAPIHandler)
+        self.sizes = sizes
+        self.fail = set()
+        self.etags = True
+        self.revision = 0  # cambiarlo cambia todas las respuestas (y su ETag)
+        self.requests = []
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api"
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Interrupted(Exception):
+    pass
+
+
+class ExporterResumeTests(SimpleTestCase):
+    SIZES = {"characters": 120, "episodes": 60, "locations": 30}
+
+    def setUp(self):
+        self.api = _StubAPI(self.SIZES)
+        self.addCleanup(self.api.stop)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+
+    def run_export(self):
+        argv = [
+            "--base-url", self.api.base_url, "--no-cache", "--rate", "0", "--workers", "4",
+            "--json-dir", str(self.tmp), "--csv-dir", str(self.tmp),
+            "--checkpoint-dir", str(self.tmp / "ckpt"),
+        ]
+
+        def interrupted(seconds):
+            raise _Interrupted  # la página que falla "mata" el proceso en vez de reintentar
+
+        with mock.patch.object(exporter.time, "sleep", interrupted), \
+                contextlib.redirect_stdout(io.StringIO()):
+            exporter.main(argv)
+
+    def test_resume_after_interruption(self):
+        self.api.fail.add(f"/api/characters?page=3&limit={exporter.LIMIT}")
+        with self.assertRaises(_Interrupted):
+            self.run_export()
+        self.assertFalse((self.tmp / "simpsons_characters.json").exists())
+        first_run = list(self.api.requests)
+
+        self.api.fail.clear()
+        self.api.requests.clear()
+        self.run_export()
+
+        # lo que ya estaba en el checkpoint no se vuelve a pedir
+        done_details = {p for p in first_run if p.startswith("/api/characters/")}
+        self.assertTrue(done_details)
+        self.assertFalse(done_details & set(self.api.requests))
+        self.assertNotIn(f"/api/characters?page=1&limit={exporter.LIMIT}", self.api.requests)
+
+        characters = json.loads((self.tmp / "simpsons_characters.json").read_text(encoding="utf-8"))
+        self.assertEqual([c["id"] for c in characters], list(range(1, 121)))
+        self.assertTrue(all(c["description"] == f"desc {c['id']}" for c in characters))
+
+        for endpoint, n in self.SIZES.items():
+            with open(self.tmp / f"simpsons_{endpoint}.csv", encoding="utf-8", newline="") as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual(len(rows), n)
+            self.assertEqual(list(rows[0]), exporter.CSV_COLUMNS[endpoint])
+        self.assertFalse((self.tmp / "ckpt").exists())
+
+
+class ExporterHTTPCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.api = _StubAPI({"characters": 10})
+        self.addCleanup(self.api.stop)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.url = f"{self.api.base_url}/characters"
+        patcher = mock.patch.object(exporter, "LIMITER", exporter.TokenBucket(0, 1))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_200_then_304_then_200(self):
+        cache = exporter.HTTPCache(self.dir)
+        first = cache.get_json(self.url, {"page": 1, "limit": 5})
+        self.assertEqual(cache.get_json(self.url, {"page": 1, "limit": 5}), first)
+        self.assertEqual((cache.stats["miss"], cache.stats["revalidated"]), (1, 1))
+
+        self.api.revision = 1
+        changed = cache.get_json(self.url, {"page": 1, "limit": 5})
+        self.assertEqual(changed["revision"], 1)
+        self.assertEqual(cache.stats["miss"], 2)
+        self.assertEqual(len(self.api.requests), 3)
+
+    def test_max_age_skips_the_network(self):
+        cache = exporter.HTTPCache(self.dir, max_age=60)
+        cache.get_json(self.url, {"page": 1, "limit": 5})
+        cache.get_json(self.url, {"page": 1, "limit": 5})
+        self.assertEqual(cache.stats["fresh"], 1)
+        self.assertEqual(len(self.api.requests), 1)
+
+    def test_without_validators_nothing_is_stored(self):
+        self.api.etags = False
+        cache = exporter.HTTPCache(self.dir)
+        cache.get_json(self.url, {"page": 1, "limit": 5})
+        cache.get_json(self.url, {"page": 1, "limit": 5})
+        self.assertEqual(cache.stats["uncacheable"], 2)
+        self.assertEqual(list(self.dir.glob("*.json")), [])
+
+    def test_second_export_is_all_304(self):
+        argv = ["--base-url", self.api.base_url, "--rate", "0", "--formats", "csv",
+                "--csv-dir", str(self.dir / "csv"), "--checkpoint-dir", str(self.dir / "ckpt"),
+                "--cache-dir", str(self.dir / "cache")]
+        self.api.sizes.update(episodes=3, locations=3)
+        with contextlib.redirect_stdout(io.StringIO()):
+            exporter.main(argv)
+            exporter.main(argv)
+        self.assertEqual(exporter.CACHE.stats["miss"], 0)
+        self.assertGreater(exporter.CACHE.stats["revalidated"], 0)
+
+
+# =========================
+# service/catalog_file.py
+# =========================
+class CatalogFileTests(SimpleTestCase):
+    DOCS = {
+        "characters": [
+            {"id": 2, "name": "Bart", "age": 10, "phrases": ["¡Multiplícate por cero!"]},
+            {"id": 1, "name": "Homer Simpson", "age": "39", "occupation": "Inspector de seguridad",
+             "portrait_path": "/homer.webp", "status": "Vivo", "description": "ñ ü 🍩"},
+            {"id": 3, "name": "Sin edad", "age": "desconocida"},
+            {"id": 4, "name": "Edad decimal", "age": 8.5},
+        ],
+        "episodes": [{"id": 10, "name": "Piloto", "season": "1", "episode_number": 1, "airdate": None}],
+        "locations": [],
+    }
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = str(Path(tmp.name) / "catalog.bin")
+        records = {
+            t: {rec.id: rec for rec in map(RECORD_CLASSES[t], docs)}
+            for t, docs in self.DOCS.items()
+        }
+        self.snapshot = CatalogSnapshot(records, {"characters": 7, "episodes": 2, "locations": 0})
+
+    def open(self):
+        cf = catalog_file.CatalogFile(self.path)
+        self.addCleanup(cf.close)
+        return cf
+
+    def test_round_trip_matches_the_mongo_snapshot(self):
+        rows = catalog_file.write_snapshot(self.snapshot, self.path)
+        self.assertEqual(rows, {"characters": 4, "episodes": 1, "locations": 0})
+        cf = self.open()
+        self.assertEqual(cf.version, self.snapshot.version)
+        for t, recs in self.snapshot.records.items():
+            cls = RECORD_CLASSES[t]
+            mapped = cf.records(t)
+            self.assertEqual(sorted(mapped), sorted(recs))
+            for rec_id, rec in recs.items():
+                for col in cls.__slots__:
+                    with self.subTest(type=t, id=rec_id, col=col):
+                        self.assertEqual(getattr(mapped[rec_id], col), getattr(rec, col))
+
+    def test_lookups(self):
+        catalog_file.write_snapshot(self.snapshot, self.path)
+        cf = self.open()
+        self.assertEqual(list(cf.ids("characters")), [1, 2, 3, 4])
+        self.assertEqual(cf.get("characters", 1)["age"], 39)
+        self.assertIsNone(cf.get("characters", 3)["age"])
+        self.assertEqual(bytes(cf.raw("characters", 1, "description")).decode("utf-8"), "ñ ü 🍩")
+        self.assertIsNone(cf.get("characters", 99))
+        self.assertIsNone(cf.raw("episodes", "no-es-un-id", "name"))
+
+    def test_not_a_catalog_file(self):
+        Path(self.path).write_bytes(b"esto no es un catalogo")
+        with self.assertRaises(catalog_file.CatalogFileError):
+            catalog_file.CatalogFile(self.path)
+
+
+# =========================
+# ETag / GET condicional (views/reviews.py)
+# =========================
+@needs_mongomock
+class ReviewsETagTests(SimpleTestCase):
+    def setUp(self):
+        self.db = _MockDB()
+        patcher = mock.patch("simpsonsRankApp.views.reviews.get_db", return_value=self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        save_review(self.db, "episodes", 5, "homer", 4, "Mmm... rosquillas")
+
+    def get(self, etag=None):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return episode_reviews(RequestFactory().get("/api/episodes/5/reviews/", **headers), episode_id=5)
+
+    def test_200_304_200(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(len(json.loads(first.content)["results"]), 1)
+        etag = first["ETag"]
+
+        self.assertEqual(self.get(etag).status_code, 304)
+
+        # una review de otra entidad no cambia el ETag de esta
+        save_review(self.db, "episodes", 6, "homer", 2, "Aburrido")
+        self.assertEqual(self.get(etag).status_code, 304)
+
+        save_review(self.db, "episodes", 5, "marge", 5, "Precioso")
+        again = self.get(etag)
+        self.assertEqual(again.status_code, 200)
+        self.assertNotEqual(again["ETag"], etag)
+        self.assertEqual(len(json.loads(again.content)["results"]), 2)
+
+    def test_without_mongo_there_is_no_etag(self):
+        with mock.patch("simpsonsRankApp.views.reviews.get_db", side_effect=RuntimeError):
+            response = self.get('"1"')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("ETag"))
+
+
+# =========================
+# Write-behind de reviews (service/reviews.py, service/review_queue.py)
+# =========================
+def _review(user, entity_id, rating, minutes, entity_type="characters"):
+    date = datetime(2024, 5, 1, 12, tzinfo=timezone.utc) + timedelta(minutes=minutes)
+    return {"type": entity_type, "id": entity_id, "user": user, "rating": rating,
+            "comment": f"{user} {rating}", "date": date, "queued_at": 0}
+
+
+class _ReviewsDB:
+    """Reviews en mongomock con los índices únicos de ensure_mongo_indexes."""
+
+    def setUp(self):
+        self.db = _MockDB()
+        for col, keys, opts in indexes.INDEXES:
+            if col == "reviews" and opts.get("unique"):
+                self.db[col].create_index(keys, **opts)
+        patcher = mock.patch.object(reviews, "_unique_indexes_ok", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stored(self, user, entity_id):
+        return self.db["reviews"].find_one({"user": user, "characterCode": entity_id})
+
+    def assertStatsConsistent(self):
+        self.assertEqual(entity_stats.check(self.db, "characters"), [])
+
+
+@needs_mongomock
+class ReviewsBatchTests(_ReviewsDB, SimpleTestCase):
+    def test_refuses_without_unique_indexes(self):
+        db = _MockDB()
+        with self.assertRaises(MissingReviewIndexes):
+            save_reviews_batch(db, [_review("homer", 1, 5, 0)])
+        self.assertEqual(db["reviews"].count_documents({}), 0)
+
+    def test_last_review_wins_and_replay_is_noop(self):
+        batch = [_review("homer", 1, 2, 0), _review("homer", 1, 5, 1), _review("marge", 1, 4, 0)]
+        self.assertEqual(save_reviews_batch(self.db, batch), {"characters": [1]})
+        self.assertEqual(self.stored("homer", 1)["rating"], 5)
+        self.assertStatsConsistent()
+
+        self.assertEqual(save_reviews_batch(self.db, batch), {})
+        self.assertStatsConsistent()
+
+    def test_older_queued_review_does_not_overwrite_a_newer_one(self):
+        save_reviews_batch(self.db, [_review("homer", 1, 1, 10)])
+        save_reviews_batch(self.db, [_review("homer", 1, 3, 5)])
+        self.assertEqual(self.stored("homer", 1)["rating"], 1)
+        self.assertStatsConsistent()
+
+    def test_concurrent_change_between_read_and_write_is_retried(self):
+        save_reviews_batch(self.db, [_review("homer", 1, 2, 0)])
+        original = _MockCollection.bulk_write
+        raced = []
+
+        def racing_bulk_write(col, ops, ordered=True):
+            if col.name == "reviews" and not raced:
+                # otro worker cambia la review (más antigua que la nuestra) justo antes
+                raced.append(True)
+                save_reviews_batch(self.db, [_review("homer", 1, 4, 1)])
+            return original(col, ops, ordered)
+
+        with mock.patch.object(_MockCollection, "bulk_write", racing_bulk_write):
+            save_reviews_batch(self.db, [_review("homer", 1, 5, 2)])
+        self.assertTrue(raced)
+        self.assertEqual(self.db["reviews"].count_documents({"user": "homer", "characterCode": 1}), 1)
+        self.assertEqual(self.stored("homer", 1)["rating"], 5)
+        self.assertStatsConsistent()
+
+
+@needs_mongomock
+class ReviewSpoolRecoveryTests(_ReviewsDB, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.spool = Path(tmp.name)
+
+    def write_segment(self, pid, items, token="0"):
+        (self.spool / f"{pid}.lock").touch()
+        path = self.spool / f"{pid}-{token}-000001.jsonl"
+        with open(path, "w", encoding="utf-8") as f:
+            for r in items:
+                f.write(review_queue._to_spool(r) + "\n")
+            f.write('{"a medias')  # corte durante la escritura
+        return path
+
+    def recover(self, **kwargs):
+        return review_queue.recover_orphans(self.db, self.spool, own_pid=os.getpid(), own_token="yo", **kwargs)
+
+    def test_replays_orphan_segments_once(self):
+        items = [_review("homer", 1, 5, 0), _review("bart", 2, 1, 0)]
+        segment = self.write_segment(99999999, items)
+        self.assertEqual(self.recover(), 2)
+        self.assertEqual(list(self.spool.iterdir()), [])
+        self.assertEqual(self.stored("bart", 2)["rating"], 1)
+
+        # el mismo segmento otra vez (p.ej. el proceso murió antes de borrarlo)
+        self.write_segment(99999999, items)
+        self.assertEqual(self.recover(), 2)
+        self.assertFalse(segment.exists())
+        self.assertEqual(self.db["reviews"].count_documents({}), 2)
+        self.assertStatsConsistent()
+
+    @unittest.skipIf(review_queue.fcntl is None, "requiere fcntl")
+    def test_skips_segments_of_live_processes(self):
+        self.write_segment(12345, [_review("homer", 1, 5, 0)])
+        held = review_queue._lock(self.spool / "12345.lock")
+        self.addCleanup(held.close)
+        self.assertEqual(self.recover(), 0)
+        self.assertTrue((self.spool / "12345-0-000001.jsonl").exists())
+
+    def test_without_fcntl_only_when_forced(self):
+        self.write_segment(12345, [_review("homer", 1, 5, 0)])
+        with mock.patch.object(review_queue, "fcntl", None), self.assertLogs(review_queue.logger, "WARNING"):
+            self.assertEqual(self.recover(), 0)
+        with mock.patch.object(review_queue, "fcntl", None):
+            self.assertEqual(self.recover(force=True), 1)
+        self.assertEqual(list(self.spool.iterdir()), [])
+
+
+# =========================
+# core/admission.py
+# =========================
+class GateTests(SimpleTestCase):
+    def test_queue_then_reject_when_full(self):
+        gate = Gate("g", concurrency=1, queue=1, timeout=5)
+        self.assertTrue(gate.acquire())
+
+        result = []
+        waiting = threading.Thread(target=lambda: result.append(gate.acquire()))
+        waiting.start()
+        while not gate.stats()["waiting"]:
+            time.sleep(0.001)
+        self.assertFalse(gate.acquire())  # cola llena
+
+        gate.release()  # el hueco pasa al que espera sin bajar active
+        waiting.join()
+        self.assertEqual(result, [True])
+        stats = gate.stats()
+        self.assertEqual((stats["active"], stats["admitted"], stats["rejected_full"]), (1, 2, 1))
+        gate.release()
+        self.assertEqual(gate.stats()["active"], 0)
+
+    def test_timeout(self):
+        gate = Gate("g", concurrency=1, queue=1, timeout=0.01)
+        self.assertTrue(gate.acquire())
+        self.assertFalse(gate.acquire())
+        stats = gate.stats()
+        self.assertEqual((stats["waiting"], stats["rejected_timeout"]), (0, 1))
+
+    def test_async_fifo_handoff(self):
+        gate = Gate("g", concurrency=1, queue=3, timeout=5)
+        order = []
+
+        async def request(n):
+            self.assertTrue(await gate.aacquire())
+            order.append(n)
+            await asyncio.sleep(0)
+            gate.release()
+
+        async def main():
+            await asyncio.gather(*(request(n) for n in range(4)))
+
+        asyncio.run(main())
+        self.assertEqual(order, [0, 1, 2, 3])
+        self.assertEqual(gate.stats()["active"], 0)
+
+    def test_cancelled_waiter_leaves_the_queue(self):
+        gate = Gate("g", concurrency=1, queue=1, timeout=5)
+
+        async def main():
+            self.assertTrue(await gate.aacquire())
+            task = asyncio.ensure_future(gate.aacquire())
+            await asyncio.sleep(0)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertEqual(gate.stats()["waiting"], 0)
+            gate.release()
+
+        asyncio.run(main())
+        self.assertEqual(gate.stats()["active"], 0)
+
+
+@override_settings(ADMISSION_LIMITS={
+    "statistics_data:scope=global": {"concurrency": 1, "staff": True},
+    "statistics_data": {"concurrency": 1, "auth": True},
+    "ranking,show_ranking": {"concurrency": 1},
+})
+class GateSelectionTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(admission, "_gates", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def gate(self, url_name, user, **query):
+        gate = admission.gate_for(url_name, query, user)
+        return gate.name if gate else None
+
+    def test_staff_only_gate(self):
+        staff = SimpleNamespace(is_authenticated=True, is_staff=True)
+        user = SimpleNamespace(is_authenticated=True, is_staff=False)
+        self.assertEqual(self.gate("statistics_data", staff, scope="global"), "statistics_data:scope=global")
+        self.assertEqual(self.gate("statistics_data", user, scope="global"), "statistics_data")
+        self.assertEqual(self.gate("statistics_data", user), "statistics_data")
+
+    def test_anonymous_requests_take_no_slot(self):
+        self.assertIsNone(self.gate("statistics_data", AnonymousUser(), scope="global"))
+        self.assertIsNone(self.gate("statistics_data", AnonymousUser()))
+        self.assertTrue(admission.needs_user("statistics_data"))
+
+    def test_shared_gate_without_user(self):
+        self.assertFalse(admission.needs_user("ranking"))
+        self.assertIs(admission.gate_for("ranking", {}), admission.gate_for("show_ranking", {}))
+        self.assertIsNone(admission.gate_for("home", {}))
+
+
+# =========================
+# core/cache.py (stale-while-revalidate)
+# =========================
+class SWRCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.calls = 0
+
+    def slow_builder(self, delay=0.05):
+        def build():
+            self.calls += 1
+            time.sleep(delay)
+            return self.calls
+        return build
+
+    def concurrently(self, fn, n=10):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(fn())) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_cold_miss_builds_once(self):
+        results = self.concurrently(lambda: swr_get("k", self.slow_builder(), ttl=60, stale_ttl=60))
+        self.assertEqual((self.calls, results), (1, [1] * 10))
+
+    def test_invalidated_entry_is_rebuilt_once_while_serving_stale(self):
+        swr_get("k", self.slow_builder(0), ttl=60, stale_ttl=60)
+        invalidate("k")
+        results = self.concurrently(lambda: swr_get("k", self.slow_builder(), ttl=60, stale_ttl=60))
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(sorted(set(results)), [1, 2])  # el viejo mientras se recalcula
+        self.assertEqual(swr_get("k", self.slow_builder(0), ttl=60, stale_ttl=60), 2)
+
+    def test_rebuild_racing_an_invalidation_is_stored_stale(self):
+        def build():
+            self.calls += 1
+            if self.calls == 1:
+                invalidate("k")  # una escritura llega mientras se calcula
+            return self.calls
+
+        self.assertEqual(swr_get("k", build, ttl=60, stale_ttl=60), 1)
+        self.assertEqual(swr_get("k", build, ttl=60, stale_ttl=60), 2)
+        self.assertEqual(swr_get("k", build, ttl=60, stale_ttl=60), 2)
+
+    def test_shared_version_expires_the_entry(self):
+        build = self.slow_builder(0)
+        self.assertEqual(swr_get("k", build, ttl=60, stale_ttl=60, version=1), 1)
+        self.assertEqual(swr_get("k", build, ttl=60, stale_ttl=60, version=1), 1)
+        # otro worker ha escrito: el contador compartido ha subido
+        self.assertEqual(swr_get("k", build, ttl=60, stale_ttl=60, version=2), 2)
+
+    def test_async(self):
+        async def build():
+            self.calls += 1
+            await asyncio.sleep(0.05)
+            return self.calls
+
+        async def main():
+            return await asyncio.gather(*(aswr_get("k", build, ttl=60, stale_ttl=60) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), [1] * 5)
+        self.assertEqual(self.calls, 1)
+
+
+@override_settings(
+    ADMISSION_LIMITS={"statistics_data:scope=global": {"concurrency": 2, "queue": 4, "timeout": 3, "staff": True}},
+    ADMISSION_RETRY_AFTER=7,
+)
+class AdmissionMiddlewareTests(SimpleTestCase):
+    STAFF = SimpleNamespace(is_authenticated=True, is_staff=True)
+
+    def setUp(self):
+        patcher = mock.patch.object(admission, "_gates", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self):
+        request = RequestFactory().get("/api/statistics/", {"scope": "global"})
+        request.resolver_match = SimpleNamespace(url_name="statistics_data")
+        request.user = self.STAFF
+
+        async def auser():
+            return self.STAFF
+        request.auser = auser
+        return request
+
+    def assertEightOnTwoFour(self, responses):
+        codes = sorted(r.status_code for r in responses)
+        self.assertEqual(codes, [200] * 6 + [503] * 2)
+        self.assertTrue(all(r["Retry-After"] == "7" for r in responses if r.status_code == 503))
+        gate = admission.gate_for("statistics_data", {"scope": "global"}, self.STAFF)
+        self.assertEqual(gate.stats()["active"], 0)
+
+    def test_sync(self):
+        def get_response(request):
+            # como el handler de Django: process_view y luego la vista
+            response = middleware.process_view(request, None, (), {})
+            if response is None:
+                time.sleep(0.1)
+                response = HttpResponse("ok")
+            return response
+
+        middleware = admission.AdmissionControlMiddleware(get_response)
+        responses = []
+        threads = [threading.Thread(target=lambda: responses.append(middleware(self.request()))) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEightOnTwoFour(responses)
+
+    def test_async(self):
+        async def get_response(request):
+            response = await middleware.process_view(request, None, (), {})
+            if response is None:
+                await asyncio.sleep(0.1)
+                response = HttpResponse("ok")
+            return response
+
+        middleware = admission.AdmissionControlMiddleware(get_response)
+
+        async def main():
+            return await asyncio.gather(*(middleware(self.request()) for _ in range(8)))
+
+        self.assertEightOnTwoFour(asyncio.run(main()))
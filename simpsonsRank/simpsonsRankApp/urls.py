@@ -1,17 +1,25 @@
+from django.conf import settings
 from django.urls import path
 from simpsonsRankApp.views import *
-from simpsonsRankApp.views.admin_views import admin_get_category, admin_update_category, admin_toggle_category
+from simpsonsRankApp.views.admin_views import admin_get_category, admin_update_category, admin_toggle_category, \
+    admin_metrics
 from simpsonsRankApp.views.character import show_characters
 from simpsonsRankApp.views.reviews import create_location_review, create_character_review, episode_reviews, \
     create_episode_review, location_reviews
 from simpsonsRankApp.views.statistics import category_avg_ranking
 
+# Grids del catálogo: versión async (consultas en paralelo) si se sirve con asgi.py
+if getattr(settings, "ASYNC_CATALOG_VIEWS", False):
+    home_view, episodes_view, locations_view = go_home_async, show_episodes_async, show_locations_async
+else:
+    home_view, episodes_view, locations_view = go_home, show_episodes, show_locations
+
 urlpatterns = [
     path("", do_login, name="do_login"),
-    path("home/", go_home, name="home"),
+    path("home/", home_view, name="home"),
     path('characters/', show_characters, name='characters'),
-    path('episodes/', show_episodes, name='episodes'),
-    path('locations/', show_locations, name='locations'),
+    path('episodes/', episodes_view, name='episodes'),
+    path('locations/', locations_view, name='locations'),
     path('ranking/', show_ranking, name='ranking'),
     path('login/', do_login, name='do_login'),
     path('register/', do_register, name='do_register'),
@@ -20,6 +28,7 @@ urlpatterns = [
     path("create_category/", create_category, name="create_category"),
     path("rankings/", show_ranking, name="show_ranking"),
     path("rankings/create/", create_ranking, name="create_ranking"),
+    path("rankings/feed/", rankings_feed, name="rankings_feed"),
     path("categories/create/", create_category, name="create_category"),
     path("attachables/search/", search_attachables, name="search_attachables"),
     path("categories/<slug:slug>/items/", category_items, name="category_items"),
@@ -33,6 +42,7 @@ urlpatterns = [
     path("admin/categories/<slug:slug>/get/", admin_get_category, name="admin_get_category"),
     path("admin/categories/<slug:slug>/update/", admin_update_category, name="admin_update_category"),
     path("admin/categories/<slug:slug>/toggle/", admin_toggle_category, name="admin_toggle_category"),
+    path("admin/metrics/", admin_metrics, name="admin_metrics"),
     path("rankings/<str:ranking_id>/delete/", delete_ranking, name="delete_ranking"),
     path("statistics/", statistics_page, name="statistics_page"),
     path("api/statistics/", statistics_data, name="statistics_data"),
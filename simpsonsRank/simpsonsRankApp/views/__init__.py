@@ -1,8 +1,8 @@
-from .home import go_home
+from .home import go_home, go_home_async
 from .auth import do_login, do_register, logout_user
-from .episodes import show_episodes
-from .locations import show_locations
-from .ranking import show_ranking, create_ranking, delete_ranking
+from .episodes import show_episodes, show_episodes_async
+from .locations import show_locations, show_locations_async
+from .ranking import show_ranking, create_ranking, delete_ranking, rankings_feed
 from .api import (
     search_attachables,
     category_items,
@@ -1,15 +1,19 @@
-import json
 import re
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.shortcuts import redirect
 from django.template.defaultfilters import slugify
 from django.views.decorators.http import require_POST, require_GET
-from pymongo import MongoClient
 
-from simpsonsRankApp.static.json.import_to_mongo import MONGO_URI, DB_NAME
+from simpsonsRankApp.core import admission
+from simpsonsRankApp.core.jsonstream import iter_json_array
+from simpsonsRankApp.core.mobgo import get_db
+from simpsonsRankApp.core.pagination import invalidate_count
+from simpsonsRankApp.service import catalog, catalog_import, review_queue, versions
+from simpsonsRankApp.service.search import invalidate_results, result_cache
 
 
 @require_POST
@@ -29,38 +33,87 @@ def upload_json(request):
         messages.error(request, "No se ha subido ningún archivo.")
         return redirect("home")
 
+    # upsert (por id, solo cambios) | reset (borrar e insertar) | insert (añadir)
+    mode = request.POST.get("mode") or ("reset" if request.POST.get("reset") == "on" else "upsert")
+    if mode not in {"upsert", "reset", "insert"}:
+        messages.error(request, "Modo de importación inválido.")
+        return redirect("home")
+
+    # Streaming: el fichero se lee por trozos y se escribe por lotes
     try:
-        data = json.load(f)
+        db = get_db()
+        docs = iter_json_array(f.chunks())
+        batch_size = getattr(settings, "UPLOAD_BATCH_SIZE", 1000)
+        if mode == "upsert":
+            report = catalog_import.upsert_stream(
+                db, collection, docs, batch_size=batch_size,
+                delete_missing=request.POST.get("delete_missing") == "on",
+            )
+        else:
+            report = catalog_import.import_stream(db, collection, docs, batch_size=batch_size, reset=(mode == "reset"))
     except Exception as e:
-        messages.error(request, f"El archivo no es un JSON válido: {e}")
+        messages.error(request, f"Error al insertar en MongoDB: {e}")
         return redirect("home")
 
-    if not isinstance(data, list):
-        messages.error(request, "El JSON debe ser una lista de documentos.")
-        return redirect("home")
+    if report["written"] or report["removed"] or (mode == "reset" and not report["error"]):
+        catalog.mark_changed(db, collection)
+        invalidate_results(collection)
+        invalidate_count(collection)
 
-    reset = request.POST.get("reset") == "on"
+    _report_messages(request, collection, report)
+    return redirect("home")
 
-    try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
-        col = db[collection]
 
-        if reset:
-            col.delete_many({})
+def _report_messages(request, collection, report):
+    """Resumen + detalle de los lotes con errores (acotado) como mensajes flash."""
+    n_batches = len(report["batches"])
+    if report["inserted"] or report["updated"] or report["unchanged"] or report["removed"]:
+        messages.success(
+            request,
+            f" '{collection}': {report['inserted']} nuevos, {report['updated']} actualizados, "
+            f"{report['unchanged']} sin cambios, {report['removed']} borrados ({n_batches} lotes)."
+        )
+    elif report["written"]:
+        messages.success(
+            request,
+            f" Se han importado {report['written']} de {report['received']} documentos "
+            f"en '{collection}' ({n_batches} lotes)."
+        )
+    elif not report["received"] and not report["error"]:
+        messages.warning(request, f"La colección '{collection}' estaba vacía. No se insertó nada.")
+
+    bad_batches = [b for b in report["batches"] if b["error_count"]]
+    for b in bad_batches[:10]:
+        messages.warning(
+            request,
+            f"Lote {b['batch']}: {b['written']}/{b['received']} escritos, {b['error_count']} errores: "
+            + "; ".join(b["errors"])
+        )
+    if len(bad_batches) > 10:
+        messages.warning(request, f"... y {len(bad_batches) - 10} lotes más con errores.")
+
+    if report["error"]:
+        messages.error(
+            request,
+            f"El archivo no es un JSON válido: {report['error']}. "
+            f"Los {report['written']} documentos anteriores sí se importaron."
+        )
 
-        if data:
-            col.insert_many(data)
-            messages.success(request, f" Se han importado {len(data)} documentos en '{collection}'.")
-        else:
-            messages.warning(request, f"La colección '{collection}' estaba vacía. No se insertó nada.")
 
-        client.close()
+@require_GET
+@login_required
+def admin_metrics(request):
+    """Contadores internos del proceso (cachés, cola de reviews, admisión) para staff."""
+    if not request.user.is_staff:
+        return JsonResponse({"ok": False, "error": "Forbidden"}, status=403)
 
-    except Exception as e:
-        messages.error(request, f"Error al insertar en MongoDB: {e}")
+    return JsonResponse({
+        "ok": True,
+        "search_cache": result_cache().stats(),
+        "review_queue": review_queue.stats(),
+        "admission": admission.stats(),
+    })
 
-    return redirect("home")
 
 @require_GET
 @login_required
@@ -69,10 +122,8 @@ def admin_get_category(request, slug):
         return JsonResponse({"ok": False, "error": "Forbidden"}, status=403)
 
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
+        db = get_db()
         doc = db["categories"].find_one({"slug": slug})
-        client.close()
     except Exception as e:
         return JsonResponse({"ok": False, "error": str(e)}, status=500)
 
@@ -90,19 +141,17 @@ def admin_toggle_category(request, slug):
         return JsonResponse({"ok": False, "error": "Forbidden"}, status=403)
 
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
+        db = get_db()
         col = db["categories"]
 
         doc = col.find_one({"slug": slug})
         if not doc:
-            client.close()
             return JsonResponse({"ok": False, "error": "Category not found"}, status=404)
 
         current = bool(doc.get("is_active", True))
         col.update_one({"_id": doc["_id"]}, {"$set": {"is_active": (not current)}})
+        versions.bump(db, versions.CATEGORIES)
 
-        client.close()
         return JsonResponse({"ok": True, "is_active": (not current)})
 
     except Exception as e:
@@ -132,20 +181,17 @@ def admin_update_category(request, slug):
         return JsonResponse({"ok": False, "error": "Nombre demasiado corto"}, status=400)
 
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
+        db = get_db()
         col = db["categories"]
 
         current = col.find_one({"slug": slug})
         if not current:
-            client.close()
             return JsonResponse({"ok": False, "error": "Category not found"}, status=404)
 
         # Si slug viene vacío, lo autogeneramos. Si aun así queda vacío, mantenemos el actual.
         if not new_slug:
             new_slug = slugify(name) or current.get("slug", slug)
         if not new_slug:
-            client.close()
             return JsonResponse({"ok": False, "error": "Slug inválido"}, status=400)
 
         # Duplicados EXCLUYENDO el propio documento
@@ -157,7 +203,6 @@ def admin_update_category(request, slug):
             ]
         })
         if dup:
-            client.close()
             return JsonResponse({"ok": False, "error": "Ya existe otra categoría con ese nombre o slug"}, status=409)
 
         update_doc = {
@@ -173,7 +218,7 @@ def admin_update_category(request, slug):
         }
 
         col.update_one({"_id": current["_id"]}, {"$set": update_doc})
-        client.close()
+        versions.bump(db, versions.CATEGORIES)
 
         return JsonResponse({"ok": True, "slug": new_slug})
 
@@ -212,8 +257,7 @@ def create_category(request):
         return redirect(request.META.get("HTTP_REFERER", "home"))
 
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
+        db = get_db()
         col = db["categories"]  # <- colección de categorías
 
         # Duplicados: mismo slug o mismo name (case-insensitive)
@@ -226,7 +270,6 @@ def create_category(request):
 
         if dup:
             messages.error(request, "Ya existe una categoría con ese nombre o slug.")
-            client.close()
             return redirect(request.META.get("HTTP_REFERER", "home"))
 
         col.insert_one({
@@ -240,8 +283,8 @@ def create_category(request):
                 "episodes": [int(x) for x in ep_ids],
             }
         })
+        versions.bump(db, versions.CATEGORIES)
 
-        client.close()
         messages.success(request, "Categoría creada correctamente.")
 
     except Exception as e:
@@ -3,35 +3,53 @@ import re
 from bson import ObjectId
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
-from django.views.decorators.http import require_GET
-from pymongo import MongoClient
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
 
-from simpsonsRankApp.models import Character, Locations, Episodes
-from simpsonsRankApp.service.mongo_search import search_mongo
-from simpsonsRankApp.static.json.import_to_mongo import MONGO_URI, DB_NAME
+from simpsonsRankApp.service import versions
+from simpsonsRankApp.service.search import search_catalog
+from simpsonsRankApp.core.mobgo import get_db
+from simpsonsRankApp.service.catalog import get_catalog
+from simpsonsRankApp.views.reviews import reviews_etag
+
+
+def _category_items_etag(request, slug):
+    # staff también ve las inactivas: otra respuesta, otro ETag
+    try:
+        return versions.etag(get_db(), [versions.CATEGORIES], get_catalog().version_tag, int(request.user.is_staff))
+    except Exception:
+        return None
+
+
+def _ranking_items_etag(request, ranking_id):
+    try:
+        # str(ObjectId) normaliza el id tal y como se usa en rankings.save/delete
+        key = versions.ranking_key(ObjectId(ranking_id))
+        return versions.etag(get_db(), [key], get_catalog().version_tag)
+    except Exception:
+        return None
 
 
 @require_GET
 def search_attachables(request):
     q = (request.GET.get("q") or "").strip()
     t = (request.GET.get("type") or "").strip()
-    results = search_mongo(MONGO_URI, DB_NAME, t, q, limit=50)
+    results = search_catalog(t, q, limit=50)
     return JsonResponse({"results": results})
 
 @require_GET
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_category_items_etag)
 def category_items(request, slug):
     # 1) cargar categoría desde Mongo
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
+        db = get_db()
         query = {"slug": slug, "is_active": True}
         if request.user.is_authenticated and request.user.is_staff:
             query = {"slug": slug}  # admin puede cargar aunque esté inactiva
 
         cat = db["categories"].find_one(query, {"_id": 0})
-
-        client.close()
     except Exception:
         cat = None
 
@@ -39,45 +57,15 @@ def category_items(request, slug):
         return JsonResponse({"ok": False, "results": []}, status=404)
 
     attach = cat.get("attach", {}) or {}
-    char_ids = attach.get("characters", []) or []
-    loc_ids = attach.get("locations", []) or []
-    ep_ids = attach.get("episodes", []) or []
 
-    CDN = "https://cdn.thesimpsonsapi.com/1280"
+    # 2) hidratar desde el catálogo en memoria (sin consultas)
+    catalog = get_catalog()
     results = []
-
-    if char_ids:
-        qs = Character.objects.filter(id__in=char_ids)
-        for x in qs:
-            results.append({
-                "type": "characters",
-                "id": x.id,
-                "label": x.name,
-                "img": CDN + x.portrait_path,
-                "subtitle": x.occupation or "",
-            })
-
-    if loc_ids:
-        qs = Locations.objects.filter(id__in=loc_ids)
-        for x in qs:
-            results.append({
-                "type": "locations",
-                "id": x.id,
-                "label": x.name,
-                "img": CDN + x.image_path,
-                "subtitle": x.town or "",
-            })
-
-    if ep_ids:
-        qs = Episodes.objects.filter(id__in=ep_ids)
-        for x in qs:
-            results.append({
-                "type": "episodes",
-                "id": x.id,
-                "label": x.name,
-                "img": CDN + x.image_path,
-                "subtitle": f"S{x.season} · E{x.episode_number}",
-            })
+    for t in ("characters", "locations", "episodes"):
+        for _id in attach.get(t, []) or []:
+            card = catalog.card(t, _id)
+            if card:
+                results.append(card)
 
     return JsonResponse({
         "ok": True,
@@ -87,6 +75,8 @@ def category_items(request, slug):
 
 @require_GET
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_ranking_items_etag)
 def ranking_items(request, ranking_id):
     # 1) Traer ranking desde Mongo por _id (ObjectId)
     try:
@@ -95,10 +85,8 @@ def ranking_items(request, ranking_id):
         return JsonResponse({"results": []}, status=404)
 
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
+        db = get_db()
         doc = db["rankings"].find_one({"_id": oid})
-        client.close()
     except Exception:
         doc = None
 
@@ -107,63 +95,20 @@ def ranking_items(request, ranking_id):
 
     refs = doc.get("rankinList") or []
 
-    CDN = "https://cdn.thesimpsonsapi.com/1280"
+    # 2) Hidratar desde el catálogo en memoria, manteniendo el orden exacto del ranking
+    catalog = get_catalog()
     results = []
-
-    # 2) Cargar todo de golpe
-    char_ids = [r["id"] for r in refs if r.get("type") == "characters"]
-    loc_ids = [r["id"] for r in refs if r.get("type") == "locations"]
-    ep_ids = [r["id"] for r in refs if r.get("type") == "episodes"]
-
-    chars = {c.id: c for c in Character.objects.filter(id__in=char_ids)}
-    locs = {l.id: l for l in Locations.objects.filter(id__in=loc_ids)}
-    eps = {e.id: e for e in Episodes.objects.filter(id__in=ep_ids)}
-
-    # 3) Mantener el orden exacto del ranking
     for ref in refs:
-        t = ref.get("type")
-        _id = ref.get("id")
-
-        if t == "characters":
-            c = chars.get(_id)
-            if not c:
-                continue
-            results.append({
-                "type": "characters",
-                "id": c.id,
-                "label": c.name,
-                "img": (CDN + c.portrait_path) if c.portrait_path else None,
-                "subtitle": c.occupation or "",
-            })
-
-        elif t == "locations":
-            l = locs.get(_id)
-            if not l:
-                continue
-            results.append({
-                "type": "locations",
-                "id": l.id,
-                "label": l.name,
-                "img": (CDN + l.image_path) if l.image_path else None,
-                "subtitle": l.town or "",
-            })
-
-        elif t == "episodes":
-            e = eps.get(_id)
-            if not e:
-                continue
-            results.append({
-                "type": "episodes",
-                "id": e.id,
-                "label": e.name,
-                "img": (CDN + e.image_path) if e.image_path else None,
-                "subtitle": f"S{e.season} · E{e.episode_number}",
-            })
+        card = catalog.card(ref.get("type"), ref.get("id"))
+        if card:
+            results.append(card)
 
     return JsonResponse({"results": results})
 
 
 @require_GET
+@cache_control(public=True, no_cache=True)
+@condition(etag_func=reviews_etag("characters", "character_id"))
 def character_reviews(request, character_id):
     """Devuelve reviews de un personaje (últimas primero)."""
     try:
@@ -172,15 +117,13 @@ def character_reviews(request, character_id):
         return JsonResponse({"results": []}, status=400)
 
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
+        db = get_db()
         docs = list(
             db["reviews"]
             .find({"characterCode": character_id})
             .sort("reviewDate", -1)
             .limit(30)
         )
-        client.close()
     except Exception:
         docs = []
 
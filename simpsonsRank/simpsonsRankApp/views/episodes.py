@@ -1,124 +1,46 @@
-from django.core.paginator import Paginator
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
-from pymongo import MongoClient
 
 from simpsonsRankApp.models import Episodes
-from simpsonsRankApp.static.json.import_to_mongo import MONGO_URI, DB_NAME
+from simpsonsRankApp.core.mobgo import get_db
+from simpsonsRankApp.core.pagination import paginate_catalog
+from simpsonsRankApp.service import card_grid, entity_stats, sidebars
+from simpsonsRankApp.service.catalog_pages import aload_catalog_page, asgi_only
+
+CDN_BASE = "https://cdn.thesimpsonsapi.com/1280"
 
 
 def show_episodes(request):
     episodes = Episodes.objects.all().order_by("id")
 
-    paginator = Paginator(episodes, 25)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-
-    CDN_BASE = "https://cdn.thesimpsonsapi.com/1280"
+    # Paginator clásico o keyset (settings.CATALOG_PAGINATION)
+    page_obj = paginate_catalog(episodes, request.GET.get("page"), 25, count_key="episodes")
 
     stats_map = {}
     top5_episodes = []
     latest_comments = []
 
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
+        db = get_db()
 
         # ===== stats para cards (solo episodios de la página) =====
         ep_ids = [e.id for e in page_obj]
 
-        pipeline_page = [
-            {"$match": {"episodeCode": {"$in": ep_ids}}},
-            {"$group": {
-                "_id": "$episodeCode",
-                "avg": {"$avg": "$rating"},
-                "count": {"$sum": 1},
-            }},
-        ]
-
-        for row in db["reviews"].aggregate(pipeline_page):
-            eid = int(row["_id"])
-            stats_map[eid] = {
-                "avg": float(row.get("avg") or 0),
-                "count": int(row.get("count") or 0),
-            }
-
-        # ===== TOP 5 EPISODES =====
-        pipeline_top5 = [
-            {"$match": {"episodeCode": {"$exists": True}}},
-            {"$group": {
-                "_id": "$episodeCode",
-                "avg": {"$avg": "$rating"},
-                "count": {"$sum": 1},
-            }},
-            {"$sort": {"avg": -1, "count": -1}},
-            {"$limit": 5},
-        ]
-
-        top_docs = list(db["reviews"].aggregate(pipeline_top5))
-        top_ids = [int(d["_id"]) for d in top_docs]
-
-        eps = {e.id: e for e in Episodes.objects.filter(id__in=top_ids)}
-
-        for d in top_docs:
-            eid = int(d["_id"])
-            e = eps.get(eid)
-            if not e:
-                continue
-            top5_episodes.append({
-                "id": eid,
-                "name": e.name,
-                "img": CDN_BASE + (e.image_path or ""),
-                "avg": float(d.get("avg") or 0),
-                "count": int(d.get("count") or 0),
-            })
-
-        # ===== ÚLTIMOS COMENTARIOS (solo con texto) =====
-        latest_docs = list(
-            db["reviews"]
-            .find({
-                "episodeCode": {"$exists": True},
-                "comment": {"$exists": True, "$type": "string", "$ne": ""}
-            })
-            .sort("reviewDate", -1)
-            .limit(5)
-        )
-
-        ep_ids_latest = []
-        for d in latest_docs:
-            try:
-                ep_ids_latest.append(int(d.get("episodeCode")))
-            except Exception:
-                pass
-
-        eps_latest = {e.id: e for e in Episodes.objects.filter(id__in=ep_ids_latest)}
-
-        for d in latest_docs:
-            try:
-                eid = int(d.get("episodeCode"))
-            except Exception:
-                continue
-
-            e = eps_latest.get(eid)
-            if not e:
-                continue
-
-            latest_comments.append({
-                "episode_id": eid,
-                "episode_name": e.name,
-                "episode_img": CDN_BASE + (e.image_path or ""),
-                "user": d.get("user", "anon"),
-                "rating": int(d.get("rating", 0) or 0),
-                "comment": d.get("comment", ""),
-            })
-
-        client.close()
+        stats_map = entity_stats.stats_for(db, "episodes", ep_ids)
+
+        # ===== SIDEBAR: TOP 5 + ÚLTIMOS COMENTARIOS (cacheado) =====
+        top5_episodes, latest_comments = sidebars.get_sidebars("episodes")
 
     except Exception:
         stats_map = {}
         top5_episodes = []
         latest_comments = []
 
-    # ===== lista episodios para el grid =====
+    return _render(request, page_obj, stats_map, top5_episodes, latest_comments)
+
+
+def _cards(page_obj, stats_map):
+    # ===== lista episodios para el grid (solo si no está en caché) =====
     lista_episodios = []
     for e in page_obj:
         st = stats_map.get(e.id, {"avg": 0, "count": 0})
@@ -134,10 +56,25 @@ def show_episodes(request):
             "avg_rating": st["avg"],
             "reviews_count": st["count"],
         })
+    return lista_episodios
+
 
+def _render(request, page_obj, stats_map, top5_episodes, latest_comments):
     return render(request, "episodes.html", {
-        "episodios": lista_episodios,
+        # callable: el template solo lo llama si el fragmento del grid no está en caché
+        "episodios": lambda: _cards(page_obj, stats_map),
+        "grid": card_grid.grid_keys(page_obj, stats_map),
         "page_obj": page_obj,
         "top5_episodes": top5_episodes,
         "latest_episode_comments": latest_comments,
-    })
\ No newline at end of file
+    })
+
+
+@asgi_only(show_episodes)
+async def show_episodes_async(request):
+    """Versión async (ASGI): página+stats y sidebars se piden en paralelo."""
+    page_obj, stats_map, top5_episodes, latest_comments = await aload_catalog_page(
+        Episodes.objects.all().order_by("id"), request.GET.get("page"), "episodes", count_key="episodes"
+    )
+    # render en hilo: el template toca request.user (sesión -> ORM, sólo sync)
+    return await sync_to_async(_render)(request, page_obj, stats_map, top5_episodes, latest_comments)
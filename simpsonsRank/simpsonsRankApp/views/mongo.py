@@ -1,6 +1 @@
-from pymongo import mongo_client
-
-
-def get_db():
-    return mongo_client["simpsonsRank"]
-
+from simpsonsRankApp.core.mobgo import get_db  # noqa: F401
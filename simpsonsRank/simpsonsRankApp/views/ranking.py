@@ -1,16 +1,30 @@
 import json
 
 from bson import ObjectId
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render, redirect
-from django.utils import timezone
-from django.views.decorators.http import require_POST
-from pymongo import MongoClient
+from django.views.decorators.http import require_POST, require_GET
 
-from simpsonsRankApp.models import Locations, Character, Episodes, Ranking
-from simpsonsRankApp.static.json.import_to_mongo import MONGO_URI, DB_NAME
+from simpsonsRankApp.core.mobgo import get_db
+from simpsonsRankApp.service import ranking_feed, rankings
+from simpsonsRankApp.service.covers import resolve_covers, category_cover_ref, normalize_ref
+
+
+def _visible_categories(request, db):
+    try:
+        # Admin ve todas; user solo activas
+        cat_filter = {} if (request.user.is_authenticated and request.user.is_staff) else {"is_active": True}
+
+        return list(
+            db["categories"]
+            .find(cat_filter, {"_id": 0})
+            .sort("name", 1)
+        )
+    except Exception:
+        return []
 
 
 def show_ranking(request):
@@ -20,13 +34,13 @@ def show_ranking(request):
     # Mongo: conectar
     # =========================
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
+        db = get_db()
     except Exception:
         # si no hay mongo, render vacío
         return render(request, "ranking.html", {
             "my_rankings": [],
             "public_rankings": [],
+            "public_next_cursor": None,
             "categories": [],
             "categories_cards": [],
             "current_cat": cat,
@@ -36,127 +50,47 @@ def show_ranking(request):
     # =========================
     # Categorías (Mongo)
     # =========================
-    categories = []
-    try:
-        # Admin ve todas; user solo activas
-        cat_filter = {} if (request.user.is_authenticated and request.user.is_staff) else {"is_active": True}
-
-        categories = list(
-            db["categories"]
-            .find(cat_filter, {"_id": 0})
-            .sort("name", 1)
-        )
-    except Exception:
-        categories = []
-
+    categories = _visible_categories(request, db)
     cat_map = {c.get("slug"): c.get("name") for c in categories}
 
     # =========================
-    # Helper imágenes (SQL)
+    # Rankings (Mongo): los míos + primera página del feed público
     # =========================
-    CDN = "https://cdn.thesimpsonsapi.com/1280"
-
-    def cover_from_ref(t, _id):
-        if t == "characters":
-            x = Character.objects.filter(id=_id).first()
-            return (CDN + x.portrait_path) if x and x.portrait_path else None
-        if t == "locations":
-            x = Locations.objects.filter(id=_id).first()
-            return (CDN + x.image_path) if x and x.image_path else None
-        if t == "episodes":
-            x = Episodes.objects.filter(id=_id).first()
-            return (CDN + x.image_path) if x and x.image_path else None
-        return None
+    me = (request.user.username if request.user.is_authenticated else "")
+    page_size = getattr(settings, "RANKING_FEED_PAGE_SIZE", 24)
+
+    try:
+        my_docs = ranking_feed.my_rankings(db, me, cat)
+        public_docs, public_next_cursor = ranking_feed.public_feed(db, me, cat, limit=page_size)
+    except Exception:
+        my_docs, public_docs, public_next_cursor = [], [], None
+
+    my_rankings = ranking_feed.ranking_cards(my_docs, cat_map)
+    public_rankings = ranking_feed.ranking_cards(public_docs, cat_map)
 
     # =========================
-    # Rankings (Mongo)
+    # Contar rankings por categoría (para bloquear editar) -> en Mongo
     # =========================
-    query = {}
-    if cat:
-        query["categoryCode"] = cat
-
     try:
-        rankings_docs = list(
-            db["rankings"]
-            .find(query)
-            .sort("rankinDate", -1)
-        )
+        cat_counts = ranking_feed.category_counts(db, list(cat_map.keys()))
     except Exception:
-        rankings_docs = []
+        cat_counts = {}
 
     # =========================
-    # Contar rankings por categoría (para bloquear editar)
+    # Portadas de categorías: todas de golpe
     # =========================
-    from collections import Counter
+    covers = resolve_covers(category_cover_ref(c) for c in categories)
 
-    cat_counter = Counter()
-    for d in rankings_docs:
-        slug = (d.get("categoryCode") or "").strip()
-        if slug:
-            cat_counter[slug] += 1
-
-    ranked_slugs = set(cat_counter.keys())  # categorías con al menos 1 ranking
-
-    # usuario actual (para mis rankings)
-    me = (request.user.username if request.user.is_authenticated else "")
-    me_low = me.lower()
-
-    my_rankings = []
-    public_rankings = []
-
-    for d in rankings_docs:
-        items = d.get("rankinList") or []
-
-        first_img = None
-        if items:
-            first = items[0]
-            first_img = cover_from_ref(first.get("type"), first.get("id"))
-
-        category_slug = d.get("categoryCode", "")
-        category_name = cat_map.get(category_slug, category_slug)
-
-        # toma el título desde mongo
-        title = (
-            (d.get("title") or "")
-            or (d.get("rankingTitle") or "")
-            or (d.get("rankinTitle") or "")
-        ).strip()
-
-        if not title:
-            title = f"Mi top de {category_name}" if category_name else "Mi ranking"
-
-        card = {
-            "id": str(d.get("_id")),
-            "user": d.get("user", ""),
-            "fecha": d.get("rankinDate"),
-            "categoria_slug": category_slug,
-            "categoria_nombre": category_name,
-            "title": title,
-            "num_items": len(items),
-            "top3": "Top 3 al abrir",
-            "first_img": first_img,
-        }
-
-        doc_user = (card["user"] or "")
-        if me and doc_user.lower() == me_low:
-            my_rankings.append(card)
-        else:
-            public_rankings.append(card)
+    def cover_from_ref(ref):
+        key = normalize_ref(*ref) if ref else None
+        return covers.get(key) if key else None
 
     # =========================
     # Cards de categorías (con flag has_rankings)
     # =========================
     categories_cards = []
     for c in categories:
-        attach = c.get("attach", {}) or {}
-        cover_img = None
-
-        if attach.get("characters"):
-            cover_img = cover_from_ref("characters", attach["characters"][0])
-        elif attach.get("locations"):
-            cover_img = cover_from_ref("locations", attach["locations"][0])
-        elif attach.get("episodes"):
-            cover_img = cover_from_ref("episodes", attach["episodes"][0])
+        cover_img = cover_from_ref(category_cover_ref(c))
 
         slug = c.get("slug", "")
 
@@ -168,40 +102,29 @@ def show_ranking(request):
             "cover_img": cover_img,
 
             # para ocultar "Editar" si ya hay rankings en esa categoría
-            "has_rankings": slug in ranked_slugs,
-            "rankings_count": cat_counter.get(slug, 0),
+            "has_rankings": cat_counts.get(slug, 0) > 0,
+            "rankings_count": cat_counts.get(slug, 0),
         })
 
     # =========================
     # SIDEBAR: TOP 5 CATEGORÍAS (por nº de rankings)
     # =========================
     top5_categories = []
-    for slug, count in cat_counter.most_common(5):
-        name = cat_map.get(slug, slug)
-
-        cover_img = None
+    top_slugs = sorted(cat_counts.items(), key=lambda kv: -kv[1])[:5]
+    for slug, count in top_slugs:
         cdoc = next((c for c in categories if c.get("slug") == slug), None)
-        if cdoc:
-            attach = cdoc.get("attach", {}) or {}
-            if attach.get("characters"):
-                cover_img = cover_from_ref("characters", attach["characters"][0])
-            elif attach.get("locations"):
-                cover_img = cover_from_ref("locations", attach["locations"][0])
-            elif attach.get("episodes"):
-                cover_img = cover_from_ref("episodes", attach["episodes"][0])
 
         top5_categories.append({
             "slug": slug,
-            "name": name,
+            "name": cat_map.get(slug, slug),
             "count": count,
-            "img": cover_img,
+            "img": cover_from_ref(category_cover_ref(cdoc)) if cdoc else None,
         })
 
-    client.close()
-
     return render(request, "ranking.html", {
         "my_rankings": my_rankings,
         "public_rankings": public_rankings,
+        "public_next_cursor": public_next_cursor,
         "categories": categories,
         "categories_cards": categories_cards,
         "current_cat": cat,
@@ -209,6 +132,28 @@ def show_ranking(request):
     })
 
 
+@require_GET
+def rankings_feed(request):
+    """Siguiente página del feed público (keyset). ?cursor=...&cat=..."""
+    cat = (request.GET.get("cat") or "").strip()
+    cursor = request.GET.get("cursor") or None
+    me = (request.user.username if request.user.is_authenticated else "")
+    page_size = getattr(settings, "RANKING_FEED_PAGE_SIZE", 24)
+
+    try:
+        db = get_db()
+        docs, next_cursor = ranking_feed.public_feed(db, me, cat, cursor=cursor, limit=page_size)
+        cat_map = {c.get("slug"): c.get("name") for c in _visible_categories(request, db)}
+    except Exception as e:
+        return JsonResponse({"ok": False, "error": str(e), "results": []}, status=500)
+
+    return JsonResponse({
+        "ok": True,
+        "results": ranking_feed.ranking_cards(docs, cat_map),
+        "next": next_cursor,
+    })
+
+
 @require_POST
 @login_required
 def create_ranking(request):
@@ -236,17 +181,9 @@ def create_ranking(request):
         messages.error(request, "Formato de items inválido.")
         return redirect("show_ranking")
 
-    # OVERWRITE: 1 ranking por usuario y categoría
+    # OVERWRITE: 1 ranking por usuario y categoría (+ acumuladores de posiciones)
     try:
-        Ranking.objects.update_or_create(
-            user=request.user.username,
-            categoryCode=category,
-            defaults={
-                "title": title,
-                "rankinList": rankin_list,
-                "rankinDate": timezone.now().date(),
-            }
-        )
+        rankings.save_ranking(get_db(), request.user.username, category, title, rankin_list)
         messages.success(request, "Ranking guardado correctamente.")
     except Exception as e:
         return HttpResponse(f"ERROR guardando ranking: {e}")
@@ -266,24 +203,20 @@ def delete_ranking(request, ranking_id):
         return JsonResponse({"ok": False, "error": "Invalid id"}, status=400)
 
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
+        db = get_db()
         col = db["rankings"]
 
         doc = col.find_one({"_id": oid})
         if not doc:
-            client.close()
             return JsonResponse({"ok": False, "error": "Not found"}, status=404)
 
         owner = (doc.get("user") or "")
         me = request.user.username
 
         if (owner != me) and (not request.user.is_staff):
-            client.close()
             return JsonResponse({"ok": False, "error": "Forbidden"}, status=403)
 
-        col.delete_one({"_id": oid})
-        client.close()
+        rankings.delete_ranking(db, oid)
         return JsonResponse({"ok": True})
 
     except Exception as e:
@@ -1,10 +1,30 @@
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
-from django.utils import timezone
-from django.views.decorators.http import require_POST, require_GET
-from pymongo import MongoClient
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST, require_GET
 
-from simpsonsRankApp.static.json.import_to_mongo import MONGO_URI, DB_NAME
+from simpsonsRankApp.core.mobgo import get_db
+from simpsonsRankApp.service import review_queue, versions
+from simpsonsRankApp.service.reviews import save_review
+from simpsonsRankApp.service.sidebars import invalidate_sidebars
+
+
+def _store_review(entity_type, entity_id, user, rating, comment):
+    """Write-behind si está activo y la cola tiene sitio; si no, UPSERT directo (+ entity_stats)."""
+    if review_queue.submit(entity_type, entity_id, user, rating, comment):
+        return  # el flusher invalida los sidebars al escribir
+    save_review(get_db(), entity_type, entity_id, user, rating, comment)
+    invalidate_sidebars(entity_type)
+
+
+def reviews_etag(entity_type, id_kwarg):
+    """etag_func de @condition para las reviews de una entidad (contador por entidad)."""
+    def etag_func(request, **kwargs):
+        try:
+            return versions.etag(get_db(), [versions.review_key(entity_type, kwargs[id_kwarg])])
+        except Exception:
+            return None  # sin Mongo: respuesta normal, sin ETag
+    return etag_func
 
 
 @require_POST
@@ -31,21 +51,8 @@ def create_character_review(request, character_id):
         return JsonResponse({"ok": False, "error": "Comment too short"}, status=400)
 
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
-
-        # UPSERT: si existe (user+characterCode) actualiza; si no, crea
-        db["reviews"].update_one(
-            {"user": request.user.username, "characterCode": character_id},
-            {"$set": {
-                "rating": rating,
-                "comment": comment,
-                "reviewDate": timezone.now(),
-            }},
-            upsert=True
-        )
-
-        client.close()
+        # UPSERT: si existe (user+characterCode) actualiza; si no, crea (+ entity_stats)
+        _store_review("characters", character_id, request.user.username, rating, comment)
     except Exception as e:
         return JsonResponse({"ok": False, "error": str(e)}, status=500)
 
@@ -53,6 +60,8 @@ def create_character_review(request, character_id):
 
 
 @require_GET
+@cache_control(public=True, no_cache=True)  # siempre se revalida: 304 si no hay reviews nuevas
+@condition(etag_func=reviews_etag("episodes", "episode_id"))
 def episode_reviews(request, episode_id):
     """Devuelve reviews de un episodio (últimas primero)."""
     try:
@@ -61,15 +70,13 @@ def episode_reviews(request, episode_id):
         return JsonResponse({"results": []}, status=400)
 
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
+        db = get_db()
         docs = list(
             db["reviews"]
             .find({"episodeCode": episode_id})
             .sort("reviewDate", -1)
             .limit(30)
         )
-        client.close()
     except Exception:
         docs = []
 
@@ -109,21 +116,8 @@ def create_episode_review(request, episode_id):
         return JsonResponse({"ok": False, "error": "Comment too short"}, status=400)
 
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
-
-        # UPSERT: si existe (user+episodeCode) actualiza; si no, crea
-        db["reviews"].update_one(
-            {"user": request.user.username, "episodeCode": episode_id},
-            {"$set": {
-                "rating": rating,
-                "comment": comment,
-                "reviewDate": timezone.now(),
-            }},
-            upsert=True
-        )
-
-        client.close()
+        # UPSERT: si existe (user+episodeCode) actualiza; si no, crea (+ entity_stats)
+        _store_review("episodes", episode_id, request.user.username, rating, comment)
     except Exception as e:
         return JsonResponse({"ok": False, "error": str(e)}, status=500)
 
@@ -131,6 +125,8 @@ def create_episode_review(request, episode_id):
 
 
 @require_GET
+@cache_control(public=True, no_cache=True)
+@condition(etag_func=reviews_etag("locations", "location_id"))
 def location_reviews(request, location_id):
     try:
         location_id = int(location_id)
@@ -138,15 +134,13 @@ def location_reviews(request, location_id):
         return JsonResponse({"results": []}, status=400)
 
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
+        db = get_db()
         docs = list(
             db["reviews"]
             .find({"locationCode": location_id})
             .sort("reviewDate", -1)
             .limit(30)
         )
-        client.close()
     except Exception:
         docs = []
 
@@ -186,21 +180,8 @@ def create_location_review(request, location_id):
         return JsonResponse({"ok": False, "error": "Comment too short"}, status=400)
 
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
-
-        # UPSERT: si existe (user+locationCode) actualiza; si no, crea
-        db["reviews"].update_one(
-            {"user": request.user.username, "locationCode": location_id},
-            {"$set": {
-                "rating": rating,
-                "comment": comment,
-                "reviewDate": timezone.now(),
-            }},
-            upsert=True
-        )
-
-        client.close()
+        # UPSERT: si existe (user+locationCode) actualiza; si no, crea (+ entity_stats)
+        _store_review("locations", location_id, request.user.username, rating, comment)
     except Exception as e:
         return JsonResponse({"ok": False, "error": str(e)}, status=500)
 